@@ -0,0 +1,154 @@
+"""session booked/waitlist counters
+
+Revision ID: 0002_session_counters
+Revises: 0001_initial
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0002_session_counters'
+down_revision = '0001_initial'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('sessions', sa.Column('booked_count', sa.Integer(), nullable=False, server_default='0'), schema='gym')
+    op.add_column('sessions', sa.Column('waitlist_count', sa.Integer(), nullable=False, server_default='0'), schema='gym')
+    op.create_check_constraint('ck_session_counters', 'sessions', 'booked_count >= 0 AND waitlist_count >= 0', schema='gym')
+
+    # Backfill antes de crear los triggers de mantenimiento
+    op.execute("""
+        UPDATE gym.sessions s SET
+          booked_count = (SELECT count(*) FROM gym.reservations r WHERE r.session_id = s.id AND r.status = 'booked'),
+          waitlist_count = (SELECT count(*) FROM gym.waitlist_entries w WHERE w.session_id = s.id);
+    """)
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION gym.sync_session_booked_count() RETURNS TRIGGER AS $$
+        BEGIN
+          IF TG_OP = 'UPDATE' THEN
+            IF OLD.status = NEW.status AND OLD.session_id = NEW.session_id THEN
+              RETURN NULL;
+            END IF;
+          END IF;
+          IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            IF OLD.status = 'booked' THEN
+              UPDATE gym.sessions SET booked_count = booked_count - 1 WHERE id = OLD.session_id;
+            END IF;
+          END IF;
+          IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            IF NEW.status = 'booked' THEN
+              UPDATE gym.sessions SET booked_count = booked_count + 1 WHERE id = NEW.session_id;
+            END IF;
+          END IF;
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        -- Same-event triggers fire in name order: the counter must run before trg_on_cancel_promote_waitlist
+        CREATE TRIGGER trg_count_session_booked
+          AFTER INSERT OR UPDATE OF status, session_id OR DELETE ON gym.reservations
+          FOR EACH ROW EXECUTE FUNCTION gym.sync_session_booked_count();
+
+        CREATE OR REPLACE FUNCTION gym.sync_session_waitlist_count() RETURNS TRIGGER AS $$
+        BEGIN
+          IF TG_OP = 'INSERT' THEN
+            UPDATE gym.sessions SET waitlist_count = waitlist_count + 1 WHERE id = NEW.session_id;
+          ELSE
+            UPDATE gym.sessions SET waitlist_count = waitlist_count - 1 WHERE id = OLD.session_id;
+          END IF;
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER trg_count_session_waitlist
+          AFTER INSERT OR DELETE ON gym.waitlist_entries
+          FOR EACH ROW EXECUTE FUNCTION gym.sync_session_waitlist_count();
+    """)
+
+    # La comprobación de capacidad pasa a leer el contador en lugar de COUNT(*)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION gym.check_reservation_constraints() RETURNS TRIGGER AS $$
+        DECLARE
+          current_bookings INT;
+          sess_capacity INT;
+          overlap_count INT;
+          sess_start TIMESTAMPTZ;
+          sess_end TIMESTAMPTZ;
+        BEGIN
+          SELECT start_time, end_time, capacity, booked_count INTO sess_start, sess_end, sess_capacity, current_bookings
+            FROM gym.sessions WHERE id = NEW.session_id FOR UPDATE;
+
+          IF NOT FOUND THEN
+            RAISE EXCEPTION 'Session % not found', NEW.session_id;
+          END IF;
+
+          IF NEW.status = 'booked' AND current_bookings >= sess_capacity THEN
+            RAISE EXCEPTION 'Session is full';
+          END IF;
+
+          SELECT COUNT(*) INTO overlap_count
+            FROM gym.reservations r
+            JOIN gym.sessions s ON r.session_id = s.id
+            WHERE r.user_id = NEW.user_id
+              AND r.status = 'booked'
+              AND tstzrange(s.start_time, s.end_time) && tstzrange(sess_start, sess_end);
+
+          IF overlap_count > 0 THEN
+            RAISE EXCEPTION 'User has another booking that overlaps this session';
+          END IF;
+
+          RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+def downgrade():
+    op.execute("""
+        CREATE OR REPLACE FUNCTION gym.check_reservation_constraints() RETURNS TRIGGER AS $$
+        DECLARE
+          current_bookings INT;
+          sess_capacity INT;
+          overlap_count INT;
+          sess_start TIMESTAMPTZ;
+          sess_end TIMESTAMPTZ;
+        BEGIN
+          SELECT start_time, end_time, capacity INTO sess_start, sess_end, sess_capacity
+            FROM gym.sessions WHERE id = NEW.session_id FOR SHARE;
+
+          IF NOT FOUND THEN
+            RAISE EXCEPTION 'Session % not found', NEW.session_id;
+          END IF;
+
+          SELECT COUNT(*) INTO current_bookings
+            FROM gym.reservations
+            WHERE session_id = NEW.session_id AND status = 'booked';
+
+          IF current_bookings >= sess_capacity THEN
+            RAISE EXCEPTION 'Session is full';
+          END IF;
+
+          SELECT COUNT(*) INTO overlap_count
+            FROM gym.reservations r
+            JOIN gym.sessions s ON r.session_id = s.id
+            WHERE r.user_id = NEW.user_id
+              AND r.status = 'booked'
+              AND tstzrange(s.start_time, s.end_time) && tstzrange(sess_start, sess_end);
+
+          IF overlap_count > 0 THEN
+            RAISE EXCEPTION 'User has another booking that overlaps this session';
+          END IF;
+
+          RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("DROP TRIGGER IF EXISTS trg_count_session_waitlist ON gym.waitlist_entries;")
+    op.execute("DROP TRIGGER IF EXISTS trg_count_session_booked ON gym.reservations;")
+    op.execute("DROP FUNCTION IF EXISTS gym.sync_session_waitlist_count();")
+    op.execute("DROP FUNCTION IF EXISTS gym.sync_session_booked_count();")
+    op.drop_constraint('ck_session_counters', 'sessions', schema='gym')
+    op.drop_column('sessions', 'waitlist_count', schema='gym')
+    op.drop_column('sessions', 'booked_count', schema='gym')
@@ -0,0 +1,33 @@
+"""session keyset search indexes
+
+Revision ID: 0003_session_search_indexes
+Revises: 0002_session_counters
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0003_session_search_indexes'
+down_revision = '0002_session_counters'
+branch_labels = None
+depends_on = None
+
+# (nombre, columnas): todos terminan en (start_time, id) para servir el ORDER BY keyset de GET /sessions
+INDEXES = [
+    ('idx_sessions_start_id', ['start_time', 'id']),
+    ('idx_sessions_location_start', ['location_id', 'start_time', 'id']),
+    ('idx_sessions_class_type_start', ['class_type_id', 'start_time', 'id']),
+    ('idx_sessions_trainer_start', ['trainer_id', 'start_time', 'id']),
+]
+
+def upgrade():
+    for name, columns in INDEXES:
+        op.create_index(name, 'sessions', columns, schema='gym')
+    op.create_index('idx_sessions_scheduled_start', 'sessions', ['start_time', 'id'], schema='gym',
+                    postgresql_where=sa.text("status = 'scheduled'"))
+
+def downgrade():
+    op.drop_index('idx_sessions_scheduled_start', table_name='sessions', schema='gym')
+    for name, _ in reversed(INDEXES):
+        op.drop_index(name, table_name='sessions', schema='gym')
@@ -0,0 +1,105 @@
+"""waitlist engine: app-side promotion, gap-free positions
+
+Revision ID: 0004_waitlist_engine
+Revises: 0003_session_search_indexes
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0004_waitlist_engine'
+down_revision = '0003_session_search_indexes'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # La promoción pasa a app/waitlist.py (todas las plazas libres, notified_at, posiciones compactas)
+    op.execute("DROP TRIGGER IF EXISTS trg_on_cancel_promote_waitlist ON gym.reservations")
+    op.execute("DROP FUNCTION IF EXISTS gym.on_reservation_cancel_promote_waitlist()")
+
+    # waitlist_count cuenta solo las entradas en espera (notified_at IS NULL)
+    op.execute("DROP TRIGGER IF EXISTS trg_count_session_waitlist ON gym.waitlist_entries")
+    op.execute("""
+        CREATE OR REPLACE FUNCTION gym.sync_session_waitlist_count() RETURNS TRIGGER AS $$
+        BEGIN
+          IF TG_OP = 'UPDATE' THEN
+            IF (OLD.notified_at IS NULL) = (NEW.notified_at IS NULL) AND OLD.session_id = NEW.session_id THEN
+              RETURN NULL;
+            END IF;
+          END IF;
+          IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.notified_at IS NULL THEN
+            UPDATE gym.sessions SET waitlist_count = waitlist_count - 1 WHERE id = OLD.session_id;
+          END IF;
+          IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.notified_at IS NULL THEN
+            UPDATE gym.sessions SET waitlist_count = waitlist_count + 1 WHERE id = NEW.session_id;
+          END IF;
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER trg_count_session_waitlist
+          AFTER INSERT OR UPDATE OF notified_at, session_id OR DELETE ON gym.waitlist_entries
+          FOR EACH ROW EXECUTE FUNCTION gym.sync_session_waitlist_count();
+    """)
+
+    # Backfill: posiciones 1..n sin huecos y contador recalculado
+    op.execute("""
+        UPDATE gym.waitlist_entries w SET position = q.rn
+          FROM (SELECT id, row_number() OVER (PARTITION BY session_id ORDER BY position, created_at, id) AS rn
+                  FROM gym.waitlist_entries WHERE notified_at IS NULL) q
+         WHERE w.id = q.id AND w.position <> q.rn;
+        UPDATE gym.waitlist_entries SET position = 0 WHERE notified_at IS NOT NULL;
+        UPDATE gym.sessions s SET waitlist_count =
+          (SELECT count(*) FROM gym.waitlist_entries w WHERE w.session_id = s.id AND w.notified_at IS NULL);
+    """)
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trg_count_session_waitlist ON gym.waitlist_entries")
+    op.execute("""
+        CREATE OR REPLACE FUNCTION gym.sync_session_waitlist_count() RETURNS TRIGGER AS $$
+        BEGIN
+          IF TG_OP = 'INSERT' THEN
+            UPDATE gym.sessions SET waitlist_count = waitlist_count + 1 WHERE id = NEW.session_id;
+          ELSE
+            UPDATE gym.sessions SET waitlist_count = waitlist_count - 1 WHERE id = OLD.session_id;
+          END IF;
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER trg_count_session_waitlist
+          AFTER INSERT OR DELETE ON gym.waitlist_entries
+          FOR EACH ROW EXECUTE FUNCTION gym.sync_session_waitlist_count();
+    """)
+    # Las entradas ya promovidas no existían en el esquema anterior
+    op.execute("DELETE FROM gym.waitlist_entries WHERE notified_at IS NOT NULL")
+    op.execute("""
+        UPDATE gym.sessions s SET waitlist_count =
+          (SELECT count(*) FROM gym.waitlist_entries w WHERE w.session_id = s.id);
+    """)
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION gym.on_reservation_cancel_promote_waitlist() RETURNS TRIGGER AS $$
+        DECLARE
+          next_waitlist RECORD;
+        BEGIN
+          IF (TG_OP = 'UPDATE' AND NEW.status = 'cancelled' AND OLD.status <> 'cancelled') THEN
+            SELECT * INTO next_waitlist FROM gym.waitlist_entries
+              WHERE session_id = OLD.session_id
+              ORDER BY position ASC, created_at ASC LIMIT 1;
+
+            IF FOUND THEN
+              INSERT INTO gym.reservations (session_id, user_id, status, created_at)
+                VALUES (OLD.session_id, next_waitlist.user_id, 'booked', now());
+              DELETE FROM gym.waitlist_entries WHERE id = next_waitlist.id;
+            END IF;
+          END IF;
+          RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER trg_on_cancel_promote_waitlist
+          AFTER UPDATE ON gym.reservations
+          FOR EACH ROW EXECUTE FUNCTION gym.on_reservation_cancel_promote_waitlist();
+    """)
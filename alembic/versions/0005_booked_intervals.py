@@ -0,0 +1,178 @@
+"""booked intervals: sessions.period, per-user exclusion constraint
+
+Revision ID: 0005_booked_intervals
+Revises: 0004_waitlist_engine
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import TSTZRANGE, UUID, ExcludeConstraint
+
+revision = '0005_booked_intervals'
+down_revision = '0004_waitlist_engine'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # btree_gist: operador = sobre uuid dentro de un índice GiST
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+
+    op.add_column('sessions', sa.Column(
+        'period', TSTZRANGE(), sa.Computed('tstzrange(start_time, end_time)', persisted=True),
+    ), schema='gym')
+    op.create_index('idx_sessions_period', 'sessions', ['period'], schema='gym', postgresql_using='gist')
+
+    op.create_table(
+        'user_booked_intervals',
+        sa.Column('reservation_id', UUID(as_uuid=True), sa.ForeignKey('gym.reservations.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('user_id', UUID(as_uuid=True), sa.ForeignKey('gym.users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('session_id', UUID(as_uuid=True), sa.ForeignKey('gym.sessions.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('period', TSTZRANGE(), nullable=False),
+        ExcludeConstraint(('user_id', '='), ('period', '&&'), name='ex_user_booked_intervals_overlap', using='gist'),
+        schema='gym',
+    )
+    op.create_index('idx_user_booked_intervals_session', 'user_booked_intervals', ['session_id'], schema='gym')
+
+    # Backfill. Si ya hay reservas solapadas, la primera de cada grupo entra y
+    # las demás quedan fuera: se aborta para resolverlas a mano antes de migrar.
+    op.execute("""
+        INSERT INTO gym.user_booked_intervals (reservation_id, user_id, session_id, period)
+        SELECT r.id, r.user_id, r.session_id, s.period
+          FROM gym.reservations r JOIN gym.sessions s ON s.id = r.session_id
+         WHERE r.status = 'booked'
+         ORDER BY r.created_at, r.id
+        ON CONFLICT DO NOTHING
+    """)
+    op.execute("""
+        DO $$
+        DECLARE
+          missing INT;
+        BEGIN
+          SELECT count(*) INTO missing
+            FROM gym.reservations r
+           WHERE r.status = 'booked'
+             AND NOT EXISTS (SELECT 1 FROM gym.user_booked_intervals i WHERE i.reservation_id = r.id);
+          IF missing > 0 THEN
+            RAISE EXCEPTION '% booked reservations overlap another booking of the same user', missing;
+          END IF;
+        END $$;
+    """)
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION gym.sync_user_booked_intervals() RETURNS TRIGGER AS $$
+        BEGIN
+          IF TG_OP = 'UPDATE' THEN
+            IF OLD.status = NEW.status AND OLD.session_id = NEW.session_id THEN
+              RETURN NULL;
+            END IF;
+            IF OLD.status = 'booked' THEN
+              DELETE FROM gym.user_booked_intervals WHERE reservation_id = OLD.id;
+            END IF;
+          END IF;
+          IF NEW.status = 'booked' THEN
+            INSERT INTO gym.user_booked_intervals (reservation_id, user_id, session_id, period)
+              SELECT NEW.id, NEW.user_id, s.id, s.period FROM gym.sessions s WHERE s.id = NEW.session_id;
+          END IF;
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER trg_sync_user_booked_intervals
+          AFTER INSERT OR UPDATE OF status, session_id ON gym.reservations
+          FOR EACH ROW EXECUTE FUNCTION gym.sync_user_booked_intervals();
+
+        CREATE OR REPLACE FUNCTION gym.sync_session_period_intervals() RETURNS TRIGGER AS $$
+        BEGIN
+          UPDATE gym.user_booked_intervals SET period = NEW.period WHERE session_id = NEW.id;
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER trg_sync_session_period_intervals
+          AFTER UPDATE OF start_time, end_time ON gym.sessions
+          FOR EACH ROW WHEN (OLD.period IS DISTINCT FROM NEW.period)
+          EXECUTE FUNCTION gym.sync_session_period_intervals();
+    """)
+
+    # El trigger de reservas solo comprueba aforo; el solape lo impide la restricción
+    op.execute("DROP TRIGGER IF EXISTS trg_check_reservation_constraints ON gym.reservations")
+    op.execute("""
+        CREATE OR REPLACE FUNCTION gym.check_reservation_constraints() RETURNS TRIGGER AS $$
+        DECLARE
+          current_bookings INT;
+          sess_capacity INT;
+        BEGIN
+          IF NEW.status <> 'booked' OR (TG_OP = 'UPDATE' AND OLD.status = 'booked' AND OLD.session_id = NEW.session_id) THEN
+            RETURN NEW;
+          END IF;
+
+          SELECT capacity, booked_count INTO sess_capacity, current_bookings
+            FROM gym.sessions WHERE id = NEW.session_id FOR UPDATE;
+
+          IF NOT FOUND THEN
+            RAISE EXCEPTION 'Session % not found', NEW.session_id;
+          END IF;
+
+          IF current_bookings >= sess_capacity THEN
+            RAISE EXCEPTION 'Session is full';
+          END IF;
+
+          RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER trg_check_reservation_constraints
+          BEFORE INSERT OR UPDATE OF status, session_id ON gym.reservations
+          FOR EACH ROW EXECUTE FUNCTION gym.check_reservation_constraints();
+    """)
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trg_check_reservation_constraints ON gym.reservations")
+    op.execute("""
+        CREATE OR REPLACE FUNCTION gym.check_reservation_constraints() RETURNS TRIGGER AS $$
+        DECLARE
+          current_bookings INT;
+          sess_capacity INT;
+          overlap_count INT;
+          sess_start TIMESTAMPTZ;
+          sess_end TIMESTAMPTZ;
+        BEGIN
+          SELECT start_time, end_time, capacity, booked_count INTO sess_start, sess_end, sess_capacity, current_bookings
+            FROM gym.sessions WHERE id = NEW.session_id FOR UPDATE;
+
+          IF NOT FOUND THEN
+            RAISE EXCEPTION 'Session % not found', NEW.session_id;
+          END IF;
+
+          IF NEW.status = 'booked' AND current_bookings >= sess_capacity THEN
+            RAISE EXCEPTION 'Session is full';
+          END IF;
+
+          SELECT COUNT(*) INTO overlap_count
+            FROM gym.reservations r
+            JOIN gym.sessions s ON r.session_id = s.id
+            WHERE r.user_id = NEW.user_id
+              AND r.status = 'booked'
+              AND tstzrange(s.start_time, s.end_time) && tstzrange(sess_start, sess_end);
+
+          IF overlap_count > 0 THEN
+            RAISE EXCEPTION 'User has another booking that overlaps this session';
+          END IF;
+
+          RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER trg_check_reservation_constraints
+          BEFORE INSERT ON gym.reservations
+          FOR EACH ROW EXECUTE FUNCTION gym.check_reservation_constraints();
+    """)
+    op.execute("DROP TRIGGER IF EXISTS trg_sync_session_period_intervals ON gym.sessions")
+    op.execute("DROP TRIGGER IF EXISTS trg_sync_user_booked_intervals ON gym.reservations")
+    op.execute("DROP FUNCTION IF EXISTS gym.sync_session_period_intervals()")
+    op.execute("DROP FUNCTION IF EXISTS gym.sync_user_booked_intervals()")
+    op.drop_table('user_booked_intervals', schema='gym')
+    op.drop_index('idx_sessions_period', table_name='sessions', schema='gym')
+    op.drop_column('sessions', 'period', schema='gym')
+    # btree_gist se deja instalada: puede usarla otro objeto
@@ -0,0 +1,116 @@
+"""reporting: daily occupancy/revenue rollups fed by a change log
+
+Revision ID: 0006_reporting_rollups
+Revises: 0005_booked_intervals
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+revision = '0006_reporting_rollups'
+down_revision = '0005_booked_intervals'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'report_changes',
+        sa.Column('id', sa.BigInteger(), primary_key=True),
+        sa.Column('session_id', UUID(as_uuid=True), nullable=False),
+        sa.Column('start_time', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        schema='gym',
+    )
+    op.create_table(
+        'report_daily_occupancy',
+        sa.Column('id', sa.BigInteger(), primary_key=True),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('class_type_id', UUID(as_uuid=True), nullable=False),
+        sa.Column('trainer_id', UUID(as_uuid=True)),
+        sa.Column('location_id', UUID(as_uuid=True)),
+        sa.Column('currency', sa.Text(), nullable=False),
+        sa.Column('sessions', sa.Integer(), nullable=False),
+        sa.Column('sessions_cancelled', sa.Integer(), nullable=False),
+        sa.Column('capacity', sa.Integer(), nullable=False),
+        sa.Column('booked', sa.Integer(), nullable=False),
+        sa.Column('attended', sa.Integer(), nullable=False),
+        sa.Column('no_show', sa.Integer(), nullable=False),
+        sa.Column('cancelled', sa.Integer(), nullable=False),
+        sa.Column('list_revenue_cents', sa.BigInteger(), nullable=False),
+        sa.Column('paid_revenue_cents', sa.BigInteger(), nullable=False),
+        sa.Column('refreshed_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        schema='gym',
+    )
+    op.create_index('idx_report_daily_occupancy_day', 'report_daily_occupancy', ['day'], schema='gym')
+    # Suma de pagos por sesión al recalcular un día
+    op.create_index('idx_payments_reservation', 'payments', ['reservation_id'], schema='gym')
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION gym.log_report_change_session() RETURNS TRIGGER AS $$
+        BEGIN
+          IF TG_OP <> 'DELETE' THEN
+            INSERT INTO gym.report_changes (session_id, start_time) VALUES (NEW.id, NEW.start_time);
+          END IF;
+          IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND OLD.start_time <> NEW.start_time) THEN
+            INSERT INTO gym.report_changes (session_id, start_time) VALUES (OLD.id, OLD.start_time);
+          END IF;
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        -- booked_count/waitlist_count are not in the column list: counter updates do not log
+        CREATE TRIGGER trg_log_report_change_session
+          AFTER INSERT OR UPDATE OF start_time, capacity, status, class_type_id, trainer_id, location_id OR DELETE ON gym.sessions
+          FOR EACH ROW EXECUTE FUNCTION gym.log_report_change_session();
+
+        CREATE OR REPLACE FUNCTION gym.log_report_change_reservation() RETURNS TRIGGER AS $$
+        BEGIN
+          IF TG_OP <> 'DELETE' THEN
+            INSERT INTO gym.report_changes (session_id, start_time)
+              SELECT id, start_time FROM gym.sessions WHERE id = NEW.session_id;
+          END IF;
+          IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND OLD.session_id <> NEW.session_id) THEN
+            INSERT INTO gym.report_changes (session_id, start_time)
+              SELECT id, start_time FROM gym.sessions WHERE id = OLD.session_id;
+          END IF;
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER trg_log_report_change_reservation
+          AFTER INSERT OR UPDATE OF status, session_id OR DELETE ON gym.reservations
+          FOR EACH ROW EXECUTE FUNCTION gym.log_report_change_reservation();
+
+        CREATE OR REPLACE FUNCTION gym.log_report_change_payment() RETURNS TRIGGER AS $$
+        BEGIN
+          IF TG_OP <> 'DELETE' AND NEW.reservation_id IS NOT NULL THEN
+            INSERT INTO gym.report_changes (session_id, start_time)
+              SELECT s.id, s.start_time FROM gym.reservations r JOIN gym.sessions s ON s.id = r.session_id WHERE r.id = NEW.reservation_id;
+          END IF;
+          IF TG_OP <> 'INSERT' AND OLD.reservation_id IS NOT NULL AND OLD.reservation_id IS DISTINCT FROM NEW.reservation_id THEN
+            INSERT INTO gym.report_changes (session_id, start_time)
+              SELECT s.id, s.start_time FROM gym.reservations r JOIN gym.sessions s ON s.id = r.session_id WHERE r.id = OLD.reservation_id;
+          END IF;
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER trg_log_report_change_payment
+          AFTER INSERT OR UPDATE OF status, amount_cents, reservation_id OR DELETE ON gym.payments
+          FOR EACH ROW EXECUTE FUNCTION gym.log_report_change_payment();    """)
+
+    # Backfill: un cambio por sesión existente; el primer refresh-reports construye todos los días
+    op.execute("INSERT INTO gym.report_changes (session_id, start_time) SELECT id, start_time FROM gym.sessions")
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trg_log_report_change_payment ON gym.payments")
+    op.execute("DROP TRIGGER IF EXISTS trg_log_report_change_reservation ON gym.reservations")
+    op.execute("DROP TRIGGER IF EXISTS trg_log_report_change_session ON gym.sessions")
+    op.execute("DROP FUNCTION IF EXISTS gym.log_report_change_payment()")
+    op.execute("DROP FUNCTION IF EXISTS gym.log_report_change_reservation()")
+    op.execute("DROP FUNCTION IF EXISTS gym.log_report_change_session()")
+    op.drop_index('idx_payments_reservation', table_name='payments', schema='gym')
+    op.drop_table('report_daily_occupancy', schema='gym')
+    op.drop_table('report_changes', schema='gym')
@@ -0,0 +1,103 @@
+"""plan quota: per-(user, month) usage counter enforced by trigger
+
+Revision ID: 0007_plan_quota
+Revises: 0006_reporting_rollups
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+revision = '0007_plan_quota'
+down_revision = '0006_reporting_rollups'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'user_monthly_usage',
+        sa.Column('user_id', UUID(as_uuid=True), sa.ForeignKey('gym.users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('month', sa.Date(), primary_key=True),
+        sa.Column('booked', sa.Integer(), nullable=False, server_default='0'),
+        sa.CheckConstraint('booked >= 0', name='ck_user_monthly_usage_booked'),
+        schema='gym',
+    )
+    op.execute("""
+        CREATE OR REPLACE FUNCTION gym.quota_month(ts TIMESTAMPTZ) RETURNS DATE AS $$
+          SELECT date_trunc('month', ts AT TIME ZONE 'UTC')::date
+        $$ LANGUAGE sql IMMUTABLE;
+
+        CREATE OR REPLACE FUNCTION gym.sync_user_monthly_usage() RETURNS TRIGGER AS $$
+        DECLARE
+          old_counts BOOLEAN := TG_OP <> 'INSERT' AND OLD.status IN ('booked', 'attended', 'no_show');
+          new_counts BOOLEAN := TG_OP <> 'DELETE' AND NEW.status IN ('booked', 'attended', 'no_show');
+          used INT;
+          quota INT;
+        BEGIN
+          IF TG_OP = 'UPDATE' AND old_counts = new_counts AND OLD.session_id = NEW.session_id THEN
+            RETURN NULL;
+          END IF;
+          -- Lock compartido por usuario: las reservas no se esperan entre sí; reconcile-usage lo toma en exclusiva
+          PERFORM pg_advisory_xact_lock_shared(7301, hashtext(COALESCE(NEW.user_id, OLD.user_id)::text));
+          IF old_counts THEN
+            UPDATE gym.user_monthly_usage SET booked = booked - 1
+             WHERE user_id = OLD.user_id
+               AND month = (SELECT gym.quota_month(start_time) FROM gym.sessions WHERE id = OLD.session_id);
+          END IF;
+          IF new_counts THEN
+            INSERT INTO gym.user_monthly_usage AS u (user_id, month, booked)
+              SELECT NEW.user_id, gym.quota_month(s.start_time), 1 FROM gym.sessions s WHERE s.id = NEW.session_id
+            ON CONFLICT (user_id, month) DO UPDATE SET booked = u.booked + 1
+            RETURNING booked INTO used;
+            SELECT p.max_monthly_bookings INTO quota
+              FROM gym.users usr JOIN gym.plans p ON p.id = usr.plan_id WHERE usr.id = NEW.user_id;
+            IF quota IS NOT NULL AND used > quota THEN
+              RAISE EXCEPTION 'Monthly booking quota exceeded (% of %)', used, quota USING ERRCODE = '23Q01';
+            END IF;
+          END IF;
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER trg_sync_user_monthly_usage
+          AFTER INSERT OR UPDATE OF status, session_id OR DELETE ON gym.reservations
+          FOR EACH ROW EXECUTE FUNCTION gym.sync_user_monthly_usage();
+
+        -- Mover una sesión a otro mes traslada sus plazas (sin comprobar cuota: es una acción de admin)
+        CREATE OR REPLACE FUNCTION gym.move_session_monthly_usage() RETURNS TRIGGER AS $$
+        BEGIN
+          UPDATE gym.user_monthly_usage u SET booked = u.booked - 1
+            FROM gym.reservations r
+           WHERE r.session_id = NEW.id AND r.status IN ('booked', 'attended', 'no_show')
+             AND u.user_id = r.user_id AND u.month = gym.quota_month(OLD.start_time);
+          INSERT INTO gym.user_monthly_usage AS u (user_id, month, booked)
+            SELECT r.user_id, gym.quota_month(NEW.start_time), 1
+              FROM gym.reservations r
+             WHERE r.session_id = NEW.id AND r.status IN ('booked', 'attended', 'no_show')
+          ON CONFLICT (user_id, month) DO UPDATE SET booked = u.booked + 1;
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER trg_move_session_monthly_usage
+          AFTER UPDATE OF start_time ON gym.sessions
+          FOR EACH ROW WHEN (gym.quota_month(OLD.start_time) <> gym.quota_month(NEW.start_time))
+          EXECUTE FUNCTION gym.move_session_monthly_usage();    """)
+
+    # Backfill con el consumo actual (sin aplicar el límite: solo frena reservas nuevas)
+    op.execute("""
+        INSERT INTO gym.user_monthly_usage (user_id, month, booked)
+        SELECT r.user_id, gym.quota_month(s.start_time), count(*)
+          FROM gym.reservations r JOIN gym.sessions s ON s.id = r.session_id
+         WHERE r.status IN ('booked', 'attended', 'no_show')
+         GROUP BY 1, 2
+    """)
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trg_move_session_monthly_usage ON gym.sessions")
+    op.execute("DROP TRIGGER IF EXISTS trg_sync_user_monthly_usage ON gym.reservations")
+    op.execute("DROP FUNCTION IF EXISTS gym.move_session_monthly_usage()")
+    op.execute("DROP FUNCTION IF EXISTS gym.sync_user_monthly_usage()")
+    op.drop_table('user_monthly_usage', schema='gym')
+    op.execute("DROP FUNCTION IF EXISTS gym.quota_month(timestamptz)")
@@ -0,0 +1,37 @@
+"""live seats: NOTIFY session_seats when a session's counters change
+
+Revision ID: 0008_live_seats
+Revises: 0007_plan_quota
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+
+revision = '0008_live_seats'
+down_revision = '0007_plan_quota'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.execute("""
+        CREATE OR REPLACE FUNCTION gym.notify_session_seats() RETURNS TRIGGER AS $$
+        BEGIN
+          PERFORM pg_notify('session_seats', json_build_object(
+            'id', NEW.id, 'capacity', NEW.capacity, 'booked_count', NEW.booked_count,
+            'waitlist_count', NEW.waitlist_count, 'status', NEW.status
+          )::text);
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_notify_session_seats
+          AFTER UPDATE OF booked_count, waitlist_count, capacity, status ON gym.sessions
+          FOR EACH ROW WHEN ((OLD.booked_count, OLD.waitlist_count, OLD.capacity, OLD.status)
+                             IS DISTINCT FROM (NEW.booked_count, NEW.waitlist_count, NEW.capacity, NEW.status))
+          EXECUTE FUNCTION gym.notify_session_seats();
+    """)
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trg_notify_session_seats ON gym.sessions")
+    op.execute("DROP FUNCTION IF EXISTS gym.notify_session_seats()")
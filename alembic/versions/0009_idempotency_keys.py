@@ -0,0 +1,33 @@
+"""idempotency keys: stored responses for retried booking/cancel requests
+
+Revision ID: 0009_idempotency_keys
+Revises: 0008_live_seats
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+
+revision = '0009_idempotency_keys'
+down_revision = '0008_live_seats'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'idempotency_keys',
+        sa.Column('user_id', UUID(as_uuid=True), sa.ForeignKey('gym.users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('key', sa.Text(), primary_key=True),
+        sa.Column('request_hash', sa.Text(), nullable=False),
+        sa.Column('status_code', sa.Integer()),
+        sa.Column('response', JSONB()),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.text('now()')),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        schema='gym',
+    )
+    op.create_index('idx_idempotency_keys_expires', 'idempotency_keys', ['expires_at'], schema='gym')
+
+def downgrade():
+    op.drop_index('idx_idempotency_keys_expires', table_name='idempotency_keys', schema='gym')
+    op.drop_table('idempotency_keys', schema='gym')
@@ -0,0 +1,54 @@
+"""trainer calendar: NOTIFY trainer_calendar to invalidate the free-slot index
+
+Revision ID: 0010_trainer_calendar_notify
+Revises: 0009_idempotency_keys
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+
+revision = '0010_trainer_calendar_notify'
+down_revision = '0009_idempotency_keys'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.execute("""
+        CREATE OR REPLACE FUNCTION gym.notify_trainer_calendar() RETURNS TRIGGER AS $$
+        DECLARE
+          old_id TEXT;
+          new_id TEXT;
+        BEGIN
+          IF TG_OP <> 'INSERT' THEN
+            old_id := to_jsonb(OLD) ->> TG_ARGV[0];
+          END IF;
+          IF TG_OP <> 'DELETE' THEN
+            new_id := to_jsonb(NEW) ->> TG_ARGV[0];
+          END IF;
+          IF old_id IS NOT NULL THEN
+            PERFORM pg_notify('trainer_calendar', old_id);
+          END IF;
+          IF new_id IS NOT NULL AND new_id IS DISTINCT FROM old_id THEN
+            PERFORM pg_notify('trainer_calendar', new_id);
+          END IF;
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_notify_trainer_calendar_session
+          AFTER INSERT OR DELETE OR UPDATE OF trainer_id, start_time, end_time, status ON gym.sessions
+          FOR EACH ROW EXECUTE FUNCTION gym.notify_trainer_calendar('trainer_id');
+        CREATE TRIGGER trg_notify_trainer_calendar_availability
+          AFTER INSERT OR DELETE OR UPDATE ON gym.trainer_availability
+          FOR EACH ROW EXECUTE FUNCTION gym.notify_trainer_calendar('trainer_id');
+        CREATE TRIGGER trg_notify_trainer_calendar_trainer
+          AFTER INSERT OR DELETE OR UPDATE OF user_id, specialties ON gym.trainers
+          FOR EACH ROW EXECUTE FUNCTION gym.notify_trainer_calendar('id');
+    """)
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trg_notify_trainer_calendar_trainer ON gym.trainers")
+    op.execute("DROP TRIGGER IF EXISTS trg_notify_trainer_calendar_availability ON gym.trainer_availability")
+    op.execute("DROP TRIGGER IF EXISTS trg_notify_trainer_calendar_session ON gym.sessions")
+    op.execute("DROP FUNCTION IF EXISTS gym.notify_trainer_calendar()")
@@ -0,0 +1,137 @@
+# app/admission.py
+"""Control de admisión por sesión delante del camino de reserva.
+
+Cuando abre una clase popular, cientos de reservas se serializan en el mismo
+``SELECT ... FOR UPDATE`` y cada una espera con una conexión del pool, dejando
+sin conexiones al resto de endpoints. Aquí, por sesión y por worker:
+
+- como mucho ``ADMISSION_CONCURRENCY_PER_SESSION`` peticiones llegan a la BD;
+  el resto espera en una cola en memoria (sin conexión: se libera antes de
+  esperar) de como mucho ``ADMISSION_MAX_QUEUE_PER_SESSION`` peticiones y
+  ``ADMISSION_QUEUE_TIMEOUT_SECONDS``; fuera de eso, 503 con Retry-After;
+- con las plazas libres conocidas (pista que alimentan las propias reservas y
+  los NOTIFY de app/live.py, válida ``ADMISSION_SEATS_TTL_SECONDS``): sin
+  plazas y sin lista de espera se responde "Session llena" sin tocar la BD, y
+  no se admiten más peticiones en vuelo que plazas quedan (503 con
+  Retry-After: alguna de las que están dentro puede fallar y liberar plaza).
+
+La pista solo adelanta rechazos; quien decide sigue siendo la transacción con
+el lock de la sesión.
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+from . import metrics
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").strip().lower() not in ("0", "false", "no", "off")
+ADMISSION_CONCURRENCY_PER_SESSION = int(os.getenv("ADMISSION_CONCURRENCY_PER_SESSION", "2"))
+ADMISSION_MAX_QUEUE_PER_SESSION = int(os.getenv("ADMISSION_MAX_QUEUE_PER_SESSION", "50"))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "5"))
+ADMISSION_SEATS_TTL_SECONDS = float(os.getenv("ADMISSION_SEATS_TTL_SECONDS", "2"))
+ADMISSION_RETRY_AFTER_SECONDS = 1
+_SEATS_MAX_ENTRIES = 10000
+
+ADMISSION_REQUESTS = metrics.register(metrics.Counter(
+    "admission_requests_total", "Peticiones de reserva por resultado de admisión (admitted, queued, full, saturated, timeout)", ("outcome",),
+))
+
+class _Gate:
+    __slots__ = ("semaphore", "active", "waiting")
+
+    def __init__(self):
+        self.semaphore = asyncio.Semaphore(ADMISSION_CONCURRENCY_PER_SESSION)
+        self.active = 0
+        self.waiting = 0
+
+# Solo se tocan desde el event loop; _seats también desde hilos (asignaciones atómicas)
+_gates = {}
+_seats = {}
+
+def waiting() -> int:
+    return sum(gate.waiting for gate in _gates.values())
+
+metrics.register(metrics.CallbackGauge("admission_waiting", "Peticiones de reserva en cola de admisión", lambda: [({}, waiting())]))
+
+def note_seats(session_id, free: int, bookable: bool = True):
+    """Actualiza la pista de plazas libres de una sesión (``bookable`` False = no admite reservas)."""
+    if len(_seats) >= _SEATS_MAX_ENTRIES:
+        horizon = time.monotonic() - ADMISSION_SEATS_TTL_SECONDS
+        for sid in [sid for sid, (_, _, at) in _seats.items() if at < horizon]:
+            _seats.pop(sid, None)
+    _seats[str(session_id)] = (max(free, 0), bookable, time.monotonic())
+
+def note_notify(payload: dict):
+    """Observador de app/live.py: cada NOTIFY de plazas refresca la pista."""
+    note_seats(payload["id"], payload["capacity"] - payload["booked_count"], payload["status"] == "scheduled")
+
+def seats_hint(session_id):
+    """(plazas libres, reservable) si la pista está fresca; si no, None."""
+    entry = _seats.get(str(session_id))
+    if entry is None or time.monotonic() - entry[2] > ADMISSION_SEATS_TTL_SECONDS:
+        return None
+    return entry[0], entry[1]
+
+def _saturated(detail: str):
+    return HTTPException(status_code=503, detail=detail, headers={"Retry-After": str(ADMISSION_RETRY_AFTER_SECONDS)})
+
+def _check_seats(session_id, gate: _Gate, auto_waitlist: bool):
+    hint = seats_hint(session_id)
+    if hint is None or auto_waitlist:
+        # Con lista de espera una sesión llena sigue necesitando el lock (alta en cola)
+        return
+    free, bookable = hint
+    if not bookable:
+        ADMISSION_REQUESTS.inc(outcome="full")
+        raise HTTPException(status_code=400, detail="Session no está disponible")
+    if free <= 0:
+        ADMISSION_REQUESTS.inc(outcome="full")
+        raise HTTPException(status_code=400, detail="Session llena")
+    if gate.active >= free:
+        ADMISSION_REQUESTS.inc(outcome="saturated")
+        raise _saturated("Las plazas libres ya están en disputa, reintenta en unos segundos")
+
+@asynccontextmanager
+async def admit(session_id, auto_waitlist: bool = True, before_wait=None):
+    """Turno para reservar en ``session_id``; ``before_wait`` (async) libera la conexión si hay que esperar."""
+    if not ADMISSION_ENABLED:
+        yield
+        return
+    key = str(session_id)
+    gate = _gates.get(key)
+    if gate is None:
+        gate = _gates[key] = _Gate()
+    try:
+        _check_seats(key, gate, auto_waitlist)
+        if gate.semaphore.locked():
+            if gate.waiting >= ADMISSION_MAX_QUEUE_PER_SESSION:
+                ADMISSION_REQUESTS.inc(outcome="saturated")
+                raise _saturated("Demasiadas peticiones para esta sesión, reintenta en unos segundos")
+            ADMISSION_REQUESTS.inc(outcome="queued")
+            gate.waiting += 1
+            try:
+                if before_wait is not None:
+                    await before_wait()
+                await asyncio.wait_for(gate.semaphore.acquire(), ADMISSION_QUEUE_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                ADMISSION_REQUESTS.inc(outcome="timeout")
+                raise _saturated("Demasiadas peticiones para esta sesión, reintenta en unos segundos")
+            finally:
+                gate.waiting -= 1
+        else:
+            await gate.semaphore.acquire()
+        try:
+            # La sesión pudo llenarse mientras esperaba
+            _check_seats(key, gate, auto_waitlist)
+            gate.active += 1
+            ADMISSION_REQUESTS.inc(outcome="admitted")
+            try:
+                yield
+            finally:
+                gate.active -= 1
+        finally:
+            gate.semaphore.release()
+    finally:
+        if gate.active == 0 and gate.waiting == 0 and not gate.semaphore.locked() and _gates.get(key) is gate:
+            del _gates[key]
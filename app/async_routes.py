@@ -0,0 +1,163 @@
+# app/async_routes.py
+"""Versiones async de las rutas del camino de petición (DB_ASYNC=true).
+
+Mismos paths y contratos que ``sync_router`` en app/main.py. Las lecturas usan
+``AsyncSession`` directamente (en una réplica si las hay, ver app/replicas.py);
+las transacciones de reserva reutilizan la lógica de app/booking.py mediante
+``AsyncSession.run_sync``, que la ejecuta sobre la conexión asyncpg sin ocupar
+un hilo del threadpool.
+"""
+from datetime import date, datetime
+from typing import Optional, Literal
+from uuid import UUID
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.ext.asyncio import AsyncSession
+from .database import get_async_db
+from .models import User, Session as SessionModel, SessionStatus, ReservationStatus
+from .auth import create_access_token, get_current_user_async, Principal
+from .schemas import RegisterIn, TokenOut, SessionOut, SessionPage, ReserveIn, BatchReserveIn, BatchReserveOut, ReservationOut, ReservationPage, QuotaOut, SlotSearchOut
+from .crud import get_user_by_email_async, update_password_hash_async, search_sessions_stmt, user_reservations_stmt
+from .pagination import decode_cursor, clamp_limit, split_page
+from .replicas import get_async_read_db
+from . import admission, booking, hashing, idempotency, quota, slots
+
+router = APIRouter()
+
+@router.post("/auth/register", response_model=TokenOut)
+async def register(payload: RegisterIn, db: AsyncSession = Depends(get_async_db)):
+    existing = await get_user_by_email_async(db, payload.email)
+    if existing:
+        raise HTTPException(status_code=400, detail="Email ya registrado")
+    password_hash = await hashing.hash_password(payload.password)
+    user = User(full_name=payload.full_name, email=payload.email, password_hash=password_hash)
+    db.add(user)
+    await db.flush()
+    user_id = user.id
+    await db.commit()
+    token = create_access_token({"sub": str(user_id)})
+    return {"access_token": token, "token_type": "bearer"}
+
+@router.post("/auth/login", response_model=TokenOut)
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await get_user_by_email_async(db, form_data.username)
+    if not user:
+        raise HTTPException(status_code=400, detail="Credenciales incorrectas")
+    ok, new_hash = await hashing.verify_password(form_data.password, user.password_hash)
+    if not ok:
+        raise HTTPException(status_code=400, detail="Credenciales incorrectas")
+    if new_hash:
+        await update_password_hash_async(db, user.id, new_hash)
+    token = create_access_token({"sub": str(user.id)})
+    return {"access_token": token, "token_type": "bearer"}
+
+@router.get("/sessions", response_model=SessionPage)
+async def list_sessions(
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    location_id: Optional[UUID] = None,
+    class_type_id: Optional[UUID] = None,
+    trainer_id: Optional[UUID] = None,
+    status: Optional[SessionStatus] = None,
+    has_free_spots: Optional[bool] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    limit = clamp_limit(limit)
+    stmt = search_sessions_stmt(
+        limit,
+        after=decode_cursor(cursor) if cursor else None,
+        date_from=date_from,
+        date_to=date_to,
+        location_id=location_id,
+        class_type_id=class_type_id,
+        trainer_id=trainer_id,
+        status=status,
+        has_free_spots=has_free_spots,
+    )
+    rows, next_cursor = split_page((await db.execute(stmt)).scalars().all(), limit, lambda s: (s.start_time, s.id))
+    return {"items": rows, "next_cursor": next_cursor}
+
+@router.get("/sessions/{session_id}", response_model=SessionOut)
+async def get_session(session_id: UUID, db: AsyncSession = Depends(get_async_read_db)):
+    row = await db.get(SessionModel, session_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="Session no encontrada")
+    return row
+
+@router.post("/reservations")
+async def create_reservation(
+    payload: ReserveIn,
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key", max_length=idempotency.KEY_MAX_LENGTH),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user_async),
+):
+    return await idempotency.run_admitted(
+        db.run_sync,
+        admission.admit(payload.session_id, payload.auto_waitlist, before_wait=db.rollback),
+        current_user, idempotency_key, "reservations.create",
+        booking.create_reservation, payload.session_id, payload.auto_waitlist,
+    )
+
+@router.post("/reservations/batch", response_model=BatchReserveOut)
+async def create_reservations_batch(
+    payload: BatchReserveIn,
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key", max_length=idempotency.KEY_MAX_LENGTH),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user_async),
+):
+    return await db.run_sync(
+        idempotency.run, current_user, idempotency_key, "reservations.batch",
+        booking.create_reservations_batch, payload.session_ids, payload.auto_waitlist, payload.atomic,
+    )
+
+@router.patch("/reservations/{reservation_id}/cancel")
+async def cancel_reservation(
+    reservation_id: UUID,
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key", max_length=idempotency.KEY_MAX_LENGTH),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user_async),
+):
+    return await db.run_sync(idempotency.run, current_user, idempotency_key, "reservations.cancel", booking.cancel_reservation, reservation_id)
+
+@router.post("/sessions/{session_id}/waitlist")
+async def add_to_waitlist(session_id: UUID, db: AsyncSession = Depends(get_async_db), current_user: Principal = Depends(get_current_user_async)):
+    async with admission.admit(session_id, before_wait=db.rollback):
+        return await db.run_sync(booking.add_to_waitlist, current_user, session_id)
+
+@router.delete("/sessions/{session_id}/waitlist")
+async def leave_waitlist(session_id: UUID, db: AsyncSession = Depends(get_async_db), current_user: Principal = Depends(get_current_user_async)):
+    return await db.run_sync(booking.leave_waitlist, current_user, session_id)
+
+@router.get("/me/reservations", response_model=ReservationPage)
+async def my_reservations(
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    when: Optional[Literal["upcoming", "past"]] = None,
+    status: Optional[ReservationStatus] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: Principal = Depends(get_current_user_async),
+):
+    limit = clamp_limit(limit)
+    stmt = user_reservations_stmt(current_user.id, limit, after=decode_cursor(cursor) if cursor else None, when=when, status=status)
+    rows, next_cursor = split_page((await db.execute(stmt)).unique().scalars().all(), limit, lambda r: (r.session.start_time, r.id))
+    return ReservationPage(items=[ReservationOut.from_reservation(r) for r in rows], next_cursor=next_cursor)
+
+@router.get("/trainers/slots", response_model=SlotSearchOut)
+async def search_trainer_slots(
+    date_from: datetime,
+    date_to: datetime,
+    duration_minutes: int = Query(default=60, ge=15, le=480),
+    step_minutes: int = Query(default=30, ge=5, le=240),
+    specialty: Optional[str] = None,
+    trainer_id: Optional[UUID] = None,
+    limit: int = 50,
+    db: AsyncSession = Depends(get_async_db),
+):
+    items = await db.run_sync(slots.search, date_from, date_to, duration_minutes, step_minutes, specialty, trainer_id, clamp_limit(limit))
+    return {"items": items}
+
+@router.get("/me/quota", response_model=QuotaOut)
+async def my_quota(month: Optional[date] = None, db: AsyncSession = Depends(get_async_read_db), current_user: Principal = Depends(get_current_user_async)):
+    return quota.quota_out((await db.execute(quota.quota_stmt(current_user.id, month))).one())
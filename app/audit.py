@@ -0,0 +1,162 @@
+# app/audit.py
+"""Auditoría asíncrona por lotes (``gym.audit_logs``).
+
+``record()`` solo encola un dict en memoria (lock + ``deque.append``): no hay
+escritura dentro de la transacción de la reserva. Un hilo de fondo vacía la
+cola cada ``AUDIT_FLUSH_INTERVAL_SECONDS`` o en cuanto hay
+``AUDIT_BATCH_SIZE`` eventos, con un INSERT multi-fila por lote sobre el
+engine sync.
+
+La cola está acotada (``AUDIT_QUEUE_SIZE``); llena, ``AUDIT_DROP_POLICY``
+decide si se descarta el evento nuevo (``newest``) o el más antiguo
+(``oldest``). Los descartes se cuentan en ``audit_events_total{result="dropped"}``.
+``shutdown()`` para el hilo y vuelca lo pendiente.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from uuid import uuid4
+from sqlalchemy import insert
+from . import metrics
+from .models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+AUDIT_ENABLED = os.getenv("AUDIT_ENABLED", "true").strip().lower() not in ("0", "false", "no", "off")
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL_SECONDS = float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", "1.0"))
+AUDIT_DROP_POLICY = os.getenv("AUDIT_DROP_POLICY", "newest")
+
+AUDIT_EVENTS = metrics.register(metrics.Counter(
+    "audit_events_total", "Eventos de auditoría por resultado (queued, dropped, written, failed)", ("result",),
+))
+AUDIT_FLUSH_DURATION = metrics.register(metrics.Histogram(
+    "audit_flush_duration_seconds", "Duración de cada INSERT por lotes de auditoría",
+))
+
+class AuditBuffer:
+    """Cola acotada y thread-safe de eventos pendientes de escribir."""
+
+    def __init__(self, maxsize: int, drop_policy: str = "newest"):
+        if drop_policy not in ("newest", "oldest"):
+            raise ValueError(f"AUDIT_DROP_POLICY desconocida: {drop_policy}")
+        self.maxsize = maxsize
+        self.drop_policy = drop_policy
+        self.dropped = 0
+        self._items = deque()
+        self._lock = threading.Lock()
+
+    def put(self, item) -> bool:
+        """Encola ``item``; devuelve False si se descartó algún evento."""
+        with self._lock:
+            if len(self._items) >= self.maxsize:
+                self.dropped += 1
+                if self.drop_policy == "newest" or not self._items:
+                    return False
+                self._items.popleft()
+                self._items.append(item)
+                return False
+            self._items.append(item)
+            return True
+
+    def take(self, n: int) -> list:
+        with self._lock:
+            return [self._items.popleft() for _ in range(min(n, len(self._items)))]
+
+    def __len__(self):
+        return len(self._items)
+
+buffer = AuditBuffer(AUDIT_QUEUE_SIZE, AUDIT_DROP_POLICY)
+metrics.register(metrics.CallbackGauge("audit_queue_depth", "Eventos de auditoría pendientes de escribir", lambda: [({}, len(buffer))]))
+
+_wake = threading.Event()
+_stop = threading.Event()
+_thread = None
+
+def _json_safe(value):
+    if isinstance(value, dict):
+        return {k: _json_safe(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(v) for v in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def record(action: str, entity_type: str, entity_id=None, performed_by=None, payload=None):
+    """Encola un evento. Llamar tras el commit: lo auditado ya es definitivo."""
+    if not AUDIT_ENABLED:
+        return
+    event = {
+        "id": uuid4(),
+        "entity_type": entity_type,
+        "entity_id": entity_id,
+        "action": action,
+        "payload": _json_safe(payload) if payload else None,
+        "performed_by": performed_by,
+        "created_at": datetime.now(timezone.utc),
+    }
+    if buffer.put(event):
+        AUDIT_EVENTS.inc(result="queued")
+        if len(buffer) >= AUDIT_BATCH_SIZE:
+            _wake.set()
+    else:
+        AUDIT_EVENTS.inc(result="dropped")
+
+def record_promotions(promoted, performed_by=None):
+    for p in promoted:
+        record("waitlist.promoted", "session", p["session_id"], performed_by,
+               {"user_id": p["user_id"], "notified_at": p["notified_at"]})
+
+def flush_once(engine=None) -> int:
+    """Escribe un lote; devuelve cuántos eventos salieron de la cola."""
+    batch = buffer.take(AUDIT_BATCH_SIZE)
+    if not batch:
+        return 0
+    if engine is None:
+        from .database import engine
+    start = time.perf_counter()
+    try:
+        with engine.begin() as conn:
+            conn.execute(insert(AuditLog.__table__), batch)
+    except Exception:
+        # Sin reintento: un lote envenenado no debe bloquear la cola
+        logger.exception("No se pudo escribir un lote de %d eventos de auditoría", len(batch))
+        AUDIT_EVENTS.inc(len(batch), result="failed")
+    else:
+        AUDIT_EVENTS.inc(len(batch), result="written")
+    AUDIT_FLUSH_DURATION.observe(time.perf_counter() - start)
+    return len(batch)
+
+def flush_all(engine=None):
+    while flush_once(engine):
+        pass
+
+def _run():
+    while not _stop.is_set():
+        _wake.wait(AUDIT_FLUSH_INTERVAL_SECONDS)
+        _wake.clear()
+        while flush_once() >= AUDIT_BATCH_SIZE and not _stop.is_set():
+            pass
+
+def start():
+    global _thread
+    if not AUDIT_ENABLED or _thread is not None:
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_run, name="audit-flusher", daemon=True)
+    _thread.start()
+
+def shutdown():
+    global _thread
+    if _thread is not None:
+        _stop.set()
+        _wake.set()
+        _thread.join()
+        _thread = None
+    flush_all()
@@ -1,14 +1,18 @@
 # app/auth.py
 from datetime import datetime, timedelta
+from dataclasses import dataclass
 from typing import Optional
+from uuid import UUID
 import os
+import time
 import jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from .models import User
-from .database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from .models import User, UserRole
+from .cache import TTLCache
+from .database import get_db, get_async_db
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,15 +20,8 @@ SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
-def verify_password(plain, hashed):
-    return pwd_context.verify(plain, hashed)
-
-def get_password_hash(password):
-    return pwd_context.hash(password)
-
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
@@ -32,21 +29,79 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="No autorizado",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+# Caché de tokens decodificados y de principals: evita jwt.decode + db.get(User) por petición.
+# Es por proceso: deactivate/cambio de rol invalidan explícitamente la entrada local y el TTL
+# acota cuánto puede tardar en verlo otro worker.
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "50000"))
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+
+@dataclass(frozen=True)
+class Principal:
+    """Lo mínimo del usuario autenticado que necesitan los endpoints."""
+    id: UUID
+    role: UserRole
+    is_active: bool
+    plan_id: Optional[UUID]
+
+    @classmethod
+    def from_user(cls, user: User):
+        return cls(id=user.id, role=user.role, is_active=bool(user.is_active), plan_id=user.plan_id)
+
+token_cache = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL_SECONDS)
+principal_cache = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL_SECONDS)
+
+def invalidate_principal(user_id: UUID):
+    """Llamar tras desactivar un usuario o cambiar su rol/plan."""
+    principal_cache.invalidate(user_id)
+
+def auth_cache_stats():
+    return {"tokens": token_cache.stats(), "principals": principal_cache.stats()}
+
+def _user_id_from_token(token: str):
+    user_id = token_cache.get(token)
+    if user_id is not None:
+        return user_id
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except jwt.PyJWTError:
-        raise credentials_exception
+        sub: str = payload.get("sub")
+        if sub is None:
+            raise _credentials_exception()
+        user_id = UUID(sub)
+    except (jwt.PyJWTError, ValueError):
+        raise _credentials_exception()
+    # Nunca más allá del exp del propio token
+    token_cache.set(token, user_id, ttl=payload["exp"] - time.time() if "exp" in payload else None)
+    return user_id
 
-    user = db.get(User, user_id)
+def _principal_for(user: Optional[User]):
     if not user or not getattr(user, "is_active", True):
-        raise credentials_exception
-    return user
+        raise _credentials_exception()
+    principal = Principal.from_user(user)
+    principal_cache.set(user.id, principal)
+    return principal
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    user_id = _user_id_from_token(token)
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+    return _principal_for(db.get(User, user_id))
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    user_id = _user_id_from_token(token)
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+    return _principal_for(await db.get(User, user_id))
+
+def require_admin(current_user: Principal = Depends(get_current_user)):
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="No autorizado")
+    return current_user
@@ -0,0 +1,322 @@
+# app/booking.py
+"""Lógica transaccional de reservas y lista de espera.
+
+Funciones síncronas sobre una ``Session`` de SQLAlchemy: los endpoints sync
+las llaman directamente y los async vía ``AsyncSession.run_sync``, así la
+lógica de locks y contadores vive en un único sitio.
+"""
+from typing import Optional
+from uuid import UUID
+from fastapi import HTTPException
+from sqlalchemy import select, insert, update, func
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from .models import Session as SessionModel, Reservation, WaitlistEntry, UserBookedInterval
+from .crud import get_session_for_update
+from . import admission, audit, quota, waitlist
+from .metrics import BOOKING_STEP_DURATION, BOOKING_OUTCOMES
+
+OVERLAP_DETAIL = "Tienes otra reserva que se solapa con este horario"
+ALREADY_BOOKED_DETAIL = "Ya tienes reserva en esta sesión"
+
+# Reglas que aplica la BD al escribir la reserva: SQLSTATE -> (outcome, detalle)
+_DB_RULES = {
+    "23P01": ("overlap", OVERLAP_DETAIL),  # ex_user_booked_intervals_overlap
+    quota.QUOTA_SQLSTATE: ("quota", quota.QUOTA_DETAIL),  # gym.sync_user_monthly_usage
+}
+
+def _db_rule(exc: DBAPIError):
+    """(outcome, detalle) si ``exc`` es una de _DB_RULES; si no, None.
+
+    DBAPIError y no IntegrityError: asyncpg no clasifica el SQLSTATE propio 23Q01.
+    psycopg2 y el adaptador asyncpg de SQLAlchemy exponen ambos ``pgcode``.
+    """
+    return _DB_RULES.get(getattr(exc.orig, "pgcode", None))
+
+def _has_overlap(db: Session, user_id: UUID, sess_row) -> bool:
+    # Sondeo del índice GiST de la restricción de exclusión (user_id =, period &&)
+    return db.execute(
+        select(UserBookedInterval.reservation_id).filter(
+            UserBookedInterval.user_id == user_id,
+            UserBookedInterval.period.op("&&")(func.tstzrange(sess_row.start_time, sess_row.end_time)),
+        ).limit(1)
+    ).first() is not None
+
+def _rejected(db: Session, detail, outcome: Optional[str] = None, status_code: int = 400) -> HTTPException:
+    """Deshace la transacción y devuelve el error para ``raise``.
+
+    Suelta ya el FOR UPDATE de la sesión: si no, seguiría tomado hasta que
+    get_db cierre la sesión, después de enviar la respuesta, y haría esperar
+    a las demás reservas de la misma sesión.
+    """
+    db.rollback()
+    if outcome is not None:
+        BOOKING_OUTCOMES.inc(outcome=outcome)
+    return HTTPException(status_code=status_code, detail=detail)
+
+def create_reservation(db: Session, user, session_id: UUID, auto_waitlist: bool = True):
+    # La transacción puede venir abierta (autobegin de get_current_user); se confirma con commit explícito
+    with BOOKING_STEP_DURATION.time(operation="create", step="lock_wait"):
+        sess_row = get_session_for_update(db, session_id)
+    if not sess_row:
+        raise _rejected(db, "Session no encontrada", "not_found", status_code=404)
+    if sess_row.status != 'scheduled':
+        admission.note_seats(session_id, 0, bookable=False)
+        raise _rejected(db, "Session no está disponible", "unavailable")
+    # UNIQUE(session_id, user_id): solo una reserva cancelada se reactiva. attended/no_show son
+    # historial de asistencia (informes y cuota cuentan con ellas): no vuelven a booked
+    res = db.execute(select(Reservation).filter_by(session_id=session_id, user_id=user.id)).scalar_one_or_none()
+    if res is not None and res.status != 'cancelled':
+        raise _rejected(db, ALREADY_BOOKED_DETAIL, "already_booked")
+    # booked_count se mantiene por trigger: comprobación O(1) bajo el lock FOR UPDATE
+    booked_count = sess_row.booked_count
+    # Pista de plazas libres para el control de admisión (app/admission.py)
+    free = sess_row.capacity - booked_count
+    admission.note_seats(session_id, free)
+    if booked_count >= sess_row.capacity:
+        # Sin INSERT que dispare la restricción de exclusión: el solape se comprueba aquí
+        with BOOKING_STEP_DURATION.time(operation="create", step="overlap_query"):
+            overlap = _has_overlap(db, user.id, sess_row)
+        if overlap:
+            raise _rejected(db, OVERLAP_DETAIL, "overlap")
+        # Ni cola para quien ya agotó la cuota de ese mes: la promoción se lo saltaría
+        _, remaining = quota.remaining_by_session(db, user.id, [session_id]).get(session_id, (None, None))
+        if remaining is not None and remaining <= 0:
+            raise _rejected(db, quota.QUOTA_DETAIL, "quota")
+        if auto_waitlist:
+            # La posición se calcula bajo el lock de la sesión: sin duplicados entre altas concurrentes
+            positions = waitlist.enqueue(db, user.id, [session_id])
+            if session_id not in positions:
+                raise _rejected(db, "Ya estás en la lista de espera", "already_waitlisted")
+            with BOOKING_STEP_DURATION.time(operation="create", step="commit"):
+                db.commit()
+            BOOKING_OUTCOMES.inc(outcome="waitlisted")
+            audit.record("waitlist.joined", "session", session_id, user.id, {"position": positions[session_id]})
+            return {"status": "waitlisted", "position": positions[session_id]}
+        else:
+            raise _rejected(db, "Session llena", "full")
+    if res is None:
+        res = Reservation(session_id=session_id, user_id=user.id, status='booked')
+    else:
+        res.status = 'booked'
+        res.updated_at = func.now()
+    db.add(res)
+    # Solape y cuota mensual los rechazan los triggers al escribir (sin consultas previas)
+    try:
+        with BOOKING_STEP_DURATION.time(operation="create", step="insert"):
+            db.flush()
+    except DBAPIError as exc:
+        db.rollback()
+        rule = _db_rule(exc)
+        if rule is None:
+            raise
+        BOOKING_OUTCOMES.inc(outcome=rule[0])
+        raise HTTPException(status_code=400, detail=rule[1])
+    reservation_id = res.id
+    with BOOKING_STEP_DURATION.time(operation="create", step="commit"):
+        db.commit()
+    admission.note_seats(session_id, free - 1)
+    BOOKING_OUTCOMES.inc(outcome="booked")
+    audit.record("reservation.booked", "reservation", reservation_id, user.id, {"session_id": session_id})
+    return {"reservation_id": str(reservation_id), "status": "booked"}
+
+def _load_batch(db: Session, user_id: UUID, ids: list):
+    """Bloquea las sesiones del lote y lee, por conjunto, lo que decide cada resultado."""
+    with BOOKING_STEP_DURATION.time(operation="batch", step="lock_wait"):
+        sessions = {
+            row.id: row for row in db.execute(
+                select(SessionModel).filter(SessionModel.id.in_(ids)).order_by(SessionModel.id)
+                .with_for_update().execution_options(populate_existing=True)
+            ).scalars()
+        }
+
+    # Reservas previas del usuario en estas sesiones (UNIQUE(session_id, user_id): una cancelada se reactiva)
+    previous = dict(db.execute(
+        select(Reservation.session_id, Reservation.status)
+        .filter(Reservation.user_id == user_id, Reservation.session_id.in_(ids))
+    ).all())
+    waiting = dict(db.execute(
+        select(WaitlistEntry.session_id, WaitlistEntry.position)
+        .filter(WaitlistEntry.user_id == user_id, WaitlistEntry.session_id.in_(ids), WaitlistEntry.notified_at.is_(None))
+    ).all())
+    # Sesiones pedidas que solapan con alguna reserva vigente del usuario (índice GiST de user_booked_intervals)
+    with BOOKING_STEP_DURATION.time(operation="batch", step="overlap_query"):
+        overlapping = set(db.execute(
+            select(SessionModel.id).distinct()
+            .join(UserBookedInterval, UserBookedInterval.period.op("&&")(SessionModel.period))
+            .filter(SessionModel.id.in_(ids), UserBookedInterval.user_id == user_id)
+        ).scalars())
+    # Cuota restante por mes; se descuenta según se asignan plazas en el bucle
+    quota_left = quota.remaining_by_session(db, user_id, ids)
+    return sessions, previous, waiting, overlapping, quota_left
+
+def create_reservations_batch(db: Session, user, session_ids, auto_waitlist: bool = True, atomic: bool = False):
+    """Reserva varias sesiones con un único pase de locks.
+
+    Las sesiones se bloquean ordenadas por id (mismo orden en todas las
+    peticiones: sin interbloqueos entre lotes que se cruzan); solapes,
+    duplicados y posiciones de espera se resuelven con consultas por conjunto
+    y las filas nuevas se insertan con un INSERT multi-fila. Con ``atomic``
+    cualquier fallo deshace el lote entero (409 con el detalle por sesión).
+    """
+    ids = sorted(set(session_ids))
+    sessions, previous, waiting, overlapping, quota_left = _load_batch(db, user.id, ids)
+    month_left = {}
+
+    outcomes = {}
+    to_book, to_revive, to_waitlist = [], [], []
+    last_end = None
+    for sess_row in sorted(sessions.values(), key=lambda s: (s.start_time, s.id)):
+        sid = sess_row.id
+        month, remaining = quota_left[sid]
+        remaining = month_left.setdefault(month, remaining)
+        if previous.get(sid, 'cancelled') != 'cancelled':
+            outcomes[sid] = {"status": "failed", "reason": ALREADY_BOOKED_DETAIL}
+        elif sess_row.status != 'scheduled':
+            outcomes[sid] = {"status": "failed", "reason": "Session no está disponible"}
+        elif sid in overlapping or (last_end is not None and sess_row.start_time < last_end):
+            outcomes[sid] = {"status": "failed", "reason": OVERLAP_DETAIL}
+        elif remaining is not None and remaining <= 0:
+            outcomes[sid] = {"status": "failed", "reason": quota.QUOTA_DETAIL}
+        elif sess_row.booked_count < sess_row.capacity:
+            (to_revive if sid in previous else to_book).append(sid)
+            last_end = sess_row.end_time if last_end is None else max(last_end, sess_row.end_time)
+            if remaining is not None:
+                month_left[month] = remaining - 1
+        elif sid in waiting:
+            outcomes[sid] = {"status": "waitlisted", "position": waiting[sid]}
+        elif auto_waitlist:
+            to_waitlist.append(sid)
+        else:
+            outcomes[sid] = {"status": "failed", "reason": "Session llena"}
+    for sid in ids:
+        if sid not in sessions:
+            outcomes[sid] = {"status": "failed", "reason": "Session no encontrada"}
+
+    if atomic and any(o["status"] == "failed" for o in outcomes.values()):
+        db.rollback()
+        items = [{"session_id": str(sid), **outcomes[sid]} for sid in ids if sid in outcomes]
+        raise HTTPException(status_code=409, detail={"message": "Lote rechazado: ninguna reserva realizada", "items": items})
+
+    try:
+        if to_book:
+            rows = db.execute(
+                insert(Reservation).returning(Reservation.id, Reservation.session_id),
+                [{"session_id": sid, "user_id": user.id, "status": 'booked'} for sid in to_book],
+            ).all()
+            for reservation_id, sid in rows:
+                outcomes[sid] = {"status": "booked", "reservation_id": str(reservation_id)}
+        if to_revive:
+            rows = db.execute(
+                update(Reservation)
+                .filter(
+                    Reservation.user_id == user.id, Reservation.session_id.in_(to_revive),
+                    Reservation.status == 'cancelled',
+                )
+                .values(status='booked', updated_at=func.now())
+                .returning(Reservation.id, Reservation.session_id)
+            ).all()
+            for reservation_id, sid in rows:
+                outcomes[sid] = {"status": "booked", "reservation_id": str(reservation_id)}
+    except DBAPIError as exc:
+        # Otra reserva del mismo usuario, en sesiones no bloqueadas por este lote, ganó la carrera
+        db.rollback()
+        rule = _db_rule(exc)
+        if rule is None:
+            raise
+        BOOKING_OUTCOMES.inc(outcome=rule[0])
+        raise HTTPException(status_code=409, detail=rule[1])
+    if to_waitlist:
+        for sid, position in waitlist.enqueue(db, user.id, to_waitlist).items():
+            outcomes[sid] = {"status": "waitlisted", "position": position}
+    with BOOKING_STEP_DURATION.time(operation="batch", step="commit"):
+        db.commit()
+
+    result = [{"session_id": sid, **outcomes[sid]} for sid in ids]
+    for item in result:
+        BOOKING_OUTCOMES.inc(outcome=item["status"])
+        if item["status"] == "booked":
+            audit.record("reservation.booked", "reservation", UUID(item["reservation_id"]), user.id, {"session_id": item["session_id"], "batch": True})
+        elif item["status"] == "waitlisted":
+            audit.record("waitlist.joined", "session", item["session_id"], user.id, {"position": item["position"], "batch": True})
+    return {
+        "items": result,
+        "booked": sum(1 for o in result if o["status"] == "booked"),
+        "waitlisted": sum(1 for o in result if o["status"] == "waitlisted"),
+        "failed": sum(1 for o in result if o["status"] == "failed"),
+    }
+
+def cancel_reservation(db: Session, user, reservation_id: UUID):
+    res = db.get(Reservation, reservation_id)
+    if not res:
+        raise HTTPException(status_code=404, detail="Reserva no encontrada")
+    if str(res.user_id) != str(user.id) and user.role != 'admin':
+        raise HTTPException(status_code=403, detail="No autorizado")
+    session_id = res.session_id
+    # Bloquear la sesión antes de tocar la reserva: mismo orden de locks que create_reservation
+    with BOOKING_STEP_DURATION.time(operation="cancel", step="lock_wait"):
+        get_session_for_update(db, session_id)
+    # Estado releído bajo el lock: dos cancelaciones a la vez no promueven ni auditan dos veces
+    db.refresh(res)
+    if res.status != 'booked':
+        db.rollback()
+        raise HTTPException(status_code=400, detail="La reserva no está activa")
+    res.status = 'cancelled'
+    db.add(res)
+    db.flush()
+    # Relectura tras el trigger de contadores; la promoción va en la misma transacción que la cancelación
+    with BOOKING_STEP_DURATION.time(operation="cancel", step="promote"):
+        promoted = waitlist.promote(db, get_session_for_update(db, session_id))
+    with BOOKING_STEP_DURATION.time(operation="cancel", step="commit"):
+        db.commit()
+    BOOKING_OUTCOMES.inc(outcome="cancelled")
+    audit.record("reservation.cancelled", "reservation", reservation_id, user.id, {"session_id": session_id})
+    audit.record_promotions(promoted, user.id)
+    return {"status": "cancelled", "promoted": len(promoted)}
+
+def add_to_waitlist(db: Session, user, session_id: UUID):
+    sess = get_session_for_update(db, session_id)
+    if not sess:
+        raise _rejected(db, "Session no encontrada", status_code=404)
+    # Mismas reglas que create_reservation: promote se saltaría estas entradas para siempre
+    if sess.status != 'scheduled':
+        raise _rejected(db, "Session no está disponible")
+    existing = db.execute(select(Reservation.status).filter_by(session_id=session_id, user_id=user.id)).scalar_one_or_none()
+    if existing is not None and existing != 'cancelled':
+        raise _rejected(db, ALREADY_BOOKED_DETAIL)
+    if _has_overlap(db, user.id, sess):
+        raise _rejected(db, OVERLAP_DETAIL)
+    _, remaining = quota.remaining_by_session(db, user.id, [session_id])[session_id]
+    if remaining is not None and remaining <= 0:
+        raise _rejected(db, quota.QUOTA_DETAIL)
+    positions = waitlist.enqueue(db, user.id, [session_id])
+    if session_id not in positions:
+        raise _rejected(db, "Ya estás en la lista de espera")
+    db.commit()
+    audit.record("waitlist.joined", "session", session_id, user.id, {"position": positions[session_id]})
+    return {"status": "waitlisted", "position": positions[session_id]}
+
+def leave_waitlist(db: Session, user, session_id: UUID):
+    if not get_session_for_update(db, session_id):
+        raise _rejected(db, "Session no encontrada", status_code=404)
+    if not waitlist.leave(db, user.id, session_id):
+        raise _rejected(db, "No estás en la lista de espera", status_code=404)
+    db.commit()
+    audit.record("waitlist.left", "session", session_id, user.id)
+    return {"status": "left"}
+
+def set_session_capacity(db: Session, session_id: UUID, capacity: int, performed_by: UUID = None):
+    sess_row = get_session_for_update(db, session_id)
+    if not sess_row:
+        raise _rejected(db, "Session no encontrada", status_code=404)
+    previous = sess_row.capacity
+    if capacity < sess_row.booked_count:
+        raise _rejected(db, f"Ya hay {sess_row.booked_count} reservas: la capacidad no puede ser menor")
+    sess_row.capacity = capacity
+    db.flush()
+    # Una ampliación de aforo llena las plazas nuevas desde la cola en la misma transacción
+    promoted = waitlist.promote(db, sess_row)
+    db.commit()
+    audit.record("session.capacity_changed", "session", session_id, performed_by, {"from": previous, "to": capacity})
+    audit.record_promotions(promoted, performed_by)
+    return {"id": str(session_id), "capacity": capacity, "promoted": len(promoted)}
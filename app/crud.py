@@ -1,15 +1,145 @@
-
 # app/crud.py
-from sqlalchemy import select, func
-from sqlalchemy.orm import Session
-from .models import User, Session as SessionModel, Reservation, WaitlistEntry, Trainer
+from typing import Optional
+from datetime import datetime
+from sqlalchemy import select, func, text, bindparam, tuple_, update
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
+from sqlalchemy.orm import Session, contains_eager, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from .models import User, Session as SessionModel, Reservation, WaitlistEntry, Trainer, SessionStatus, ReservationStatus
 from uuid import UUID
 
 def get_user_by_email(db: Session, email: str):
     return db.execute(select(User).filter_by(email=email)).scalar_one_or_none()
 
+def update_password_hash(db: Session, user_id: UUID, password_hash: str):
+    db.execute(update(User).filter_by(id=user_id).values(password_hash=password_hash))
+    db.commit()
+
 def get_session_for_update(db: Session, session_id: UUID):
-    return db.execute(select(SessionModel).filter_by(id=session_id).with_for_update()).scalar_one_or_none()
+    # populate_existing: los contadores deben leerse del row bloqueado, no del identity map
+    stmt = select(SessionModel).filter_by(id=session_id).with_for_update().execution_options(populate_existing=True)
+    return db.execute(stmt).scalar_one_or_none()
+
+# Versiones async (DB_ASYNC=true) de los helpers de usuario
+async def get_user_by_email_async(db: AsyncSession, email: str):
+    return (await db.execute(select(User).filter_by(email=email))).scalar_one_or_none()
+
+async def update_password_hash_async(db: AsyncSession, user_id: UUID, password_hash: str):
+    await db.execute(update(User).filter_by(id=user_id).values(password_hash=password_hash))
+    await db.commit()
+
+def search_sessions_stmt(
+    limit: int,
+    after: Optional[tuple[datetime, UUID]] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    location_id: Optional[UUID] = None,
+    class_type_id: Optional[UUID] = None,
+    trainer_id: Optional[UUID] = None,
+    status: Optional[SessionStatus] = None,
+    has_free_spots: Optional[bool] = None,
+):
+    """SELECT keyset ordenado por (start_time, id).
+
+    Los filtros por location/class_type/trainer usan los índices compuestos
+    (fk, start_time, id) de la migración 0003; sin filtro, idx_sessions_start_id.
+    Se pide limit + 1 filas para saber si hay página siguiente sin un COUNT.
+    """
+    q = select(SessionModel).order_by(SessionModel.start_time, SessionModel.id).limit(limit + 1)
+    if after is not None:
+        q = q.filter(tuple_(SessionModel.start_time, SessionModel.id) > tuple_(*after))
+    if date_from is not None:
+        q = q.filter(SessionModel.start_time >= date_from)
+    if date_to is not None:
+        q = q.filter(SessionModel.start_time < date_to)
+    if location_id is not None:
+        q = q.filter(SessionModel.location_id == location_id)
+    if class_type_id is not None:
+        q = q.filter(SessionModel.class_type_id == class_type_id)
+    if trainer_id is not None:
+        q = q.filter(SessionModel.trainer_id == trainer_id)
+    if status is not None:
+        q = q.filter(SessionModel.status == status)
+    if has_free_spots is True:
+        q = q.filter(SessionModel.booked_count < SessionModel.capacity)
+    elif has_free_spots is False:
+        q = q.filter(SessionModel.booked_count >= SessionModel.capacity)
+    return q
+
+def user_reservations_stmt(
+    user_id: UUID,
+    limit: int,
+    after: Optional[tuple[datetime, UUID]] = None,
+    when: Optional[str] = None,
+    status: Optional[ReservationStatus] = None,
+    now: Optional[datetime] = None,
+):
+    """Reservas de un usuario con su sesión, clase, sala y entrenador en una sola consulta.
+
+    Orden keyset por (session.start_time, reservation.id): ascendente salvo
+    when='past', que va de la más reciente hacia atrás.
+    """
+    descending = when == "past"
+    order = (SessionModel.start_time.desc(), Reservation.id.desc()) if descending else (SessionModel.start_time, Reservation.id)
+    q = (
+        select(Reservation)
+        .join(Reservation.session)
+        .options(
+            contains_eager(Reservation.session).options(
+                joinedload(SessionModel.class_type),
+                joinedload(SessionModel.location),
+                joinedload(SessionModel.trainer).joinedload(Trainer.user),
+            )
+        )
+        .filter(Reservation.user_id == user_id)
+        .order_by(*order)
+        .limit(limit + 1)
+    )
+    if after is not None:
+        key = tuple_(SessionModel.start_time, Reservation.id)
+        q = q.filter(key < tuple_(*after) if descending else key > tuple_(*after))
+    if when == "upcoming":
+        q = q.filter(SessionModel.start_time >= (now or func.now()))
+    elif when == "past":
+        q = q.filter(SessionModel.start_time < (now or func.now()))
+    if status is not None:
+        q = q.filter(Reservation.status == status)
+    return q
+
+_RECONCILE_COUNTERS_SQL = text("""
+    WITH target AS (
+        SELECT s.id,
+               (SELECT count(*) FROM gym.reservations r WHERE r.session_id = s.id AND r.status = 'booked') AS booked,
+               (SELECT count(*) FROM gym.waitlist_entries w WHERE w.session_id = s.id AND w.notified_at IS NULL) AS waiting
+          FROM gym.sessions s
+         WHERE s.id = ANY(:ids)
+    )
+    UPDATE gym.sessions s
+       SET booked_count = t.booked, waitlist_count = t.waiting
+      FROM target t
+     WHERE s.id = t.id AND (s.booked_count <> t.booked OR s.waitlist_count <> t.waiting)
+    RETURNING s.id
+""").bindparams(bindparam("ids", type_=ARRAY(PG_UUID(as_uuid=True))))
+
+def reconcile_session_counters(db: Session, session_ids: Optional[list[UUID]] = None, batch_size: int = 500):
+    """Recalcula booked_count/waitlist_count y corrige las sesiones con deriva.
 
-def count_booked(db: Session, session_id: UUID):
-    return db.execute(select(func.count()).select_from(Reservation).filter_by(session_id=session_id, status='booked')).scalar_one()
+    Trabaja por lotes ordenados por id: bloquea las filas (mismo lock que la reserva)
+    y recuenta en una sentencia posterior, así el recuento no compite con reservas en curso.
+    Devuelve la lista de ids corregidos.
+    """
+    fixed = []
+    last_id = None
+    while True:
+        q = select(SessionModel.id).order_by(SessionModel.id).limit(batch_size).with_for_update()
+        if session_ids is not None:
+            q = q.filter(SessionModel.id.in_(session_ids))
+        if last_id is not None:
+            q = q.filter(SessionModel.id > last_id)
+        ids = db.execute(q).scalars().all()
+        if not ids:
+            break
+        fixed.extend(db.execute(_RECONCILE_COUNTERS_SQL, {"ids": list(ids)}).scalars().all())
+        db.commit()
+        last_id = ids[-1]
+    return fixed
@@ -1,20 +1,119 @@
-
 # app/database.py
 import os
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
+from .dbstats import InstrumentedQueuePool, InstrumentedAsyncQueuePool, instrument_engine
 
 load_dotenv(".env.example")
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL, future=True)
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+# Pool y timeouts configurables (ver .env.example)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", "true")
+# 0 = sin límite. Se fijan como parámetros de arranque de la conexión, así acotan
+# cada transacción sin un SET LOCAL (round trip extra) por transacción.
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+DB_LOCK_TIMEOUT_MS = int(os.getenv("DB_LOCK_TIMEOUT_MS", "0"))
+
+def _server_settings():
+    settings = {}
+    if DB_STATEMENT_TIMEOUT_MS:
+        settings["statement_timeout"] = str(DB_STATEMENT_TIMEOUT_MS)
+    if DB_LOCK_TIMEOUT_MS:
+        settings["lock_timeout"] = str(DB_LOCK_TIMEOUT_MS)
+    return settings
+
+def _pool_kwargs(poolclass):
+    return dict(
+        poolclass=poolclass,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+
+def _psycopg2_connect_args(settings: dict):
+    options = " ".join(f"-c {k}={v}" for k, v in settings.items())
+    return {"options": options} if options else {}
+
+engine = create_engine(
+    DATABASE_URL,
+    future=True,
+    connect_args=_psycopg2_connect_args(_server_settings()),
+    **_pool_kwargs(InstrumentedQueuePool),
+)
+instrument_engine(engine)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
+# Réplicas de lectura (opcional, URLs separadas por comas): solo las usan las rutas de
+# lectura, vía app/replicas.py. Sus conexiones son de solo lectura aunque la URL apunte
+# a un servidor que admita escrituras.
+DATABASE_REPLICA_URLS = [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+_REPLICA_SETTINGS = {"default_transaction_read_only": "on"}
+
+replica_engines = []
+for _url in DATABASE_REPLICA_URLS:
+    _replica = create_engine(
+        _url,
+        future=True,
+        connect_args=_psycopg2_connect_args({**_server_settings(), **_REPLICA_SETTINGS}),
+        **_pool_kwargs(InstrumentedQueuePool),
+    )
+    instrument_engine(_replica)
+    replica_engines.append(_replica)
+ReplicaSessions = [sessionmaker(bind=e, autoflush=False, autocommit=False, future=True) for e in replica_engines]
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+# Modo async (DB_ASYNC=true): AsyncEngine + asyncpg para las rutas de app/async_routes.py.
+# El engine sync se mantiene siempre (CLI de mantenimiento y rutas no portadas).
+DB_ASYNC = _env_bool("DB_ASYNC", "false")
+
+def _to_async_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    return f"postgresql+asyncpg{sep}{rest}" if scheme.startswith("postgresql") else url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _to_async_url(DATABASE_URL)
+
+async_engine = None
+AsyncSessionLocal = None
+# Mismo orden que replica_engines (el índice identifica la réplica en app/replicas.py)
+async_replica_engines = []
+AsyncReplicaSessions = []
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        connect_args={"server_settings": _server_settings()},
+        **_pool_kwargs(InstrumentedAsyncQueuePool),
+    )
+    instrument_engine(async_engine.sync_engine)
+    # expire_on_commit=False: tras el commit no hay lazy-load implícito fuera de run_sync
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+    for _url in DATABASE_REPLICA_URLS:
+        _replica = create_async_engine(
+            _to_async_url(_url),
+            connect_args={"server_settings": {**_server_settings(), **_REPLICA_SETTINGS}},
+            **_pool_kwargs(InstrumentedAsyncQueuePool),
+        )
+        instrument_engine(_replica.sync_engine)
+        async_replica_engines.append(_replica)
+    AsyncReplicaSessions = [async_sessionmaker(bind=e, autoflush=False, expire_on_commit=False) for e in async_replica_engines]
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
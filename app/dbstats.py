@@ -0,0 +1,134 @@
+# app/dbstats.py
+"""Instrumentación del pool de conexiones y de las sentencias SQL.
+
+- ``InstrumentedQueuePool`` / ``InstrumentedAsyncQueuePool`` miden la espera
+  de checkout (tiempo bloqueado esperando una conexión libre) y cuentan los
+  timeouts del pool.
+- ``instrument_engine`` cuenta sentencias y tiempo de BD, globalmente y por
+  petición (contextvar abierto por el middleware HTTP de app/main.py).
+
+Todo son sumas/contadores en memoria: el coste por sentencia es un par de
+``perf_counter()``.
+"""
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from . import metrics
+
+class RequestDbStats:
+    __slots__ = ("queries", "query_seconds", "checkout_wait_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.checkout_wait_seconds = 0.0
+
+_request_stats: ContextVar[Optional[RequestDbStats]] = ContextVar("request_db_stats", default=None)
+
+class _Totals:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_wait_seconds = 0.0
+        self.checkout_wait_max = 0.0
+        self.checkout_timeouts = 0
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.requests = 0
+        self.request_queries = 0
+
+totals = _Totals()
+
+def _record_checkout(waited: float, timed_out: bool = False):
+    with totals.lock:
+        if timed_out:
+            totals.checkout_timeouts += 1
+        else:
+            totals.checkouts += 1
+        totals.checkout_wait_seconds += waited
+        totals.checkout_wait_max = max(totals.checkout_wait_max, waited)
+    if not timed_out:
+        metrics.DB_POOL_CHECKOUT_WAIT.observe(waited)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.checkout_wait_seconds += waited
+
+class _CheckoutTimingMixin:
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            _record_checkout(time.perf_counter() - start, timed_out=True)
+            raise
+        _record_checkout(time.perf_counter() - start)
+        return conn
+
+class InstrumentedQueuePool(_CheckoutTimingMixin, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(_CheckoutTimingMixin, AsyncAdaptedQueuePool):
+    pass
+
+def instrument_engine(sync_engine):
+    """Registra los listeners de sentencias sobre un Engine sync (o ``async_engine.sync_engine``)."""
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        with totals.lock:
+            totals.queries += 1
+            totals.query_seconds += elapsed
+        metrics.DB_QUERY_DURATION.observe(elapsed)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.query_seconds += elapsed
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _on_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start"):
+            conn.info["query_start"].pop()
+
+def begin_request():
+    stats = RequestDbStats()
+    return stats, _request_stats.set(stats)
+
+def end_request(stats: RequestDbStats, token):
+    _request_stats.reset(token)
+    with totals.lock:
+        totals.requests += 1
+        totals.request_queries += stats.queries
+
+def pool_status(engine):
+    pool = engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "checked_in": pool.checkedin(),
+    }
+
+def snapshot(*engines):
+    with totals.lock:
+        data = {
+            "checkouts": totals.checkouts,
+            "checkout_timeouts": totals.checkout_timeouts,
+            "checkout_wait_avg_ms": round(1000 * totals.checkout_wait_seconds / totals.checkouts, 3) if totals.checkouts else 0.0,
+            "checkout_wait_max_ms": round(1000 * totals.checkout_wait_max, 3),
+            "queries": totals.queries,
+            "query_time_ms": round(1000 * totals.query_seconds, 3),
+            "requests": totals.requests,
+            "queries_per_request": round(totals.request_queries / totals.requests, 3) if totals.requests else 0.0,
+        }
+    data["pools"] = {name: pool_status(engine) for name, engine in engines if engine is not None}
+    return data
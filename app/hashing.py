@@ -0,0 +1,102 @@
+# app/hashing.py
+"""Hash/verificación de contraseñas en un pool de procesos dedicado.
+
+bcrypt cuesta ~100-250 ms de CPU por llamada; ejecutarlo en el threadpool de
+Starlette (o en el event loop) deja sin hilos a las reservas durante una ráfaga
+de logins. Aquí corre en ``HASH_WORKERS`` procesos, con un máximo de
+``HASH_MAX_PENDING`` operaciones en vuelo: por encima se responde 503 con
+Retry-After en lugar de encolar sin límite. Las importaciones masivas usan
+otro pool (``HASH_BULK_WORKERS`` procesos): no ocupan los huecos de los logins.
+
+Este módulo no importa nada de la app (BD, modelos) para que los procesos
+hijos (spawn) arranquen ligeros.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 1)))
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", str(HASH_WORKERS * 8)))
+HASH_BULK_WORKERS = int(os.getenv("HASH_BULK_WORKERS", str(max(1, HASH_WORKERS // 2))))
+HASH_RETRY_AFTER_SECONDS = 1
+# Cuentas sin contraseña (importación masiva): no es un hash bcrypt, ninguna contraseña lo verifica
+UNUSABLE_PASSWORD_HASH = "!"
+
+# Cambiar BCRYPT_ROUNDS marca los hashes existentes como "needs update": se rehashean en el siguiente login
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+_executor: Optional[ProcessPoolExecutor] = None
+_bulk_executor: Optional[ProcessPoolExecutor] = None
+_pending = 0
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+def _verify_and_update(password: str, hashed: str):
+    return pwd_context.verify_and_update(password, hashed)
+
+def _new_pool(workers: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = _new_pool(HASH_WORKERS)
+    return _executor
+
+def get_bulk_executor() -> ProcessPoolExecutor:
+    global _bulk_executor
+    if _bulk_executor is None:
+        _bulk_executor = _new_pool(HASH_BULK_WORKERS)
+    return _bulk_executor
+
+def shutdown():
+    global _executor, _bulk_executor
+    for pool in (_executor, _bulk_executor):
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+    _executor = _bulk_executor = None
+
+def pending() -> int:
+    return _pending
+
+async def _submit(fn, *args):
+    global _pending
+    if _pending >= HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=503,
+            detail="Servicio ocupado, reintenta en unos segundos",
+            headers={"Retry-After": str(HASH_RETRY_AFTER_SECONDS)},
+        )
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(get_executor(), fn, *args)
+    finally:
+        _pending -= 1
+
+def hash_many(passwords) -> list:
+    """Hashes de un lote en el pool de importaciones (bloqueante; fuera del event loop).
+
+    Una contraseña None da ``UNUSABLE_PASSWORD_HASH`` sin pasar por bcrypt.
+    """
+    passwords = list(passwords)
+    given = [password for password in passwords if password is not None]
+    hashes = iter(())
+    if given:
+        chunksize = max(1, len(given) // (HASH_BULK_WORKERS * 4))
+        hashes = get_bulk_executor().map(_hash, given, chunksize=chunksize)
+    return [UNUSABLE_PASSWORD_HASH if password is None else next(hashes) for password in passwords]
+
+async def hash_password(password: str) -> str:
+    return await _submit(_hash, password)
+
+async def verify_password(password: str, hashed: str):
+    """Devuelve ``(ok, new_hash)``; ``new_hash`` no es None si el hash usa parámetros antiguos."""
+    if hashed == UNUSABLE_PASSWORD_HASH:
+        return False, None
+    return await _submit(_verify_and_update, password, hashed)
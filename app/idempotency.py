@@ -0,0 +1,197 @@
+# app/idempotency.py
+"""Claves de idempotencia (cabecera ``Idempotency-Key``) en reservas y cancelaciones.
+
+Un cliente que reintenta tras un timeout manda la misma clave. La primera
+petición la reclama en gym.idempotency_keys con un commit propio, antes de
+tomar ningún lock de sesión, y al terminar guarda el status y el cuerpo de la
+respuesta; los reintentos se contestan desde esa fila sin repetir la
+transacción de reserva.
+
+- Misma clave con otra petición (otra operación o argumentos): 422.
+- Clave reclamada y aún sin respuesta: 409 con Retry-After.
+- Los 4xx (sesión llena, solape, cuota...) se guardan y se repiten tal cual,
+  con sus cabeceras (Retry-After...); los 5xx y los errores inesperados
+  liberan la clave para poder reintentar.
+- En la reserva individual la respuesta guardada se busca antes del control
+  de admisión (``run_admitted``): el reintento no compite por plaza.
+
+Las claves caducan a los ``IDEMPOTENCY_TTL_SECONDS`` (caducada = reutilizable)
+y se purgan con ``python -m app.maintenance purge-idempotency-keys``. Una
+reclamación sin respuesta tras ``IDEMPOTENCY_LOCK_SECONDS`` (worker caído entre
+el commit de la reserva y el de la respuesta) se da por abandonada: el
+reintento vuelve a ejecutar y las reglas de reserva impiden el duplicado.
+"""
+import hashlib
+import json
+import logging
+import os
+from datetime import timedelta
+from typing import Optional
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import select, update, delete, func, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from . import metrics
+from .models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+KEY_MAX_LENGTH = 255
+REPLAY_HEADER = "Idempotent-Replayed"
+
+IDEMPOTENCY_REQUESTS = metrics.register(metrics.Counter(
+    "idempotency_requests_total", "Peticiones con Idempotency-Key por resultado (executed, replayed, in_progress, mismatch)", ("outcome",),
+))
+
+def fingerprint(operation: str, *args) -> str:
+    """Huella de la petición: una clave solo vale para la misma operación con los mismos argumentos."""
+    raw = json.dumps([operation, *jsonable_encoder(args)], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+def _claim(db: Session, user_id, key: str, request_hash: str):
+    """Reclama la clave y confirma. None si queda reclamada; si no, la fila existente."""
+    stmt = insert(IdempotencyKey).values(
+        user_id=user_id, key=key, request_hash=request_hash,
+        expires_at=func.now() + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+    )
+    # Una fila caducada o abandonada se reclama en la misma sentencia (sin carrera entre SELECT e INSERT)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[IdempotencyKey.user_id, IdempotencyKey.key],
+        set_={
+            "request_hash": stmt.excluded.request_hash,
+            "status_code": None,
+            "response": None,
+            "created_at": func.now(),
+            "expires_at": stmt.excluded.expires_at,
+        },
+        where=(IdempotencyKey.expires_at < func.now()) | (
+            IdempotencyKey.status_code.is_(None)
+            & (IdempotencyKey.created_at < func.now() - timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS))
+        ),
+    ).returning(IdempotencyKey.key)
+    existing = None
+    if db.execute(stmt).first() is None:
+        existing = db.execute(
+            select(IdempotencyKey.request_hash, IdempotencyKey.status_code, IdempotencyKey.response)
+            .filter_by(user_id=user_id, key=key)
+        ).first()
+    db.commit()
+    return existing
+
+def _store(db: Session, user_id, key: str, status_code: int, response):
+    db.rollback()
+    db.execute(
+        update(IdempotencyKey).filter_by(user_id=user_id, key=key).values(status_code=status_code, response=response)
+    )
+    db.commit()
+
+def _release(db: Session, user_id, key: str):
+    try:
+        db.rollback()
+        db.execute(delete(IdempotencyKey).filter_by(user_id=user_id, key=key))
+        db.commit()
+    except Exception:
+        # La reclamación caduca sola a los IDEMPOTENCY_LOCK_SECONDS
+        logger.warning("No se pudo liberar la Idempotency-Key %r", key, exc_info=True)
+
+def replay(row, request_hash: str):
+    """Respuesta a un reintento a partir de la fila guardada (o el error que toque)."""
+    if row is not None and row.request_hash != request_hash:
+        IDEMPOTENCY_REQUESTS.inc(outcome="mismatch")
+        raise HTTPException(status_code=422, detail="Idempotency-Key ya usada con otra petición")
+    if row is None or row.status_code is None:
+        # row None: purgada entre el INSERT y la lectura; el cliente reintenta igual
+        IDEMPOTENCY_REQUESTS.inc(outcome="in_progress")
+        raise HTTPException(status_code=409, detail="Hay una petición en curso con esta Idempotency-Key", headers={"Retry-After": "1"})
+    IDEMPOTENCY_REQUESTS.inc(outcome="replayed")
+    headers = {REPLAY_HEADER: "true"}
+    if row.status_code >= 400:
+        headers.update(row.response.get("headers") or {})
+        raise HTTPException(status_code=row.status_code, detail=row.response["detail"], headers=headers)
+    return JSONResponse(row.response, status_code=row.status_code, headers=headers)
+
+def stored(db: Session, user_id, key: Optional[str], operation: str, *args):
+    """Respuesta a un reintento sin reclamar la clave; None si hay que ejecutar.
+
+    Para consultar antes del control de admisión: un reintento de una reserva
+    ya hecha se contesta aunque la sesión se haya llenado después.
+    """
+    if key is None:
+        return None
+    row = db.execute(
+        select(IdempotencyKey.request_hash, IdempotencyKey.status_code, IdempotencyKey.response)
+        .filter_by(user_id=user_id, key=key)
+        .filter(
+            IdempotencyKey.expires_at >= func.now(),
+            IdempotencyKey.status_code.is_not(None)
+            | (IdempotencyKey.created_at >= func.now() - timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)),
+        )
+    ).first()
+    # Sin transacción abierta mientras se espera turno en la admisión
+    db.rollback()
+    return None if row is None else replay(row, fingerprint(operation, *args))
+
+async def run_admitted(call, gate, user, key: Optional[str], operation: str, fn, *args):
+    """``run`` dentro de ``gate`` (``admission.admit``) salvo que la clave ya tenga respuesta.
+
+    ``call(f, *args)`` ejecuta ``f(db, *args)`` síncrona: ``run_in_threadpool``
+    con la sesión sync o ``AsyncSession.run_sync``. Solo las reclamaciones
+    nuevas pasan por el gate.
+    """
+    replayed = await call(stored, user.id, key, operation, *args)
+    if replayed is not None:
+        return replayed
+    async with gate:
+        return await call(run, user, key, operation, fn, *args)
+
+def run(db: Session, user, key: Optional[str], operation: str, fn, *args):
+    """``fn(db, user, *args)`` como mucho una vez por (usuario, clave).
+
+    Síncrona como app/booking.py: los endpoints async la llaman vía ``run_sync``.
+    Sin clave ejecuta directamente.
+    """
+    if key is None:
+        return fn(db, user, *args)
+    request_hash = fingerprint(operation, *args)
+    # Antes de cualquier lock de sesión: un reintento no hace cola tras la reserva original
+    existing = _claim(db, user.id, key, request_hash)
+    if existing is not None:
+        return replay(existing, request_hash)
+    try:
+        result = fn(db, user, *args)
+    except HTTPException as exc:
+        if exc.status_code >= 500:
+            _release(db, user.id, key)
+        else:
+            stored_error = {"detail": jsonable_encoder(exc.detail)}
+            if exc.headers:
+                stored_error["headers"] = dict(exc.headers)
+            _store(db, user.id, key, exc.status_code, stored_error)
+        raise
+    except Exception:
+        _release(db, user.id, key)
+        raise
+    _store(db, user.id, key, 200, jsonable_encoder(result))
+    IDEMPOTENCY_REQUESTS.inc(outcome="executed")
+    return result
+
+def purge_expired(db: Session, batch_size: int = 5000) -> int:
+    """Borra claves caducadas en lotes (transacciones cortas); devuelve cuántas."""
+    total = 0
+    while True:
+        batch = (
+            select(IdempotencyKey.user_id, IdempotencyKey.key)
+            .filter(IdempotencyKey.expires_at < func.now())
+            .limit(batch_size)
+        )
+        deleted = db.execute(
+            delete(IdempotencyKey).where(tuple_(IdempotencyKey.user_id, IdempotencyKey.key).in_(batch))
+        ).rowcount
+        db.commit()
+        total += deleted
+        if deleted < batch_size:
+            return total
@@ -0,0 +1,258 @@
+# app/live.py
+"""Plazas en tiempo real: NOTIFY de Postgres -> Server-Sent Events.
+
+El trigger ``gym.notify_session_seats`` publica en el canal ``session_seats``
+un JSON con los contadores de la sesión cada vez que cambian (reserva,
+cancelación, promoción, cambio de aforo). NOTIFY es transaccional: solo se
+entrega lo confirmado y en orden de commit.
+
+Cada worker abre una única conexión LISTEN (asyncpg) y reparte a sus
+suscriptores SSE. La entrega se agrupa por sesión en dos niveles: el hub
+guarda el último estado de cada sesión y lo reparte como mucho cada
+``LIVE_COALESCE_SECONDS`` (una ráfaga de reservas = un mensaje), y cada
+suscriptor guarda a su vez solo el último estado pendiente, así un cliente
+lento nunca acumula una cola.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from . import metrics
+from .models import Session as SessionModel
+
+logger = logging.getLogger(__name__)
+
+LIVE_UPDATES_ENABLED = os.getenv("LIVE_UPDATES_ENABLED", "true").strip().lower() not in ("0", "false", "no", "off")
+LIVE_COALESCE_SECONDS = float(os.getenv("LIVE_COALESCE_SECONDS", "0.25"))
+LIVE_KEEPALIVE_SECONDS = float(os.getenv("LIVE_KEEPALIVE_SECONDS", "15"))
+LIVE_MAX_SUBSCRIBERS = int(os.getenv("LIVE_MAX_SUBSCRIBERS", "1000"))
+LIVE_MAX_SESSION_IDS = int(os.getenv("LIVE_MAX_SESSION_IDS", "100"))
+# Vida máxima de un stream: uvicorn no completa el apagado con streams abiertos, y
+# al reconectar (EventSource, 3 s) los clientes se reparten entre workers
+LIVE_STREAM_MAX_SECONDS = float(os.getenv("LIVE_STREAM_MAX_SECONDS", "300"))
+SEATS_CHANNEL = "session_seats"
+
+LIVE_NOTIFICATIONS = metrics.register(metrics.Counter(
+    "live_notifications_total", "NOTIFY de plazas recibidos por la conexión LISTEN",
+))
+LIVE_EVENTS_SENT = metrics.register(metrics.Counter(
+    "live_events_sent_total", "Eventos SSE de plazas entregados a suscriptores (tras agrupar por sesión)",
+))
+
+class Subscriber:
+    """Un cliente SSE: último estado pendiente por sesión y un Event para despertarlo."""
+
+    def __init__(self, session_ids=None):
+        # None = todas las sesiones (listado)
+        self.session_ids = frozenset(session_ids) if session_ids else None
+        self.pending = {}
+        self.resync = False
+        self.event = asyncio.Event()
+
+    def offer(self, session_id: str, data: str):
+        self.pending[session_id] = data
+        self.event.set()
+
+    def drain(self):
+        pending, resync = self.pending, self.resync
+        self.pending, self.resync = {}, False
+        self.event.clear()
+        return resync, pending
+
+class SeatHub:
+    def __init__(self):
+        self._everything = set()
+        self._by_session = {}
+        self._pending = {}
+        self._wake = asyncio.Event()
+        self._tasks = []
+        self._count = 0
+        # Funciones llamadas con cada payload recibido (p. ej. app/admission.py)
+        self.observers = []
+        # Otros canales sobre la misma conexión LISTEN: canal -> callback(payload | None)
+        self._channels = {}
+
+    def __len__(self):
+        return self._count
+
+    def subscribe(self, session_ids=None) -> Subscriber:
+        sub = Subscriber([str(sid) for sid in session_ids or ()])
+        self._count += 1
+        if sub.session_ids is None:
+            self._everything.add(sub)
+        else:
+            for sid in sub.session_ids:
+                self._by_session.setdefault(sid, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        self._count -= 1
+        if sub.session_ids is None:
+            self._everything.discard(sub)
+            return
+        for sid in sub.session_ids:
+            subs = self._by_session.get(sid)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._by_session[sid]
+
+    def publish(self, payload: dict):
+        # Último estado gana: las notificaciones llegan en orden de commit
+        self._pending[str(payload["id"])] = payload
+        self._wake.set()
+
+    def flush(self) -> int:
+        pending, self._pending = self._pending, {}
+        sent = 0
+        for sid, payload in pending.items():
+            targets = self._everything | self._by_session.get(sid, set())
+            if not targets:
+                continue
+            data = json.dumps(payload)
+            for sub in targets:
+                sub.offer(sid, data)
+            sent += len(targets)
+        LIVE_EVENTS_SENT.inc(sent)
+        return sent
+
+    def resync_all(self):
+        """Tras reconectar la conexión LISTEN: pudo perderse algún NOTIFY, los clientes deben releer."""
+        for sub in self._everything.union(*self._by_session.values()):
+            sub.resync = True
+            sub.event.set()
+        for callback in self._channels.values():
+            callback(None)
+
+    def listen(self, channel: str, callback):
+        """Reparte también ``channel``: ``callback(payload)``, y ``callback(None)`` si pudo perderse algo.
+
+        Registrar antes de ``start()``.
+        """
+        self._channels[channel] = callback
+
+    def _on_channel_notify(self, conn, pid, channel, payload):
+        try:
+            self._channels[channel](payload)
+        except Exception:
+            logger.warning("Error procesando NOTIFY %s: %r", channel, payload, exc_info=True)
+
+    def _on_notify(self, conn, pid, channel, payload):
+        LIVE_NOTIFICATIONS.inc()
+        try:
+            data = json.loads(payload)
+            self.publish(data)
+            for observer in self.observers:
+                observer(data)
+        except (ValueError, KeyError):
+            logger.warning("NOTIFY %s con payload inválido: %r", channel, payload)
+
+    async def _flusher(self):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            self.flush()
+            # Lo que llegue mientras tanto se agrupa en el siguiente flush
+            await asyncio.sleep(LIVE_COALESCE_SECONDS)
+
+    async def _listener(self):
+        import asyncpg
+        from .database import DATABASE_URL
+        dsn = make_url(DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+        backoff, connected_before = 1.0, False
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(dsn)
+                closed = asyncio.Event()
+                conn.add_termination_listener(lambda _conn: closed.set())
+                await conn.add_listener(SEATS_CHANNEL, self._on_notify)
+                for channel in self._channels:
+                    await conn.add_listener(channel, self._on_channel_notify)
+                if connected_before:
+                    self.resync_all()
+                connected_before, backoff = True, 1.0
+                while not closed.is_set():
+                    try:
+                        await asyncio.wait_for(closed.wait(), LIVE_KEEPALIVE_SECONDS)
+                    except asyncio.TimeoutError:
+                        # Una conexión caída en silencio no avisa: sondeo periódico
+                        await conn.fetchval("SELECT 1", timeout=5)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Conexión LISTEN %s perdida; reintento en %.0fs", SEATS_CHANNEL, backoff, exc_info=True)
+            finally:
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    def start(self):
+        if not LIVE_UPDATES_ENABLED or self._tasks:
+            return
+        # Ligado al event loop de la app (no al de la importación)
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._listener()), asyncio.create_task(self._flusher())]
+
+    async def shutdown(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+hub = SeatHub()
+metrics.register(metrics.CallbackGauge("live_subscribers", "Clientes SSE conectados a este worker", lambda: [({}, len(hub))]))
+
+def seat_snapshot(session_ids) -> list:
+    """Estado actual de ``session_ids`` (primer mensaje del stream); síncrono, para el threadpool."""
+    from .database import SessionLocal
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(SessionModel.id, SessionModel.capacity, SessionModel.booked_count, SessionModel.waitlist_count, SessionModel.status)
+            .filter(SessionModel.id.in_(list(session_ids)))
+        ).all()
+    finally:
+        db.close()
+    return [
+        {"id": str(r.id), "capacity": r.capacity, "booked_count": r.booked_count, "waitlist_count": r.waitlist_count, "status": r.status.value}
+        for r in rows
+    ]
+
+def _sse(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+async def sse_stream(session_ids=()):
+    """Cuerpo text/event-stream: suscribe, manda el estado inicial y los cambios.
+
+    La suscripción vive dentro del generador: si el cliente corta antes del
+    primer chunk el generador no llega a arrancar y no queda ningún suscriptor
+    en el hub; una vez arrancado, el ``finally`` lo desuscribe.
+    """
+    # Suscribir antes de leer el estado inicial: ningún cambio cae entre ambos
+    sub = hub.subscribe(session_ids)
+    try:
+        snapshot = await run_in_threadpool(seat_snapshot, session_ids) if session_ids else []
+        # Reconexión automática de EventSource a los 3 s
+        yield "retry: 3000\n\n"
+        for row in snapshot:
+            yield _sse("seats", json.dumps(row))
+        deadline = time.monotonic() + LIVE_STREAM_MAX_SECONDS
+        while (left := deadline - time.monotonic()) > 0:
+            try:
+                await asyncio.wait_for(sub.event.wait(), min(LIVE_KEEPALIVE_SECONDS, left))
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            resync, pending = sub.drain()
+            if resync:
+                yield _sse("resync", "{}")
+            for data in pending.values():
+                yield _sse("seats", data)
+    finally:
+        hub.unsubscribe(sub)
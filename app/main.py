@@ -1,18 +1,127 @@
 # app/main.py
+import io
 import os
-from fastapi import FastAPI, Depends, HTTPException
+import time
+from fastapi import FastAPI, APIRouter, Depends, File, Header, HTTPException, Query, Request, UploadFile
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
 from sqlalchemy.orm import Session
-from sqlalchemy import select, func
-from .database import get_db, engine
-from .models import Base, User, Session as SessionModel, Reservation, WaitlistEntry
-from .auth import get_password_hash, create_access_token, verify_password, get_current_user
-from .schemas import RegisterIn, TokenOut, SessionOut, ReserveIn
+from .database import get_db, engine, async_engine, replica_engines, async_replica_engines, DB_ASYNC
+from .models import Base, User, Session as SessionModel, SessionStatus, ReservationStatus
+from .auth import (
+    create_access_token, get_current_user, require_admin,
+    Principal, invalidate_principal, auth_cache_stats, token_cache, principal_cache,
+)
+from .schemas import (
+    RegisterIn, TokenOut, SessionOut, SessionPage, ReserveIn, BatchReserveIn, BatchReserveOut, ReservationOut, ReservationPage, UserAdminUpdate, UserAdminOut,
+    ScheduleGenerateIn, ScheduleGenerateOut, SessionAdminUpdate, OccupancyReportOut, QuotaOut, MemberImportOut, SlotSearchOut,
+)
+from .crud import get_user_by_email, update_password_hash, search_sessions_stmt, user_reservations_stmt
+from .pagination import decode_cursor, clamp_limit, split_page
+from . import audit, booking, hashing, dbstats, scheduling, metrics, reporting, quota, live, idempotency, admission, member_import, slots, replicas
+from .replicas import get_read_db
 from fastapi.security import OAuth2PasswordRequestForm
 from uuid import UUID
+from datetime import date, datetime
+from typing import Optional, Literal
 
-app = FastAPI(title="Gym Reservations API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    audit.start()
+    replicas.start()
+    # Los NOTIFY de plazas refrescan la pista de plazas libres del control de admisión
+    live.hub.observers.append(admission.note_notify)
+    # Cambios de agenda de entrenadores: invalidación incremental del índice de huecos
+    live.hub.listen(slots.CALENDAR_CHANNEL, slots.on_notify)
+    live.hub.start()
+    yield
+    live.hub.observers.remove(admission.note_notify)
+    await live.hub.shutdown()
+    hashing.shutdown()
+    replicas.shutdown()
+    # Vuelca los eventos de auditoría pendientes antes de salir
+    audit.shutdown()
+
+app = FastAPI(title="Gym Reservations API", lifespan=lifespan)
+
+# Sentencias, tiempo de BD y espera de pool por petición (cabecera Server-Timing)
+@app.middleware("http")
+async def db_timing_middleware(request: Request, call_next):
+    stats, token = dbstats.begin_request()
+    try:
+        response = await call_next(request)
+    finally:
+        dbstats.end_request(stats, token)
+    response.headers["Server-Timing"] = (
+        f'db;dur={stats.query_seconds * 1000:.2f};desc="{stats.queries} queries", '
+        f"pool;dur={stats.checkout_wait_seconds * 1000:.2f}"
+    )
+    return response
+
+# Read-your-writes con réplicas: tras una escritura, las lecturas de ese cliente van al primario
+if replica_engines:
+    @app.middleware("http")
+    async def replica_sticky_middleware(request: Request, call_next):
+        response = await call_next(request)
+        if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+            replicas.mark_written(response)
+        return response
+
+def _named_engines():
+    named = [("sync", engine), ("async", async_engine.sync_engine if async_engine else None)]
+    named += [(f"replica{i}", e) for i, e in enumerate(replica_engines)]
+    named += [(f"async_replica{i}", e.sync_engine) for i, e in enumerate(async_replica_engines)]
+    return named
+
+if metrics.METRICS_ENABLED:
+    # Latencia por plantilla de ruta ("/sessions/{session_id}"), no por URL: cardinalidad acotada
+    @app.middleware("http")
+    async def metrics_middleware(request: Request, call_next):
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            metrics.HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - start,
+                method=request.method, route=getattr(route, "path", "unmatched"), status=status,
+            )
+
+    def _pool_gauges():
+        out = []
+        for name, eng in _named_engines():
+            if eng is None:
+                continue
+            for state, value in dbstats.pool_status(eng).items():
+                out.append(({"pool": name, "state": state}, value))
+        return out
+
+    def _cache_counters():
+        out = []
+        for name, cache in (("token", token_cache), ("principal", principal_cache)):
+            stats = cache.stats()
+            for result in ("hits", "misses", "evictions"):
+                out.append(({"cache": name, "result": result}, stats[result]))
+        return out
+
+    metrics.register(metrics.CallbackGauge("db_pool_connections", "Conexiones del pool por estado", _pool_gauges))
+    metrics.register(metrics.CallbackGauge(
+        "db_pool_checkout_timeouts_total", "Checkouts que agotaron DB_POOL_TIMEOUT",
+        lambda: [({}, dbstats.totals.checkout_timeouts)], kind="counter",
+    ))
+    metrics.register(metrics.CallbackGauge(
+        "password_hash_pending", "Operaciones bcrypt en vuelo en el pool de procesos", lambda: [({}, hashing.pending())],
+    ))
+    metrics.register(metrics.CallbackGauge("auth_cache_events_total", "Aciertos/fallos/desalojos de las cachés de auth", _cache_counters, kind="counter"))
+
+    @app.get("/metrics", include_in_schema=False)
+    def prometheus_metrics():
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 # Base dir (raíz del repo asumiendo que uvicorn se ejecuta desde la raíz)
 base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -42,146 +151,280 @@ def ui():
 # Dev helper: crear esquema y tablas si no existen (solo dev)
 # Base.metadata.create_all(bind=engine)
 
-@app.post("/auth/register", response_model=TokenOut)
-def register(payload: RegisterIn, db: Session = Depends(get_db)):
-    existing = db.execute(select(User).filter_by(email=payload.email)).scalar_one_or_none()
+# Rutas del camino de petición con implementación sync; en modo DB_ASYNC se
+# registran en su lugar las de app/async_routes.py (mismos paths y contratos).
+sync_router = APIRouter()
+
+# register/login son async: el bcrypt va al pool de procesos de app.hashing y
+# solo las consultas pasan por el threadpool
+@sync_router.post("/auth/register", response_model=TokenOut)
+async def register(payload: RegisterIn, db: Session = Depends(get_db)):
+    existing = await run_in_threadpool(get_user_by_email, db, payload.email)
     if existing:
         raise HTTPException(status_code=400, detail="Email ya registrado")
     user = User(
         full_name=payload.full_name,
         email=payload.email,
-        password_hash=get_password_hash(payload.password)
+        password_hash=await hashing.hash_password(payload.password)
     )
+    user_id = await run_in_threadpool(_save_new_user, db, user)
+    token = create_access_token({"sub": str(user_id)})
+    return {"access_token": token, "token_type": "bearer"}
+
+def _save_new_user(db: Session, user: User):
     db.add(user)
+    db.flush()
+    user_id = user.id
     db.commit()
-    db.refresh(user)
-    token = create_access_token({"sub": str(user.id)})
-    return {"access_token": token, "token_type": "bearer"}
+    return user_id
 
-@app.post("/auth/login", response_model=TokenOut)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+@sync_router.post("/auth/login", response_model=TokenOut)
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     # OAuth2PasswordRequestForm provides form fields 'username' and 'password'
-    user = db.execute(select(User).filter_by(email=form_data.username)).scalar_one_or_none()
-    if not user or not verify_password(form_data.password, user.password_hash):
+    user = await run_in_threadpool(get_user_by_email, db, form_data.username)
+    if not user:
+        raise HTTPException(status_code=400, detail="Credenciales incorrectas")
+    ok, new_hash = await hashing.verify_password(form_data.password, user.password_hash)
+    if not ok:
         raise HTTPException(status_code=400, detail="Credenciales incorrectas")
+    if new_hash:
+        # Parámetros de CryptContext cambiados (p. ej. BCRYPT_ROUNDS): migrar el hash
+        await run_in_threadpool(update_password_hash, db, user.id, new_hash)
     token = create_access_token({"sub": str(user.id)})
     return {"access_token": token, "token_type": "bearer"}
 
-@app.get("/sessions", response_model=list[SessionOut])
-def list_sessions(skip: int = 0, limit: int = 50, db: Session = Depends(get_db)):
-    rows = db.execute(select(SessionModel).offset(skip).limit(limit)).scalars().all()
-    return rows
+@sync_router.get("/sessions", response_model=SessionPage)
+def list_sessions(
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    location_id: Optional[UUID] = None,
+    class_type_id: Optional[UUID] = None,
+    trainer_id: Optional[UUID] = None,
+    status: Optional[SessionStatus] = None,
+    has_free_spots: Optional[bool] = None,
+    db: Session = Depends(get_read_db),
+):
+    # Paginación keyset por (start_time, id): la página N cuesta lo mismo que la primera
+    limit = clamp_limit(limit)
+    stmt = search_sessions_stmt(
+        limit,
+        after=decode_cursor(cursor) if cursor else None,
+        date_from=date_from,
+        date_to=date_to,
+        location_id=location_id,
+        class_type_id=class_type_id,
+        trainer_id=trainer_id,
+        status=status,
+        has_free_spots=has_free_spots,
+    )
+    rows, next_cursor = split_page(db.execute(stmt).scalars().all(), limit, lambda s: (s.start_time, s.id))
+    return {"items": rows, "next_cursor": next_cursor}
 
 # Obtener una sesión por id (útil para detalle)
-@app.get("/sessions/{session_id}", response_model=SessionOut)
-def get_session(session_id: UUID, db: Session = Depends(get_db)):
+@sync_router.get("/sessions/{session_id}", response_model=SessionOut)
+def get_session(session_id: UUID, db: Session = Depends(get_read_db)):
     row = db.get(SessionModel, session_id)
     if not row:
         raise HTTPException(status_code=404, detail="Session no encontrada")
     return row
 
-@app.post("/reservations")
-def create_reservation(payload: ReserveIn, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    with db.begin():
-        sess_row = db.execute(select(SessionModel).filter_by(id=payload.session_id).with_for_update()).scalar_one_or_none()
-        if not sess_row:
-            raise HTTPException(status_code=404, detail="Session no encontrada")
-        if sess_row.status != 'scheduled':
-            raise HTTPException(status_code=400, detail="Session no está disponible")
-        booked_count = db.execute(select(func.count()).select_from(Reservation).filter_by(session_id=payload.session_id, status='booked')).scalar_one()
-        # overlapping check
-        overlap_q = select(func.count()).select_from(Reservation).join(SessionModel, Reservation.session_id == SessionModel.id).filter(
-            Reservation.user_id == current_user.id,
-            Reservation.status == 'booked',
-            func.tstzrange(SessionModel.start_time, SessionModel.end_time).op("&&")(func.tstzrange(sess_row.start_time, sess_row.end_time))
-        )
-        overlap_count = db.execute(overlap_q).scalar_one()
-        if overlap_count > 0:
-            raise HTTPException(status_code=400, detail="Tienes otra reserva que se solapa con este horario")
-        if booked_count >= sess_row.capacity:
-            if payload.auto_waitlist:
-                max_pos = db.execute(select(func.coalesce(func.max(WaitlistEntry.position), 0)).filter(WaitlistEntry.session_id == payload.session_id)).scalar_one()
-                new_pos = (max_pos or 0) + 1
-                entry = WaitlistEntry(session_id=payload.session_id, user_id=current_user.id, position=new_pos)
-                db.add(entry)
-                db.commit()
-                return {"status": "waitlisted", "position": new_pos}
-            else:
-                raise HTTPException(status_code=400, detail="Session llena")
-        res = Reservation(session_id=payload.session_id, user_id=current_user.id, status='booked')
-        db.add(res)
-        db.commit()
-        db.refresh(res)
-        return {"reservation_id": str(res.id), "status": "booked"}
-
-@app.patch("/reservations/{reservation_id}/cancel")
-def cancel_reservation(reservation_id: UUID, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    res = db.get(Reservation, reservation_id)
-    if not res:
-        raise HTTPException(status_code=404, detail="Reserva no encontrada")
-    if str(res.user_id) != str(current_user.id) and current_user.role != 'admin':
-        raise HTTPException(status_code=403, detail="No autorizado")
-    with db.begin():
-        res.status = 'cancelled'
-        db.add(res)
-        db.commit()
-        promote_waitlist(res.session_id, db)
-        return {"status": "cancelled"}
-
-def promote_waitlist(session_id: UUID, db: Session):
-    next_entry = db.execute(
-        select(WaitlistEntry).filter_by(session_id=session_id).order_by(WaitlistEntry.position.asc(), WaitlistEntry.created_at.asc()).limit(1)
-    ).scalar_one_or_none()
-    if not next_entry:
-        return None
-    try:
-        sess_row = db.execute(select(SessionModel).filter_by(id=session_id).with_for_update()).scalar_one()
-        booked_count = db.execute(select(func.count()).select_from(Reservation).filter_by(session_id=session_id, status='booked')).scalar_one()
-        if booked_count < sess_row.capacity:
-            new_res = Reservation(session_id=session_id, user_id=next_entry.user_id, status='booked')
-            db.add(new_res)
-            db.delete(next_entry)
-            db.commit()
-            return new_res
-    except Exception:
-        db.rollback()
-    return None
-
-@app.post("/sessions/{session_id}/waitlist")
-def add_to_waitlist(session_id: UUID, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    sess = db.get(SessionModel, session_id)
-    if not sess:
-        raise HTTPException(status_code=404, detail="Session no encontrada")
-    existing = db.execute(select(WaitlistEntry).filter_by(session_id=session_id, user_id=current_user.id)).scalar_one_or_none()
-    if existing:
-        raise HTTPException(status_code=400, detail="Ya estás en la lista de espera")
-    max_pos = db.execute(select(func.coalesce(func.max(WaitlistEntry.position), 0)).filter(WaitlistEntry.session_id == session_id)).scalar_one()
-    pos = (max_pos or 0) + 1
-    entry = WaitlistEntry(session_id=session_id, user_id=current_user.id, position=pos)
-    db.add(entry)
-    db.commit()
-    return {"status": "waitlisted", "position": pos}
+# Idempotency-Key opcional: los reintentos se contestan con la respuesta guardada (app/idempotency.py).
+# Reserva y alta en cola pasan por el control de admisión de la sesión (app/admission.py):
+# async para esperar turno en el event loop sin ocupar un hilo ni una conexión. Un reintento
+# con respuesta guardada se contesta antes de la admisión.
+@sync_router.post("/reservations")
+async def create_reservation(
+    payload: ReserveIn,
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key", max_length=idempotency.KEY_MAX_LENGTH),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    return await idempotency.run_admitted(
+        lambda fn, *args: run_in_threadpool(fn, db, *args),
+        admission.admit(payload.session_id, payload.auto_waitlist, before_wait=lambda: run_in_threadpool(db.rollback)),
+        current_user, idempotency_key, "reservations.create",
+        booking.create_reservation, payload.session_id, payload.auto_waitlist,
+    )
+
+@sync_router.post("/reservations/batch", response_model=BatchReserveOut)
+def create_reservations_batch(
+    payload: BatchReserveIn,
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key", max_length=idempotency.KEY_MAX_LENGTH),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    return idempotency.run(
+        db, current_user, idempotency_key, "reservations.batch",
+        booking.create_reservations_batch, payload.session_ids, payload.auto_waitlist, payload.atomic,
+    )
+
+@sync_router.patch("/reservations/{reservation_id}/cancel")
+def cancel_reservation(
+    reservation_id: UUID,
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key", max_length=idempotency.KEY_MAX_LENGTH),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    return idempotency.run(db, current_user, idempotency_key, "reservations.cancel", booking.cancel_reservation, reservation_id)
+
+@sync_router.post("/sessions/{session_id}/waitlist")
+async def add_to_waitlist(session_id: UUID, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    async with admission.admit(session_id, before_wait=lambda: run_in_threadpool(db.rollback)):
+        return await run_in_threadpool(booking.add_to_waitlist, db, current_user, session_id)
+
+@sync_router.delete("/sessions/{session_id}/waitlist")
+def leave_waitlist(session_id: UUID, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    return booking.leave_waitlist(db, current_user, session_id)
 
 # Obtener mis reservas (para la UI)
-@app.get("/me/reservations")
-def my_reservations(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    rows = db.execute(select(Reservation).filter_by(user_id=current_user.id)).scalars().all()
-    out = []
-    for r in rows:
-        sess = db.get(SessionModel, r.session_id)
-        out.append({
-            "id": str(r.id),
-            "status": str(r.status),
-            "created_at": r.created_at.isoformat() if r.created_at else None,
-            "session": {
-                "id": str(sess.id),
-                "start_time": sess.start_time.isoformat() if sess.start_time else None,
-                "end_time": sess.end_time.isoformat() if sess.end_time else None,
-                "capacity": sess.capacity,
-                "class_type_title": getattr(sess.class_type, "title", None)
-            }
-        })
-    return out
+@sync_router.get("/me/reservations", response_model=ReservationPage)
+def my_reservations(
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    when: Optional[Literal["upcoming", "past"]] = None,
+    status: Optional[ReservationStatus] = None,
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    # Una sola consulta con joins eager (sin N+1) y paginación keyset
+    limit = clamp_limit(limit)
+    stmt = user_reservations_stmt(current_user.id, limit, after=decode_cursor(cursor) if cursor else None, when=when, status=status)
+    rows, next_cursor = split_page(db.execute(stmt).unique().scalars().all(), limit, lambda r: (r.session.start_time, r.id))
+    return ReservationPage(items=[ReservationOut.from_reservation(r) for r in rows], next_cursor=next_cursor)
+
+# Plazas en tiempo real (Server-Sent Events). Pública como GET /sessions: EventSource
+# no envía cabeceras. Sin session_id = todas las sesiones (listado).
+@app.get("/live/seats")
+async def live_seats(session_id: list[UUID] = Query(default=[])):
+    if not live.LIVE_UPDATES_ENABLED:
+        raise HTTPException(status_code=404, detail="Actualizaciones en tiempo real desactivadas")
+    if len(session_id) > live.LIVE_MAX_SESSION_IDS:
+        raise HTTPException(status_code=400, detail=f"Máximo {live.LIVE_MAX_SESSION_IDS} sesiones por suscripción")
+    if len(live.hub) >= live.LIVE_MAX_SUBSCRIBERS:
+        raise HTTPException(status_code=503, detail="Demasiados clientes en tiempo real", headers={"Retry-After": "30"})
+    return StreamingResponse(
+        live.sse_stream(session_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Huecos libres de entrenadores para sesiones 1:1, desde el índice en memoria de app/slots.py.
+# Con get_db y no get_read_db: el índice se recarga al llegar el NOTIFY del primario y una
+# réplica retrasada lo dejaría cacheado con la agenda anterior.
+@sync_router.get("/trainers/slots", response_model=SlotSearchOut)
+def search_trainer_slots(
+    date_from: datetime,
+    date_to: datetime,
+    duration_minutes: int = Query(default=60, ge=15, le=480),
+    step_minutes: int = Query(default=30, ge=5, le=240),
+    specialty: Optional[str] = None,
+    trainer_id: Optional[UUID] = None,
+    limit: int = 50,
+    db: Session = Depends(get_db),
+):
+    items = slots.search(db, date_from, date_to, duration_minutes, step_minutes, specialty, trainer_id, clamp_limit(limit))
+    return {"items": items}
+
+# Cuota del plan: lecturas por clave primaria del contador gym.user_monthly_usage
+@sync_router.get("/me/quota", response_model=QuotaOut)
+def my_quota(month: Optional[date] = None, db: Session = Depends(get_read_db), current_user: Principal = Depends(get_current_user)):
+    return quota.quota_out(db.execute(quota.quota_stmt(current_user.id, month)).one())
+
+if DB_ASYNC:
+    from .async_routes import router as async_router
+    app.include_router(async_router)
+else:
+    app.include_router(sync_router)
+
+@app.patch("/admin/users/{user_id}", response_model=UserAdminOut)
+def admin_update_user(user_id: UUID, payload: UserAdminUpdate, db: Session = Depends(get_db), admin: Principal = Depends(require_admin)):
+    user = db.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    for field, value in payload.model_dump(exclude_unset=True).items():
+        setattr(user, field, value)
+    db.commit()
+    # El principal cacheado ya no refleja rol/estado/plan
+    invalidate_principal(user.id)
+    db.refresh(user)
+    return user
+
+# Alta masiva de socios desde CSV (multipart). UploadFile pasa a disco a partir de 1 MB
+# y se lee en trozos: la memoria no depende del tamaño del fichero.
+@app.post("/admin/members/import", response_model=MemberImportOut)
+def admin_import_members(file: UploadFile = File(...), db: Session = Depends(get_db), admin: Principal = Depends(require_admin)):
+    errors = []
+    def on_error(line, email, reason):
+        if len(errors) < member_import.IMPORT_MAX_REPORTED_ERRORS:
+            errors.append({"line": line, "email": email, "reason": reason})
+    try:
+        totals = member_import.import_members(db, io.TextIOWrapper(file.file, encoding="utf-8-sig", newline=""), on_error)
+    except member_import.ImportFormatError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except UnicodeDecodeError:
+        # Los trozos anteriores ya están confirmados; reimportar el fichero corregido los da por registrados
+        raise HTTPException(status_code=400, detail="El fichero no está en UTF-8")
+    audit.record("members.imported", "user", None, admin.id, {"filename": file.filename, **totals})
+    return {**totals, "errors": errors, "errors_truncated": totals["failed"] > len(errors)}
+
+@app.get("/admin/auth-cache")
+def admin_auth_cache_stats(admin: Principal = Depends(require_admin)):
+    return auth_cache_stats()
+
+@app.get("/admin/db/stats")
+def admin_db_stats(admin: Principal = Depends(require_admin)):
+    return dbstats.snapshot(*_named_engines())
+
+@app.patch("/admin/sessions/{session_id}")
+def admin_update_session(session_id: UUID, payload: SessionAdminUpdate, db: Session = Depends(get_db), admin: Principal = Depends(require_admin)):
+    return booking.set_session_capacity(db, session_id, payload.capacity, admin.id)
+
+@app.post("/admin/schedule/generate", response_model=ScheduleGenerateOut)
+def admin_generate_schedule(payload: ScheduleGenerateIn, db: Session = Depends(get_db), admin: Principal = Depends(require_admin)):
+    return scheduling.generate_schedule(db, payload.window_start, payload.window_end, payload.templates, dry_run=payload.dry_run)
+
+ReportGroup = Literal["day", "class_type", "trainer", "location"]
+
+# Informes: solo leen los rollups diarios (python -m app.maintenance refresh-reports)
+@app.get("/admin/reports/occupancy", response_model=OccupancyReportOut)
+def admin_occupancy_report(
+    date_from: date,
+    date_to: date,
+    group_by: ReportGroup = "class_type",
+    db: Session = Depends(get_read_db),
+    admin: Principal = Depends(require_admin),
+):
+    rows = db.execute(reporting.occupancy_report_stmt(date_from, date_to, group_by)).all()
+    return {
+        "group_by": group_by,
+        "date_from": date_from,
+        "date_to": date_to,
+        **reporting.report_status(db),
+        "items": [reporting.report_row(r) for r in rows],
+    }
+
+@app.get("/admin/reports/occupancy.csv")
+def admin_occupancy_report_csv(
+    request: Request,
+    date_from: date,
+    date_to: date,
+    group_by: ReportGroup = "class_type",
+    admin: Principal = Depends(require_admin),
+):
+    stmt = reporting.occupancy_report_stmt(date_from, date_to, group_by)
+
+    def generate():
+        # Sesión propia: vive lo que dure la respuesta; yield_per = cursor de servidor por lotes
+        db = replicas.read_session(request)
+        try:
+            yield from reporting.iter_csv(db.execute(stmt.execution_options(yield_per=1000)))
+        finally:
+            db.close()
+
+    filename = f"occupancy_{group_by}_{date_from}_{date_to}.csv"
+    return StreamingResponse(generate(), media_type="text/csv", headers={"Content-Disposition": f'attachment; filename="{filename}"'})
 
 @app.get("/")
 def root():
@@ -0,0 +1,164 @@
+# app/maintenance.py
+"""Comandos de mantenimiento (ejecutar desde la raíz del repo).
+
+    python -m app.maintenance reconcile-counters [--session-id UUID ...]
+    python -m app.maintenance reconcile-usage [--user-id UUID ...]
+    python -m app.maintenance generate-schedule --file plantillas.json [--dry-run]
+    python -m app.maintenance drain-waitlists [--batch-size N]
+    python -m app.maintenance refresh-reports [--rebuild-from AAAA-MM-DD --rebuild-to AAAA-MM-DD]
+    python -m app.maintenance purge-idempotency-keys [--batch-size N]
+    python -m app.maintenance import-members --file socios.csv [--errors errores.csv] [--chunk-size N]
+"""
+import argparse
+import csv
+import json
+import sys
+from datetime import date
+from uuid import UUID
+from . import audit, hashing
+from .database import SessionLocal
+from .idempotency import purge_expired
+from .member_import import import_members, ImportFormatError, IMPORT_CHUNK_SIZE
+from .crud import reconcile_session_counters
+from .quota import reconcile_monthly_usage
+from .schemas import ScheduleGenerateIn
+from .reporting import refresh_rollups, rebuild_rollups
+from .scheduling import generate_schedule
+from .waitlist import drain_waitlists
+
+def cmd_reconcile_counters(args):
+    db = SessionLocal()
+    try:
+        fixed = reconcile_session_counters(db, session_ids=args.session_id or None, batch_size=args.batch_size)
+    finally:
+        db.close()
+    for session_id in fixed:
+        print(f"corregida: {session_id}")
+    print(f"{len(fixed)} sesiones con contadores corregidos")
+    return 0
+
+def cmd_reconcile_usage(args):
+    db = SessionLocal()
+    try:
+        fixed = reconcile_monthly_usage(db, user_ids=args.user_id or None, batch_size=args.batch_size)
+    finally:
+        db.close()
+    for user_id in fixed:
+        print(f"corregido: {user_id}")
+    print(f"{len(fixed)} usuarios con consumo mensual corregido")
+    return 0
+
+def cmd_generate_schedule(args):
+    with open(args.file) as f:
+        spec = ScheduleGenerateIn(**json.load(f))
+    db = SessionLocal()
+    try:
+        result = generate_schedule(db, spec.window_start, spec.window_end, spec.templates, dry_run=args.dry_run or spec.dry_run)
+    finally:
+        db.close()
+    print(json.dumps(result, default=str, indent=2))
+    return 0
+
+def cmd_drain_waitlists(args):
+    db = SessionLocal()
+    try:
+        promoted = drain_waitlists(db, batch_size=args.batch_size)
+    finally:
+        db.close()
+    print(f"{promoted} entradas promovidas")
+    return 0
+
+def cmd_refresh_reports(args):
+    if bool(args.rebuild_from) != bool(args.rebuild_to):
+        print("--rebuild-from y --rebuild-to van juntos", file=sys.stderr)
+        return 2
+    db = SessionLocal()
+    try:
+        if args.rebuild_from:
+            rebuilt = rebuild_rollups(db, args.rebuild_from, args.rebuild_to)
+            print(f"{rebuilt} días recalculados")
+        days = refresh_rollups(db, batch_size=args.batch_size)
+    finally:
+        db.close()
+    print(f"{len(days)} días refrescados")
+    return 0
+
+def cmd_purge_idempotency_keys(args):
+    db = SessionLocal()
+    try:
+        deleted = purge_expired(db, batch_size=args.batch_size)
+    finally:
+        db.close()
+    print(f"{deleted} claves de idempotencia caducadas borradas")
+    return 0
+
+def cmd_import_members(args):
+    report = open(args.errors, "w", newline="") if args.errors else sys.stderr
+    writer = csv.writer(report)
+    writer.writerow(["fila", "email", "motivo"])
+    db = SessionLocal()
+    try:
+        with open(args.file, newline="", encoding="utf-8-sig") as f:
+            totals = import_members(db, f, lambda line, email, reason: writer.writerow([line, email, reason]), chunk_size=args.chunk_size)
+    except ImportFormatError as exc:
+        print(exc, file=sys.stderr)
+        return 2
+    finally:
+        db.close()
+        hashing.shutdown()
+        if report is not sys.stderr:
+            report.close()
+    audit.record("members.imported", "user", None, None, {"filename": args.file, **totals})
+    print(f"{totals['rows']} filas: {totals['imported']} importadas, {totals['failed']} rechazadas")
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m app.maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("reconcile-counters", help="Recalcula booked_count/waitlist_count de gym.sessions")
+    p.add_argument("--session-id", type=UUID, action="append", help="Limitar a estas sesiones (repetible)")
+    p.add_argument("--batch-size", type=int, default=500)
+    p.set_defaults(func=cmd_reconcile_counters)
+
+    p = sub.add_parser("reconcile-usage", help="Recalcula gym.user_monthly_usage (cuota mensual del plan) desde las reservas")
+    p.add_argument("--user-id", type=UUID, action="append", help="Limitar a estos usuarios (repetible)")
+    p.add_argument("--batch-size", type=int, default=500)
+    p.set_defaults(func=cmd_reconcile_usage)
+
+    p = sub.add_parser("generate-schedule", help="Genera sesiones en bloque desde plantillas RRULE (JSON de ScheduleGenerateIn)")
+    p.add_argument("--file", required=True)
+    p.add_argument("--dry-run", action="store_true")
+    p.set_defaults(func=cmd_generate_schedule)
+
+    p = sub.add_parser("drain-waitlists", help="Promueve listas de espera con plazas libres (seguro con varios workers en paralelo)")
+    p.add_argument("--batch-size", type=int, default=100)
+    p.set_defaults(func=cmd_drain_waitlists)
+
+    p = sub.add_parser("refresh-reports", help="Recalcula los rollups diarios de informes de los días con cambios")
+    p.add_argument("--batch-size", type=int, default=5000, help="Cambios consumidos por transacción")
+    p.add_argument("--rebuild-from", type=date.fromisoformat, help="Recalcular además este rango completo (backfill)")
+    p.add_argument("--rebuild-to", type=date.fromisoformat)
+    p.set_defaults(func=cmd_refresh_reports)
+
+    p = sub.add_parser("purge-idempotency-keys", help="Borra las claves Idempotency-Key caducadas")
+    p.add_argument("--batch-size", type=int, default=5000, help="Claves borradas por transacción")
+    p.set_defaults(func=cmd_purge_idempotency_keys)
+
+    p = sub.add_parser("import-members", help="Alta masiva de socios desde CSV (full_name,email[,phone,plan,password])")
+    p.add_argument("--file", required=True)
+    p.add_argument("--errors", help="CSV con las filas rechazadas (por defecto, stderr)")
+    p.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE, help="Filas por consulta/INSERT/commit")
+    p.set_defaults(func=cmd_import_members)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    finally:
+        # Sin el hilo de la app: los eventos de auditoría se escriben al terminar el comando
+        audit.flush_all()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+# app/member_import.py
+"""Alta masiva de socios desde CSV (alta de una franquicia).
+
+Cabecera obligatoria con ``full_name`` (o ``name``) y ``email``; opcionales
+``phone``, ``plan`` (nombre del plan) y ``password``. Las filas sin contraseña
+se guardan con ``hashing.UNUSABLE_PASSWORD_HASH`` (sin coste de bcrypt): la
+cuenta existe pero no puede iniciar sesión hasta que se le asigne una.
+
+El fichero se procesa en trozos de ``IMPORT_CHUNK_SIZE`` filas y la memoria no
+depende del tamaño del fichero: por trozo, una consulta por conjunto contra
+``gym.users.email``, los hashes en el pool de importaciones de app/hashing.py
+(aparte del de los logins) y un INSERT multi-fila con ON CONFLICT DO NOTHING
+(commit por trozo). No COPY: un email registrado en paralelo (carrera con
+/auth/register) debe acabar como error de esa fila, no abortar el trozo. Los
+duplicados dentro del fichero se detectan al llegar al trozo siguiente, porque
+el anterior ya está confirmado.
+
+Cada fila rechazada se notifica a ``on_error(fila, email, motivo)``; el
+llamador decide si la escribe a un fichero (CLI) o guarda las primeras (API).
+"""
+import csv
+import os
+from itertools import islice
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from . import hashing
+from .models import User, Plan
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+IMPORT_MAX_REPORTED_ERRORS = int(os.getenv("IMPORT_MAX_REPORTED_ERRORS", "1000"))
+
+_ALIASES = {"name": "full_name"}
+REQUIRED_COLUMNS = ("full_name", "email")
+OPTIONAL_COLUMNS = ("phone", "plan", "password")
+
+class ImportFormatError(ValueError):
+    """Cabecera del CSV inválida: no se importa nada."""
+
+def parse_header(header) -> dict:
+    """Columna -> índice; exige las obligatorias y rechaza columnas desconocidas."""
+    columns = {}
+    for index, raw in enumerate(header or ()):
+        name = raw.strip().lower()
+        name = _ALIASES.get(name, name)
+        if name not in REQUIRED_COLUMNS + OPTIONAL_COLUMNS:
+            raise ImportFormatError(f"Columna desconocida: {raw!r}")
+        if name in columns:
+            raise ImportFormatError(f"Columna repetida: {raw!r}")
+        columns[name] = index
+    missing = [c for c in REQUIRED_COLUMNS if c not in columns]
+    if missing:
+        raise ImportFormatError(f"Faltan columnas: {', '.join(missing)}")
+    return columns
+
+def parse_row(row, columns: dict, plans: dict):
+    """(valores, None) o (None, motivo). ``plans``: nombre en minúsculas -> id."""
+    if len(row) > len(columns):
+        return None, "Más columnas que la cabecera"
+    def get(name):
+        index = columns.get(name)
+        return row[index].strip() if index is not None and index < len(row) else ""
+    full_name, email, plan = get("full_name"), get("email"), get("plan")
+    if not full_name:
+        return None, "Nombre vacío"
+    # Validación mínima; el email se guarda tal cual, como en /auth/register
+    if "@" not in email or " " in email:
+        return None, "Email inválido"
+    plan_id = None
+    if plan:
+        plan_id = plans.get(plan.lower())
+        if plan_id is None:
+            return None, f"Plan desconocido: {plan}"
+    return {
+        "full_name": full_name,
+        "email": email,
+        "phone": get("phone") or None,
+        "plan_id": plan_id,
+        "password": get("password") or None,
+    }, None
+
+def _import_chunk(db: Session, chunk, on_error) -> int:
+    """``chunk``: [(fila, valores)] ya validados. Devuelve cuántos se insertaron."""
+    emails = [values["email"] for _, values in chunk]
+    existing = set(db.execute(select(User.email).filter(User.email.in_(emails))).scalars())
+    fresh, seen = [], set()
+    for line, values in chunk:
+        email = values["email"]
+        if email in existing:
+            on_error(line, email, "Email ya registrado")
+        elif email in seen:
+            on_error(line, email, "Email repetido en el fichero")
+        else:
+            seen.add(email)
+            fresh.append((line, values))
+    if not fresh:
+        return 0
+    hashes = hashing.hash_many([values.pop("password") for _, values in fresh])
+    rows = [{**values, "password_hash": password_hash} for (_, values), password_hash in zip(fresh, hashes)]
+    inserted = set(db.execute(
+        insert(User).values(rows).on_conflict_do_nothing(index_elements=[User.email]).returning(User.email)
+    ).scalars())
+    db.commit()
+    for line, values in fresh:
+        if values["email"] not in inserted:
+            on_error(line, values["email"], "Email ya registrado")
+    return len(inserted)
+
+def import_members(db: Session, lines, on_error, chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    """Importa el CSV de ``lines`` (iterable de líneas de texto). Devuelve los contadores."""
+    reader = csv.reader(lines)
+    columns = parse_header(next(reader, None))
+    plans = {name.lower(): plan_id for plan_id, name in db.execute(select(Plan.id, Plan.name))}
+    db.rollback()
+    totals = {"rows": 0, "imported": 0, "failed": 0}
+    def failed(line, email, reason):
+        totals["failed"] += 1
+        on_error(line, email, reason)
+    # Número de registro (1 = cabecera), no de línea física: un campo entre comillas puede ocupar varias
+    records = enumerate(reader, start=2)
+    while True:
+        batch = list(islice(records, chunk_size))
+        if not batch:
+            return totals
+        chunk = []
+        for line, row in batch:
+            if not any(cell.strip() for cell in row):
+                continue
+            totals["rows"] += 1
+            values, reason = parse_row(row, columns, plans)
+            if values is None:
+                email_index = columns["email"]
+                failed(line, row[email_index].strip() if email_index < len(row) else "", reason)
+            else:
+                chunk.append((line, values))
+        if chunk:
+            totals["imported"] += _import_chunk(db, chunk, failed)
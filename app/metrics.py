@@ -0,0 +1,151 @@
+# app/metrics.py
+"""Métricas en formato de texto de Prometheus, sin dependencias externas.
+
+Contadores e histogramas en memoria (un lock por métrica, un ``bisect`` por
+observación) y gauges que se calculan al hacer scrape, así el camino caliente
+no paga por el estado del pool ni de las cachés. ``METRICS_ENABLED=false``
+convierte todas las observaciones en no-ops y desactiva ``/metrics``.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").strip().lower() not in ("0", "false", "no", "off")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + [f'{n}="{v}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _fmt(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, doc, labelnames=()):
+        self.name, self.doc, self.labelnames = name, doc, tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = tuple(labels[n] for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, _labels(self.labelnames, key), value) for key, value in items]
+
+class _Timer:
+    __slots__ = ("_hist", "_labels", "_start")
+
+    def __init__(self, hist, labels):
+        self._hist, self._labels = hist, labels
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._hist.observe(time.perf_counter() - self._start, **self._labels)
+        return False
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, doc, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.doc, self.labelnames = name, doc, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # key -> [conteos por bucket (no acumulados, último = +Inf), suma]
+        self._values = {}
+
+    def observe(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = tuple(labels[n] for n in self.labelnames)
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][idx] += 1
+            state[1] += value
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        out = []
+        for key, counts, total in items:
+            running = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                running += count
+                out.append((f"{self.name}_bucket", _labels(self.labelnames, key, [("le", _fmt(bound))]), running))
+            out.append((f"{self.name}_sum", _labels(self.labelnames, key), total))
+            out.append((f"{self.name}_count", _labels(self.labelnames, key), running))
+        return out
+
+class CallbackGauge:
+    """Gauge (o counter) leído al hacer scrape: ``fn()`` devuelve ``[(labels_dict, value), ...]``."""
+
+    def __init__(self, name, doc, fn, kind="gauge"):
+        self.name, self.doc, self.fn, self.kind = name, doc, fn, kind
+
+    def samples(self):
+        out = []
+        for labels, value in self.fn():
+            names = tuple(labels)
+            out.append((self.name, _labels(names, tuple(labels[n] for n in names)), value))
+        return out
+
+_registry = []
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.doc}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{labels} {_fmt(value)}")
+    return "\n".join(lines) + "\n"
+
+# --- Métricas de la aplicación ---
+
+HTTP_REQUEST_DURATION = register(Histogram(
+    "http_request_duration_seconds", "Latencia de las peticiones HTTP por ruta", ("method", "route", "status"),
+))
+BOOKING_STEP_DURATION = register(Histogram(
+    "booking_step_duration_seconds",
+    "Tiempo de cada paso de la transacción de reserva (lock_wait = espera del FOR UPDATE de la sesión)",
+    ("operation", "step"),
+))
+BOOKING_OUTCOMES = register(Counter(
+    "booking_outcomes_total", "Resultados de reservas (booked, waitlisted, full, overlap, unavailable, ...)", ("outcome",),
+))
+WAITLIST_PROMOTIONS = register(Counter(
+    "waitlist_promotions_total", "Entradas de lista de espera promovidas a reserva",
+))
+DB_QUERY_DURATION = register(Histogram(
+    "db_query_duration_seconds", "Duración de las sentencias SQL", (),
+))
+DB_POOL_CHECKOUT_WAIT = register(Histogram(
+    "db_pool_checkout_wait_seconds", "Espera hasta obtener una conexión del pool", (),
+))
@@ -1,8 +1,8 @@
 # app/models.py
 from sqlalchemy import (
-    Column, String, Integer, Boolean, DateTime, ForeignKey, Text, Enum as SAEnum, JSON, CheckConstraint, func
+    Column, String, Integer, BigInteger, Boolean, Date, DateTime, ForeignKey, Text, Enum as SAEnum, JSON, CheckConstraint, Computed, func
 )
-from sqlalchemy.dialects.postgresql import UUID, ARRAY
+from sqlalchemy.dialects.postgresql import UUID, ARRAY, JSONB, TSTZRANGE, ExcludeConstraint
 from sqlalchemy.orm import relationship, declarative_base
 import enum
 import uuid
@@ -43,7 +43,7 @@ class User(Base):
     email = Column(String, nullable=False, unique=True)
     phone = Column(String)
     password_hash = Column(String, nullable=False)
-    role = Column(SAEnum(UserRole), nullable=False, default=UserRole.member)
+    role = Column(SAEnum(UserRole, name='user_role', schema='gym'), nullable=False, default=UserRole.member)
     plan_id = Column(UUID(as_uuid=True), ForeignKey('gym.plans.id'))
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, server_default=func.now())
@@ -94,7 +94,12 @@ class Session(Base):
     start_time = Column(DateTime(timezone=True), nullable=False)
     end_time = Column(DateTime(timezone=True), nullable=False)
     capacity = Column(Integer, nullable=False, default=20)
-    status = Column(SAEnum(SessionStatus), default=SessionStatus.scheduled)
+    # Contadores mantenidos por triggers (gym.sync_session_booked_count / gym.sync_session_waitlist_count)
+    booked_count = Column(Integer, nullable=False, default=0, server_default='0')
+    waitlist_count = Column(Integer, nullable=False, default=0, server_default='0')
+    # tstzrange(start_time, end_time) almacenado, con índice GiST (idx_sessions_period)
+    period = Column(TSTZRANGE, Computed('tstzrange(start_time, end_time)', persisted=True))
+    status = Column(SAEnum(SessionStatus, name='session_status', schema='gym'), default=SessionStatus.scheduled)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now())
     class_type = relationship("ClassType")
@@ -108,12 +113,29 @@ class Reservation(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     session_id = Column(UUID(as_uuid=True), ForeignKey('gym.sessions.id'), nullable=False)
     user_id = Column(UUID(as_uuid=True), ForeignKey('gym.users.id'), nullable=False)
-    status = Column(SAEnum(ReservationStatus), default=ReservationStatus.booked)
+    status = Column(SAEnum(ReservationStatus, name='reservation_status', schema='gym'), default=ReservationStatus.booked)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now())
     session = relationship("Session", back_populates="reservations")
     user = relationship("User")
 
+class UserBookedInterval(Base):
+    """Intervalos ocupados por reservas 'booked' (mantenida por gym.sync_user_booked_intervals).
+
+    La restricción de exclusión GiST (user_id =, period &&) es la regla de no
+    solapamiento: una comprobación por índice en lugar de recorrer el historial.
+    Requiere la extensión btree_gist.
+    """
+    __tablename__ = 'user_booked_intervals'
+    __table_args__ = (
+        ExcludeConstraint(('user_id', '='), ('period', '&&'), name='ex_user_booked_intervals_overlap', using='gist'),
+        {'schema': 'gym'},
+    )
+    reservation_id = Column(UUID(as_uuid=True), ForeignKey('gym.reservations.id', ondelete='CASCADE'), primary_key=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey('gym.users.id', ondelete='CASCADE'), nullable=False)
+    session_id = Column(UUID(as_uuid=True), ForeignKey('gym.sessions.id', ondelete='CASCADE'), nullable=False)
+    period = Column(TSTZRANGE, nullable=False)
+
 class WaitlistEntry(Base):
     __tablename__ = 'waitlist_entries'
     __table_args__ = {'schema': 'gym'}
@@ -161,3 +183,63 @@ class AuditLog(Base):
     payload = Column(JSON)
     performed_by = Column(UUID(as_uuid=True), ForeignKey('gym.users.id'))
     created_at = Column(DateTime, server_default=func.now())
+
+class UserMonthlyUsage(Base):
+    """Asientos ocupados (booked/attended/no_show) por usuario y mes de la sesión.
+
+    Mantenida por el trigger gym.sync_user_monthly_usage, que además aplica
+    ``Plan.max_monthly_bookings`` (SQLSTATE 23Q01). Ver app/quota.py.
+    """
+    __tablename__ = 'user_monthly_usage'
+    __table_args__ = (CheckConstraint('booked >= 0', name='ck_user_monthly_usage_booked'), {'schema': 'gym'})
+    user_id = Column(UUID(as_uuid=True), ForeignKey('gym.users.id', ondelete='CASCADE'), primary_key=True)
+    month = Column(Date, primary_key=True)
+    booked = Column(Integer, nullable=False, default=0, server_default='0')
+
+class IdempotencyKey(Base):
+    """Clave ``Idempotency-Key`` de un usuario y la respuesta guardada (status_code NULL = en curso).
+
+    Ver app/idempotency.py.
+    """
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = {'schema': 'gym'}
+    user_id = Column(UUID(as_uuid=True), ForeignKey('gym.users.id', ondelete='CASCADE'), primary_key=True)
+    key = Column(Text, primary_key=True)
+    request_hash = Column(Text, nullable=False)
+    status_code = Column(Integer)
+    response = Column(JSONB)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+class ReportChange(Base):
+    """Registro append-only de sesiones cuyo día de rollup hay que recalcular.
+
+    Lo alimentan triggers sobre sessions, reservations y payments; lo consume
+    ``app.reporting.refresh_rollups``.
+    """
+    __tablename__ = 'report_changes'
+    __table_args__ = {'schema': 'gym'}
+    id = Column(BigInteger, primary_key=True)
+    session_id = Column(UUID(as_uuid=True), nullable=False)
+    start_time = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class ReportDailyOccupancy(Base):
+    __tablename__ = 'report_daily_occupancy'
+    __table_args__ = {'schema': 'gym'}
+    id = Column(BigInteger, primary_key=True)
+    day = Column(Date, nullable=False)
+    class_type_id = Column(UUID(as_uuid=True), nullable=False)
+    trainer_id = Column(UUID(as_uuid=True))
+    location_id = Column(UUID(as_uuid=True))
+    currency = Column(String, nullable=False)
+    sessions = Column(Integer, nullable=False)
+    sessions_cancelled = Column(Integer, nullable=False)
+    capacity = Column(Integer, nullable=False)
+    booked = Column(Integer, nullable=False)
+    attended = Column(Integer, nullable=False)
+    no_show = Column(Integer, nullable=False)
+    cancelled = Column(Integer, nullable=False)
+    list_revenue_cents = Column(BigInteger, nullable=False)
+    paid_revenue_cents = Column(BigInteger, nullable=False)
+    refreshed_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
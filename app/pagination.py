@@ -0,0 +1,36 @@
+# app/pagination.py
+"""Cursores opacos para paginación keyset.
+
+Un cursor codifica la clave de ordenación de la última fila devuelta
+(p. ej. ``(start_time, id)``); la página siguiente empieza estrictamente
+después de esa clave, así que cuesta lo mismo que la primera.
+"""
+import base64
+import json
+from datetime import datetime
+from uuid import UUID
+from fastapi import HTTPException
+
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(when: datetime, row_id: UUID) -> str:
+    raw = json.dumps([when.isoformat(), str(row_id)], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        when, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(when), UUID(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+def clamp_limit(limit: int) -> int:
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def split_page(rows, limit: int, key):
+    """Recorta las ``limit + 1`` filas pedidas y genera el cursor de la siguiente página."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*key(rows[-1]))
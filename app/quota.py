@@ -0,0 +1,121 @@
+# app/quota.py
+"""Cuota mensual de reservas del plan (``Plan.max_monthly_bookings``).
+
+El consumo vive en ``gym.user_monthly_usage`` (usuario, mes de la sesión) y lo
+mantiene un trigger sobre reservations en la misma transacción que la
+reserva: +1 al pasar a booked/attended/no_show, -1 al cancelar. El mismo
+trigger rechaza la reserva que excede el límite con SQLSTATE ``23Q01``; la
+app lo traduce a un 400. Leer la cuota restante son dos lecturas por clave
+primaria, sin recorrer reservas.
+
+Los meses los define ``gym.quota_month`` (mes natural en UTC).
+"""
+from datetime import date
+from typing import Optional
+from uuid import UUID
+from sqlalchemy import select, func, text, bindparam, and_, literal
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
+from sqlalchemy.orm import Session
+from .models import User, Plan, UserMonthlyUsage, WaitlistEntry
+
+QUOTA_SQLSTATE = "23Q01"
+QUOTA_DETAIL = "Has alcanzado el límite mensual de reservas de tu plan"
+# Clase del pg_advisory_xact_lock(_shared) por usuario que toma el trigger
+USAGE_LOCK_CLASS = 7301
+
+def quota_month(ts):
+    """Expresión SQL del mes de cuota de ``ts``."""
+    return func.gym.quota_month(ts)
+
+def quota_stmt(user_id: UUID, month: Optional[date] = None):
+    """Límite y consumo de ``user_id`` en ``month`` (por defecto, el mes actual)."""
+    m = quota_month(func.now()) if month is None else literal(month.replace(day=1))
+    return (
+        select(m.label("month"), Plan.max_monthly_bookings.label("limit"), func.coalesce(UserMonthlyUsage.booked, 0).label("used"))
+        .select_from(User)
+        .outerjoin(Plan, Plan.id == User.plan_id)
+        .outerjoin(UserMonthlyUsage, and_(UserMonthlyUsage.user_id == User.id, UserMonthlyUsage.month == m))
+        .filter(User.id == user_id)
+    )
+
+def quota_out(row) -> dict:
+    remaining = None if row.limit is None else max(row.limit - row.used, 0)
+    return {"month": row.month, "limit": row.limit, "used": row.used, "remaining": remaining}
+
+_REMAINING_SQL = text("""
+    SELECT s.id, gym.quota_month(s.start_time) AS month, p.max_monthly_bookings - coalesce(u.booked, 0) AS remaining
+      FROM gym.sessions s
+      JOIN gym.users usr ON usr.id = :user_id
+      LEFT JOIN gym.plans p ON p.id = usr.plan_id
+      LEFT JOIN gym.user_monthly_usage u ON u.user_id = usr.id AND u.month = gym.quota_month(s.start_time)
+     WHERE s.id = ANY(:ids)
+""").bindparams(bindparam("ids", type_=ARRAY(PG_UUID(as_uuid=True))))
+
+def remaining_by_session(db: Session, user_id: UUID, session_ids) -> dict:
+    """``{session_id: (month, remaining)}``; remaining es None si el plan no tiene límite."""
+    rows = db.execute(_REMAINING_SQL, {"user_id": user_id, "ids": list(session_ids)}).all()
+    return {sid: (month, remaining) for sid, month, remaining in rows}
+
+def over_quota_clause(session_start):
+    """Condición correlacionada con WaitlistEntry: el usuario ya agotó el mes de ``session_start``."""
+    return (
+        select(UserMonthlyUsage.user_id)
+        .join(User, User.id == UserMonthlyUsage.user_id)
+        .join(Plan, Plan.id == User.plan_id)
+        .filter(
+            UserMonthlyUsage.user_id == WaitlistEntry.user_id,
+            UserMonthlyUsage.month == quota_month(session_start),
+            UserMonthlyUsage.booked >= Plan.max_monthly_bookings,
+        )
+        .exists()
+    )
+
+_RECONCILE_USAGE_SQL = text("""
+    WITH actual AS (
+        SELECT r.user_id, gym.quota_month(s.start_time) AS month, count(*) AS booked
+          FROM gym.reservations r JOIN gym.sessions s ON s.id = r.session_id
+         WHERE r.user_id = ANY(:ids) AND r.status IN ('booked', 'attended', 'no_show')
+         GROUP BY 1, 2
+    ), upserted AS (
+        INSERT INTO gym.user_monthly_usage AS u (user_id, month, booked)
+        SELECT user_id, month, booked FROM actual
+        ON CONFLICT (user_id, month) DO UPDATE SET booked = EXCLUDED.booked
+         WHERE u.booked <> EXCLUDED.booked
+        RETURNING u.user_id
+    ), zeroed AS (
+        UPDATE gym.user_monthly_usage u SET booked = 0
+         WHERE u.user_id = ANY(:ids) AND u.booked <> 0
+           AND NOT EXISTS (SELECT 1 FROM actual a WHERE a.user_id = u.user_id AND a.month = u.month)
+        RETURNING u.user_id
+    )
+    SELECT user_id FROM upserted UNION SELECT user_id FROM zeroed
+""").bindparams(bindparam("ids", type_=ARRAY(PG_UUID(as_uuid=True))))
+
+_LOCK_USERS_SQL = text("""
+    SELECT pg_advisory_xact_lock(:cls, hashtext(id::text)) FROM unnest(:ids) AS id ORDER BY id
+""").bindparams(bindparam("ids", type_=ARRAY(PG_UUID(as_uuid=True))))
+
+def reconcile_monthly_usage(db: Session, user_ids: Optional[list[UUID]] = None, batch_size: int = 500):
+    """Recalcula ``gym.user_monthly_usage`` desde las reservas y corrige la deriva.
+
+    Por lotes de usuarios ordenados por id: toma en exclusiva el advisory lock
+    por usuario (el trigger lo toma compartido, así que espera a las reservas en
+    curso de esos usuarios) y recuenta en una sentencia posterior, que ya ve lo
+    confirmado. Las filas de meses sin uso quedan a 0. Devuelve los usuarios corregidos.
+    """
+    fixed = []
+    last_id = None
+    while True:
+        q = select(User.id).order_by(User.id).limit(batch_size)
+        if user_ids is not None:
+            q = q.filter(User.id.in_(user_ids))
+        if last_id is not None:
+            q = q.filter(User.id > last_id)
+        ids = list(db.execute(q).scalars().all())
+        if not ids:
+            break
+        db.execute(_LOCK_USERS_SQL, {"cls": USAGE_LOCK_CLASS, "ids": ids})
+        fixed.extend(db.execute(_RECONCILE_USAGE_SQL, {"ids": ids}).scalars().all())
+        db.commit()
+        last_id = ids[-1]
+    return fixed
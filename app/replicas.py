@@ -0,0 +1,175 @@
+# app/replicas.py
+"""Enrutado de las lecturas a réplicas (``DATABASE_REPLICA_URLS``).
+
+Las rutas de solo lectura (listado y detalle de sesiones, mis reservas, mi
+cuota, informes) piden la sesión con ``get_read_db`` / ``get_async_read_db``:
+va a una réplica sana en turno rotatorio, o al primario si no hay ninguna.
+Sin réplicas configuradas es exactamente ``get_db`` / ``get_async_db``.
+
+- Lag: un hilo de fondo mide cada ``REPLICA_LAG_CHECK_SECONDS`` el retraso de
+  cada réplica (consulta en la propia réplica). Se descarta la que pasa de
+  ``REPLICA_MAX_LAG_SECONDS``, la que no responde y la que lleva dos
+  comprobaciones sin medirse.
+- Read-your-writes: toda escritura con éxito (POST/PUT/PATCH/DELETE) deja la
+  cookie ``REPLICA_STICKY_COOKIE`` y, mientras dura, las lecturas de ese
+  cliente van al primario. Dura ``REPLICA_MAX_LAG_SECONDS`` más dos
+  comprobaciones: una réplica admitida nunca va más retrasada que eso, así
+  que al caducar la cookie la reserva o cancelación ya está en todas.
+
+Una réplica que cae entre dos comprobaciones hace fallar las lecturas que le
+tocan hasta la siguiente (pool_pre_ping descarta las conexiones muertas).
+"""
+import itertools
+import logging
+import math
+import os
+import threading
+import time
+from typing import Optional
+from fastapi import Request
+from sqlalchemy import text
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "1"))
+REPLICA_STICKY_COOKIE = "read_primary_until"
+STICKY_SECONDS = REPLICA_MAX_LAG_SECONDS + 2 * REPLICA_LAG_CHECK_SECONDS
+
+# Con el receptor al día (nada recibido sin aplicar; tras reiniciar, lo recibido
+# empieza antes de lo ya aplicado) no hay retraso aunque el primario lleve rato
+# sin escribir; si no, la edad de la última transacción aplicada.
+# NULL (nada aplicado aún) = réplica no apta. Un servidor que no es réplica: 0.
+LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() <= pg_last_wal_replay_lsn()
+             AND EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+""")
+
+READ_ROUTING = metrics.register(metrics.Counter(
+    "db_read_routing_total", "Lecturas por destino (replica, sticky = primario tras escribir, fallback = ninguna réplica apta)", ("target",),
+))
+
+# Por réplica (índice de database.replica_engines): (lag en s o None, monotonic de la medida)
+_lags = []
+_next = itertools.count()
+_stop = threading.Event()
+_thread = None
+
+def _lag_ok(lag) -> bool:
+    return lag is not None and lag <= REPLICA_MAX_LAG_SECONDS
+
+def _lag_samples():
+    return [({"replica": str(i)}, lag) for i, (lag, _) in enumerate(_lags) if lag is not None]
+
+def _healthy_samples():
+    ok = set(healthy(_lags, time.monotonic()))
+    return [({"replica": str(i)}, int(i in ok)) for i in range(len(_lags))]
+
+metrics.register(metrics.CallbackGauge("db_replica_lag_seconds", "Retraso medido de cada réplica", _lag_samples))
+metrics.register(metrics.CallbackGauge("db_replica_healthy", "1 si la réplica recibe lecturas", _healthy_samples))
+
+def healthy(lags, now: float) -> list:
+    """Índices de las réplicas aptas: medidas hace poco y con lag por debajo del máximo."""
+    horizon = now - 2 * REPLICA_LAG_CHECK_SECONDS
+    return [
+        i for i, (lag, measured_at) in enumerate(lags)
+        if _lag_ok(lag) and measured_at >= horizon
+    ]
+
+def is_sticky(cookie: Optional[str], now: float) -> bool:
+    """La cookie guarda hasta cuándo (epoch) leer del primario; más allá de STICKY_SECONDS es falsa."""
+    try:
+        until = float(cookie)
+    except (TypeError, ValueError):
+        return False
+    return now < until <= now + STICKY_SECONDS
+
+def mark_written(response):
+    """Lecturas de este cliente al primario durante STICKY_SECONDS."""
+    response.set_cookie(
+        REPLICA_STICKY_COOKIE, f"{time.time() + STICKY_SECONDS:.3f}",
+        max_age=math.ceil(STICKY_SECONDS), httponly=True, samesite="lax",
+    )
+
+def choose(request: Request) -> Optional[int]:
+    """Índice de la réplica para esta lectura, o None = primario."""
+    if is_sticky(request.cookies.get(REPLICA_STICKY_COOKIE), time.time()):
+        READ_ROUTING.inc(target="sticky")
+        return None
+    candidates = healthy(_lags, time.monotonic())
+    if not candidates:
+        READ_ROUTING.inc(target="fallback")
+        return None
+    READ_ROUTING.inc(target="replica")
+    return candidates[next(_next) % len(candidates)]
+
+def read_session(request: Request):
+    """Session sync para una lectura (réplica o primario); la cierra quien la pide."""
+    from .database import SessionLocal, ReplicaSessions
+    index = choose(request) if ReplicaSessions else None
+    return (SessionLocal if index is None else ReplicaSessions[index])()
+
+def get_read_db(request: Request):
+    db = read_session(request)
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_db(request: Request):
+    from .database import AsyncSessionLocal, AsyncReplicaSessions
+    index = choose(request) if AsyncReplicaSessions else None
+    async with (AsyncSessionLocal if index is None else AsyncReplicaSessions[index])() as db:
+        yield db
+
+def _measure(engine) -> Optional[float]:
+    try:
+        with engine.connect() as conn:
+            lag = conn.execute(LAG_SQL).scalar()
+    except Exception:
+        logger.debug("Comprobación de lag fallida", exc_info=True)
+        return None
+    return None if lag is None else float(lag)
+
+def check_once(engines):
+    """Mide todas las réplicas (siempre con los engines sync, también en modo async)."""
+    global _lags
+    lags = []
+    for i, engine in enumerate(engines):
+        # Instante de antes de la consulta: el lag medido vale desde ahí, no desde la respuesta
+        measured_at = time.monotonic()
+        lag = _measure(engine)
+        was_ok = i < len(_lags) and _lag_ok(_lags[i][0])
+        if was_ok and not _lag_ok(lag):
+            logger.warning("Réplica %d fuera del enrutado de lecturas (lag=%s)", i, lag)
+        elif not was_ok and _lag_ok(lag):
+            logger.info("Réplica %d recibe lecturas (lag=%.3fs)", i, lag)
+        lags.append((lag, measured_at))
+    # Una sola asignación: choose() nunca ve una lista a medias
+    _lags = lags
+
+def _run(engines):
+    while not _stop.is_set():
+        check_once(engines)
+        _stop.wait(REPLICA_LAG_CHECK_SECONDS)
+
+def start():
+    global _thread
+    from .database import replica_engines
+    if not replica_engines or _thread is not None:
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_run, args=(replica_engines,), name="replica-lag", daemon=True)
+    _thread.start()
+
+def shutdown():
+    global _thread
+    if _thread is not None:
+        _stop.set()
+        _thread.join()
+        _thread = None
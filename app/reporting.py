@@ -0,0 +1,196 @@
+# app/reporting.py
+"""Informes de ocupación e ingresos sobre rollups diarios.
+
+Los endpoints de informes solo leen ``gym.report_daily_occupancy`` (una fila
+por día, tipo de clase, entrenador, sala y moneda), nunca ``gym.reservations``.
+
+El rollup se mantiene de forma incremental: triggers sobre sessions,
+reservations y payments añaden a ``gym.report_changes`` la sesión tocada y su
+``start_time``. ``refresh_rollups`` consume ese registro por lotes y recalcula
+solo los días afectados (DELETE + INSERT ... SELECT de ese día) en la misma
+transacción que borra los cambios consumidos. Un advisory lock serializa los
+refrescos concurrentes. Los días se calculan en ``REPORT_TIMEZONE``; si cambia
+la zona o los precios, ``rebuild_rollups`` recalcula un rango completo.
+"""
+import csv
+import io
+import os
+from datetime import date, timedelta
+from sqlalchemy import select, func, text, bindparam, cast, Date, String
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Session
+from .models import ReportDailyOccupancy, ReportChange, ClassType, Trainer, User, Location
+
+REPORT_TIMEZONE = os.getenv("REPORT_TIMEZONE", "UTC")
+# Clave del pg_advisory_xact_lock que serializa los refrescos
+REPORT_REFRESH_LOCK = 0x6779_6D72
+
+_CLAIM_SQL = text("""
+    DELETE FROM gym.report_changes
+     WHERE id IN (SELECT id FROM gym.report_changes ORDER BY id LIMIT :limit)
+    RETURNING (start_time AT TIME ZONE :tz)::date
+""")
+
+_DELETE_DAYS_SQL = text(
+    "DELETE FROM gym.report_daily_occupancy WHERE day = ANY(:days)"
+).bindparams(bindparam("days", type_=ARRAY(Date)))
+
+# Rango [día 00:00, día+1 00:00) en REPORT_TIMEZONE: usa los índices por start_time.
+# Asientos ocupados = booked + attended + no_show, solo en sesiones no canceladas.
+_INSERT_DAYS_SQL = text("""
+    WITH s AS (
+      SELECT d.day, s.id, s.class_type_id, s.trainer_id, s.location_id, s.capacity, s.status <> 'cancelled' AS live
+        FROM unnest(:days) AS d(day)
+        JOIN gym.sessions s
+          ON s.start_time >= (d.day::timestamp AT TIME ZONE :tz)
+         AND s.start_time < ((d.day + 1)::timestamp AT TIME ZONE :tz)
+    )
+    INSERT INTO gym.report_daily_occupancy (
+      day, class_type_id, trainer_id, location_id, currency, sessions, sessions_cancelled, capacity,
+      booked, attended, no_show, cancelled, list_revenue_cents, paid_revenue_cents
+    )
+    SELECT s.day, s.class_type_id, s.trainer_id, s.location_id, coalesce(ct.currency, 'USD'),
+           count(*) FILTER (WHERE s.live),
+           count(*) FILTER (WHERE NOT s.live),
+           coalesce(sum(s.capacity) FILTER (WHERE s.live), 0),
+           coalesce(sum(r.booked) FILTER (WHERE s.live), 0),
+           coalesce(sum(r.attended) FILTER (WHERE s.live), 0),
+           coalesce(sum(r.no_show) FILTER (WHERE s.live), 0),
+           coalesce(sum(r.cancelled), 0),
+           coalesce(sum(coalesce(ct.price_cents, 0) * (r.booked + r.attended + r.no_show)) FILTER (WHERE s.live), 0),
+           coalesce(sum(p.paid), 0)
+      FROM s
+      JOIN gym.class_types ct ON ct.id = s.class_type_id
+      CROSS JOIN LATERAL (
+        SELECT count(*) FILTER (WHERE status = 'booked') AS booked,
+               count(*) FILTER (WHERE status = 'attended') AS attended,
+               count(*) FILTER (WHERE status = 'no_show') AS no_show,
+               count(*) FILTER (WHERE status = 'cancelled') AS cancelled
+          FROM gym.reservations WHERE session_id = s.id
+      ) r
+      CROSS JOIN LATERAL (
+        SELECT sum(pay.amount_cents) AS paid
+          FROM gym.reservations r2 JOIN gym.payments pay ON pay.reservation_id = r2.id
+         WHERE r2.session_id = s.id AND pay.status = 'succeeded'
+      ) p
+     GROUP BY s.day, s.class_type_id, s.trainer_id, s.location_id, coalesce(ct.currency, 'USD')
+""").bindparams(bindparam("days", type_=ARRAY(Date)))
+
+def recompute_days(db: Session, days):
+    """Reemplaza las filas de rollup de ``days`` (no confirma)."""
+    days = sorted(set(days))
+    if not days:
+        return
+    db.execute(_DELETE_DAYS_SQL, {"days": days})
+    db.execute(_INSERT_DAYS_SQL, {"days": days, "tz": REPORT_TIMEZONE})
+
+def refresh_rollups(db: Session, batch_size: int = 5000) -> list:
+    """Consume ``gym.report_changes`` y recalcula los días afectados.
+
+    Cada lote (cambios consumidos + días recalculados) es una transacción:
+    si falla, los cambios siguen pendientes. Devuelve los días refrescados.
+    """
+    refreshed = set()
+    while True:
+        db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": REPORT_REFRESH_LOCK})
+        days = set(db.execute(_CLAIM_SQL, {"limit": batch_size, "tz": REPORT_TIMEZONE}).scalars())
+        if not days:
+            db.commit()
+            break
+        recompute_days(db, days)
+        db.commit()
+        refreshed |= days
+    return sorted(refreshed)
+
+def rebuild_rollups(db: Session, date_from: date, date_to: date) -> int:
+    """Recalcula todos los días de [date_from, date_to] (backfill, cambio de zona o de precios)."""
+    days = [date_from + timedelta(days=i) for i in range((date_to - date_from).days + 1)]
+    db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": REPORT_REFRESH_LOCK})
+    recompute_days(db, days)
+    db.commit()
+    return len(days)
+
+# --- Lectura ---
+
+REPORT_GROUPS = ("day", "class_type", "trainer", "location")
+
+REPORT_COLUMNS = (
+    "key", "label", "currency", "sessions", "sessions_cancelled", "capacity", "booked", "attended", "no_show",
+    "cancelled", "fill_rate", "no_show_rate", "list_revenue_cents", "paid_revenue_cents",
+)
+
+def occupancy_report_stmt(date_from: date, date_to: date, group_by: str = "class_type"):
+    """Agregado de los rollups de [date_from, date_to] (ambos incluidos) por ``group_by``."""
+    R = ReportDailyOccupancy
+    joins = []
+    if group_by == "day":
+        key, label = R.day, cast(R.day, String)
+    elif group_by == "class_type":
+        key, label = R.class_type_id, ClassType.title
+        joins = [(ClassType, ClassType.id == R.class_type_id)]
+    elif group_by == "trainer":
+        key, label = R.trainer_id, User.full_name
+        joins = [(Trainer, Trainer.id == R.trainer_id), (User, User.id == Trainer.user_id)]
+    elif group_by == "location":
+        key, label = R.location_id, Location.name
+        joins = [(Location, Location.id == R.location_id)]
+    else:
+        raise ValueError(f"group_by desconocido: {group_by}")
+    q = select(
+        key.label("key"),
+        label.label("label"),
+        R.currency,
+        func.sum(R.sessions).label("sessions"),
+        func.sum(R.sessions_cancelled).label("sessions_cancelled"),
+        func.sum(R.capacity).label("capacity"),
+        func.sum(R.booked).label("booked"),
+        func.sum(R.attended).label("attended"),
+        func.sum(R.no_show).label("no_show"),
+        func.sum(R.cancelled).label("cancelled"),
+        func.sum(R.list_revenue_cents).label("list_revenue_cents"),
+        func.sum(R.paid_revenue_cents).label("paid_revenue_cents"),
+    ).select_from(R)
+    for target, onclause in joins:
+        q = q.outerjoin(target, onclause)
+    return (
+        q.filter(R.day >= date_from, R.day <= date_to)
+        .group_by(key, label, R.currency)
+        .order_by(key, R.currency)
+    )
+
+def _rate(num, den):
+    return round(num / den, 4) if den else None
+
+def report_row(row) -> dict:
+    """Fila agregada -> dict con ocupación (asientos/aforo) y no-show (no_show/(attended+no_show))."""
+    out = dict(row._mapping)
+    out["key"] = str(out["key"]) if out["key"] is not None else None
+    for name in ("sessions", "sessions_cancelled", "capacity", "booked", "attended", "no_show", "cancelled",
+                 "list_revenue_cents", "paid_revenue_cents"):
+        out[name] = int(out[name] or 0)
+    out["fill_rate"] = _rate(out["booked"] + out["attended"] + out["no_show"], out["capacity"])
+    out["no_show_rate"] = _rate(out["no_show"], out["attended"] + out["no_show"])
+    return out
+
+def report_status(db: Session) -> dict:
+    """Frescura de los rollups: último refresco y cambios aún sin consumir."""
+    return {
+        "refreshed_at": db.execute(select(func.max(ReportDailyOccupancy.refreshed_at))).scalar_one(),
+        "pending_changes": db.execute(select(func.count()).select_from(ReportChange)).scalar_one(),
+    }
+
+def iter_csv(rows, chunk_rows: int = 500):
+    """Genera el CSV en trozos de ``chunk_rows`` filas: memoria acotada sea cual sea el informe."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(REPORT_COLUMNS)
+    n = 0
+    for row in rows:
+        item = report_row(row)
+        writer.writerow(["" if item[c] is None else item[c] for c in REPORT_COLUMNS])
+        n += 1
+        if n % chunk_rows == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
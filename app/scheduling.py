@@ -0,0 +1,207 @@
+# app/scheduling.py
+"""Generación masiva de sesiones a partir de reglas RRULE.
+
+Flujo de ``generate_schedule``:
+
+1. Expande cada plantilla (RRULE propia o las ``TrainerAvailability`` del
+   entrenador) en candidatos ``(start, end)`` dentro de la ventana pedida.
+2. Carga en una sola consulta las sesiones existentes de esos entrenadores y
+   salas en la ventana.
+3. Detecta dobles reservas de entrenador/sala en memoria (``ResourceCalendar``).
+4. Inserta los candidatos aceptados con INSERT multi-fila en una transacción.
+
+Un advisory lock de transacción, tomado antes del paso 2, serializa las
+generaciones concurrentes: la segunda ve las sesiones que insertó la primera
+y no las duplica. ``dry_run`` no escribe y no lo toma.
+"""
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+from uuid import uuid4
+from dateutil.rrule import rrulestr
+from fastapi import HTTPException
+from sqlalchemy import select, insert, or_, text
+from sqlalchemy.orm import Session
+from .models import Session as SessionModel, ClassType, TrainerAvailability, SessionStatus
+
+INSERT_CHUNK = 1000
+MAX_REPORTED_CONFLICTS = 200
+# Clave del pg_advisory_xact_lock que serializa las generaciones
+SCHEDULE_GENERATE_LOCK = 0x6779_7363
+
+def _aware(dt: datetime) -> datetime:
+    return dt if dt.tzinfo is not None else dt.replace(tzinfo=timezone.utc)
+
+def expand_rrule(rule: str, dtstart: datetime, window_start: datetime, window_end: datetime):
+    """Inicios de las ocurrencias de ``rule`` en [window_start, window_end)."""
+    rule = rule.strip()
+    if rule.upper().startswith("RRULE:"):
+        rule = rule[len("RRULE:"):]
+    try:
+        recurrence = rrulestr(rule, dtstart=_aware(dtstart))
+    except (ValueError, TypeError) as exc:
+        raise HTTPException(status_code=400, detail=f"RRULE inválida: {exc}")
+    return [dt for dt in recurrence.between(_aware(window_start), _aware(window_end), inc=True) if dt < _aware(window_end)]
+
+def split_window(start: datetime, end: datetime, duration: timedelta):
+    """Huecos consecutivos de ``duration`` que caben en [start, end)."""
+    slots = []
+    while start + duration <= end:
+        slots.append((start, start + duration))
+        start += duration
+    return slots
+
+class ResourceCalendar:
+    """Ocupación de un recurso (entrenador o sala) para detectar solapes en memoria.
+
+    Los intervalos existentes pueden solaparse entre sí (datos heredados): se
+    consultan con bisect sobre los inicios y el máximo acumulado de los finales.
+    Los aceptados en esta generación nunca se solapan, basta mirar vecinos.
+    """
+
+    def __init__(self, existing=()):
+        existing = sorted(existing)
+        self._starts = [s for s, _ in existing]
+        self._max_end = list(accumulate((e for _, e in existing), max))
+        self._accepted = []
+
+    def is_free(self, start: datetime, end: datetime) -> bool:
+        idx = bisect_left(self._starts, end)
+        if idx and self._max_end[idx - 1] > start:
+            return False
+        pos = bisect_left(self._accepted, (start, start))
+        if pos and self._accepted[pos - 1][1] > start:
+            return False
+        if pos < len(self._accepted) and self._accepted[pos][0] < end:
+            return False
+        return True
+
+    def add(self, start: datetime, end: datetime):
+        insort(self._accepted, (start, end))
+
+def plan_sessions(candidates, existing_by_resource):
+    """Separa candidatos en aceptados y conflictos.
+
+    ``candidates``: dicts con start_time, end_time, trainer_id, location_id.
+    ``existing_by_resource``: {("trainer"|"location", id): [(start, end), ...]}.
+    """
+    calendars = {key: ResourceCalendar(intervals) for key, intervals in existing_by_resource.items()}
+    accepted, conflicts = [], []
+    for cand in sorted(candidates, key=lambda c: c["start_time"]):
+        keys = [key for key in (("trainer", cand["trainer_id"]), ("location", cand["location_id"])) if key[1] is not None]
+        for key in keys:
+            calendars.setdefault(key, ResourceCalendar())
+        busy = [key[0] for key in keys if not calendars[key].is_free(cand["start_time"], cand["end_time"])]
+        if busy:
+            conflicts.append({**cand, "reason": "+".join(busy)})
+            continue
+        for key in keys:
+            calendars[key].add(cand["start_time"], cand["end_time"])
+        accepted.append(cand)
+    return accepted, conflicts
+
+def _template_candidates(db: Session, tpl, window_start, window_end, durations):
+    duration = timedelta(minutes=tpl.duration_minutes or durations[tpl.class_type_id])
+    base = {
+        "class_type_id": tpl.class_type_id,
+        "trainer_id": tpl.trainer_id,
+        "location_id": tpl.location_id,
+        "capacity": tpl.capacity,
+    }
+    if not tpl.from_availability:
+        if not tpl.rrule or not tpl.first_start:
+            raise HTTPException(status_code=400, detail="Cada plantilla necesita rrule y first_start, o from_availability")
+        return [{**base, "start_time": start, "end_time": start + duration}
+                for start in expand_rrule(tpl.rrule, tpl.first_start, window_start, window_end)]
+
+    if tpl.trainer_id is None:
+        raise HTTPException(status_code=400, detail="from_availability requiere trainer_id")
+    rows = db.execute(
+        select(TrainerAvailability).filter(TrainerAvailability.trainer_id == tpl.trainer_id)
+    ).scalars().all()
+    out = []
+    for av in rows:
+        length = av.end_time - av.start_time
+        starts = expand_rrule(av.recurring_rule, av.start_time, window_start, window_end) if av.recurring_rule \
+            else [av.start_time] if window_start <= av.start_time < window_end else []
+        for start in starts:
+            for s, e in split_window(start, start + length, duration):
+                out.append({**base, "start_time": s, "end_time": e})
+    return out
+
+def _existing_intervals(db: Session, trainer_ids, location_ids, window_start, window_end):
+    conds = []
+    if trainer_ids:
+        conds.append(SessionModel.trainer_id.in_(trainer_ids))
+    if location_ids:
+        conds.append(SessionModel.location_id.in_(location_ids))
+    if not conds:
+        return {}
+    rows = db.execute(
+        select(SessionModel.trainer_id, SessionModel.location_id, SessionModel.start_time, SessionModel.end_time)
+        .filter(or_(*conds))
+        .filter(SessionModel.status != SessionStatus.cancelled)
+        .filter(SessionModel.end_time > window_start, SessionModel.start_time < window_end)
+    ).all()
+    existing = {}
+    for trainer_id, location_id, start, end in rows:
+        if trainer_id in trainer_ids:
+            existing.setdefault(("trainer", trainer_id), []).append((start, end))
+        if location_id in location_ids:
+            existing.setdefault(("location", location_id), []).append((start, end))
+    return existing
+
+def generate_schedule(db: Session, window_start: datetime, window_end: datetime, templates, dry_run: bool = False):
+    window_start, window_end = _aware(window_start), _aware(window_end)
+    if window_end <= window_start:
+        raise HTTPException(status_code=400, detail="Ventana vacía")
+
+    class_type_ids = {t.class_type_id for t in templates}
+    durations = dict(db.execute(
+        select(ClassType.id, ClassType.duration_minutes).filter(ClassType.id.in_(class_type_ids))
+    ).all())
+    missing = class_type_ids - durations.keys()
+    if missing:
+        raise HTTPException(status_code=400, detail=f"class_type_id desconocido: {sorted(map(str, missing))}")
+
+    candidates = []
+    for tpl in templates:
+        candidates.extend(_template_candidates(db, tpl, window_start, window_end, durations))
+
+    if not dry_run:
+        # Hasta el commit: las sesiones existentes se leen después de la generación anterior
+        db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEDULE_GENERATE_LOCK})
+    trainer_ids = {c["trainer_id"] for c in candidates if c["trainer_id"] is not None}
+    location_ids = {c["location_id"] for c in candidates if c["location_id"] is not None}
+    existing = _existing_intervals(db, trainer_ids, location_ids, window_start, window_end)
+    accepted, conflicts = plan_sessions(candidates, existing)
+
+    if not dry_run and accepted:
+        rows = [{
+            "id": uuid4(),
+            "class_type_id": c["class_type_id"],
+            "trainer_id": c["trainer_id"],
+            "location_id": c["location_id"],
+            "start_time": c["start_time"],
+            "end_time": c["end_time"],
+            "capacity": c["capacity"],
+            "status": SessionStatus.scheduled,
+        } for c in accepted]
+        # executemany de Core: SQLAlchemy lo agrupa en INSERT ... VALUES multi-fila
+        for i in range(0, len(rows), INSERT_CHUNK):
+            db.execute(insert(SessionModel), rows[i:i + INSERT_CHUNK])
+        db.commit()
+    else:
+        db.rollback()
+
+    return {
+        "candidates": len(candidates),
+        "created": 0 if dry_run else len(accepted),
+        "conflicts": len(conflicts),
+        "conflict_samples": [
+            {"start_time": c["start_time"], "end_time": c["end_time"], "trainer_id": c["trainer_id"],
+             "location_id": c["location_id"], "reason": c["reason"]}
+            for c in conflicts[:MAX_REPORTED_CONFLICTS]
+        ],
+        "dry_run": dry_run,
+    }
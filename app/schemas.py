@@ -1,9 +1,10 @@
 
 # app/schemas.py
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from uuid import UUID
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
+from .models import UserRole
 
 class RegisterIn(BaseModel):
     full_name: str
@@ -23,8 +24,192 @@ class SessionOut(BaseModel):
     start_time: datetime
     end_time: datetime
     capacity: int
+    booked_count: int = 0
+    waitlist_count: int = 0
     status: str
 
+class SessionPage(BaseModel):
+    items: list[SessionOut]
+    next_cursor: Optional[str] = None
+
+class UserAdminUpdate(BaseModel):
+    role: Optional[UserRole] = None
+    is_active: Optional[bool] = None
+    plan_id: Optional[UUID] = None
+
+class SessionAdminUpdate(BaseModel):
+    capacity: int = Field(ge=1)
+
+class UserAdminOut(BaseModel):
+    id: UUID
+    email: str
+    role: str
+    is_active: bool
+    plan_id: Optional[UUID] = None
+
 class ReserveIn(BaseModel):
     session_id: UUID
     auto_waitlist: bool = True
+
+class BatchReserveIn(BaseModel):
+    session_ids: list[UUID] = Field(min_length=1, max_length=100)
+    auto_waitlist: bool = True
+    # True: todo o nada (409 si alguna falla); False: resultado por sesión
+    atomic: bool = False
+
+class BatchReserveItem(BaseModel):
+    session_id: UUID
+    status: str  # booked | waitlisted | failed
+    reservation_id: Optional[UUID] = None
+    position: Optional[int] = None
+    reason: Optional[str] = None
+
+class BatchReserveOut(BaseModel):
+    items: list[BatchReserveItem]
+    booked: int
+    waitlisted: int
+    failed: int
+
+class ClassTypeBrief(BaseModel):
+    id: UUID
+    title: str
+    duration_minutes: int
+
+class LocationBrief(BaseModel):
+    id: UUID
+    name: str
+
+class TrainerBrief(BaseModel):
+    id: UUID
+    full_name: Optional[str] = None
+
+class ReservationSessionOut(BaseModel):
+    id: UUID
+    start_time: datetime
+    end_time: datetime
+    capacity: int
+    status: str
+    class_type_title: Optional[str] = None
+    class_type: Optional[ClassTypeBrief] = None
+    location: Optional[LocationBrief] = None
+    trainer: Optional[TrainerBrief] = None
+
+class ReservationOut(BaseModel):
+    id: UUID
+    status: str
+    created_at: Optional[datetime] = None
+    session: ReservationSessionOut
+
+    @classmethod
+    def from_reservation(cls, r):
+        """Construye la salida desde una Reservation con session/class_type/location/trainer ya cargados."""
+        sess = r.session
+        class_type, location, trainer = sess.class_type, sess.location, sess.trainer
+        return cls(
+            id=r.id,
+            status=r.status,
+            created_at=r.created_at,
+            session=ReservationSessionOut(
+                id=sess.id,
+                start_time=sess.start_time,
+                end_time=sess.end_time,
+                capacity=sess.capacity,
+                status=sess.status,
+                class_type_title=class_type.title if class_type else None,
+                class_type=ClassTypeBrief(id=class_type.id, title=class_type.title, duration_minutes=class_type.duration_minutes) if class_type else None,
+                location=LocationBrief(id=location.id, name=location.name) if location else None,
+                trainer=TrainerBrief(id=trainer.id, full_name=trainer.user.full_name if trainer.user else None) if trainer else None,
+            ),
+        )
+
+class ReservationPage(BaseModel):
+    items: list[ReservationOut]
+    next_cursor: Optional[str] = None
+
+class ScheduleTemplate(BaseModel):
+    class_type_id: UUID
+    location_id: Optional[UUID] = None
+    trainer_id: Optional[UUID] = None
+    capacity: int = 20
+    # Duración de cada sesión; por defecto ClassType.duration_minutes
+    duration_minutes: Optional[int] = None
+    # O bien una RRULE propia (p. ej. "FREQ=WEEKLY;BYDAY=MO,WE;BYHOUR=18")...
+    rrule: Optional[str] = None
+    first_start: Optional[datetime] = None
+    # ...o expandir las TrainerAvailability (recurring_rule) del entrenador
+    from_availability: bool = False
+
+class ScheduleGenerateIn(BaseModel):
+    window_start: datetime
+    window_end: datetime
+    templates: list[ScheduleTemplate]
+    dry_run: bool = False
+
+class ScheduleConflict(BaseModel):
+    start_time: datetime
+    end_time: datetime
+    trainer_id: Optional[UUID] = None
+    location_id: Optional[UUID] = None
+    reason: str
+
+class ScheduleGenerateOut(BaseModel):
+    candidates: int
+    created: int
+    conflicts: int
+    conflict_samples: list[ScheduleConflict]
+    dry_run: bool
+
+class MemberImportError(BaseModel):
+    line: int
+    email: str
+    reason: str
+
+class MemberImportOut(BaseModel):
+    rows: int
+    imported: int
+    failed: int
+    # Primeras IMPORT_MAX_REPORTED_ERRORS filas rechazadas
+    errors: list[MemberImportError]
+    errors_truncated: bool
+
+class SlotOut(BaseModel):
+    trainer_id: UUID
+    trainer_name: str
+    specialties: list[str]
+    start_time: datetime
+    end_time: datetime
+
+class SlotSearchOut(BaseModel):
+    items: list[SlotOut]
+
+class QuotaOut(BaseModel):
+    month: date
+    # None = plan sin límite (o usuario sin plan)
+    limit: Optional[int] = None
+    used: int
+    remaining: Optional[int] = None
+
+class OccupancyReportRow(BaseModel):
+    key: Optional[str] = None
+    label: Optional[str] = None
+    currency: str
+    sessions: int
+    sessions_cancelled: int
+    capacity: int
+    booked: int
+    attended: int
+    no_show: int
+    cancelled: int
+    fill_rate: Optional[float] = None
+    no_show_rate: Optional[float] = None
+    list_revenue_cents: int
+    paid_revenue_cents: int
+
+class OccupancyReportOut(BaseModel):
+    group_by: str
+    date_from: date
+    date_to: date
+    # Frescura de los rollups (ver app.reporting.refresh_rollups)
+    refreshed_at: Optional[datetime] = None
+    pending_changes: int
+    items: list[OccupancyReportRow]
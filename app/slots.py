@@ -0,0 +1,284 @@
+# app/slots.py
+"""Búsqueda de huecos libres de entrenadores (sesiones 1:1).
+
+"¿Qué entrenadores de yoga tienen 60 minutos libres el jueves por la tarde?"
+se contesta desde un índice en memoria, sin consultas por entrenador:
+
+- por entrenador, disponibilidad (``TrainerAvailability`` con ``recurring_rule``
+  expandida) menos sesiones no canceladas = intervalos libres, ordenados y
+  disjuntos (búsqueda por bisect);
+- especialidad -> entrenadores;
+- cubre ``SLOT_HORIZON_DAYS`` desde hoy (UTC); una ventana fuera del horizonte
+  se calcula aparte, sin cachear.
+
+Los huecos de todos los entrenadores candidatos se mezclan por hora de inicio
+(heapq.merge de generadores): se generan solo los ``limit`` primeros.
+
+Invalidación incremental: triggers en sessions, trainer_availability y
+trainers hacen NOTIFY ``trainer_calendar`` con el id del entrenador; la
+conexión LISTEN de app/live.py lo entrega y la siguiente búsqueda recarga solo
+esos entrenadores (tres consultas por conjunto). Tras reconectar LISTEN el
+índice se reconstruye entero; sin LISTEN (LIVE_UPDATES_ENABLED=false) se
+reconstruye al cumplir ``SLOT_INDEX_MAX_AGE_SECONDS``.
+"""
+import heapq
+import logging
+import os
+import threading
+import time
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from typing import Optional
+from uuid import UUID
+from fastapi import HTTPException
+from sqlalchemy import select, or_, and_
+from sqlalchemy.orm import Session
+from . import metrics
+from .models import Trainer, TrainerAvailability, User, Session as SessionModel, SessionStatus
+from .scheduling import expand_rrule, _aware
+
+logger = logging.getLogger(__name__)
+
+SLOT_HORIZON_DAYS = int(os.getenv("SLOT_HORIZON_DAYS", "92"))
+SLOT_INDEX_MAX_AGE_SECONDS = float(os.getenv("SLOT_INDEX_MAX_AGE_SECONDS", "300"))
+SLOT_MAX_WINDOW_DAYS = 31
+CALENDAR_CHANNEL = "trainer_calendar"
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+SLOT_INDEX_LOADS = metrics.register(metrics.Counter(
+    "slot_index_loads_total", "Cargas del índice de huecos de entrenadores (full, incremental, adhoc)", ("kind",),
+))
+
+def merge_intervals(intervals):
+    """Une intervalos solapados o contiguos; devuelve la lista ordenada y disjunta."""
+    out = []
+    for start, end in sorted(intervals):
+        if out and start <= out[-1][1]:
+            if end > out[-1][1]:
+                out[-1] = (out[-1][0], end)
+        else:
+            out.append((start, end))
+    return out
+
+def subtract_intervals(free, busy):
+    """``free`` menos ``busy`` (ambas ordenadas y disjuntas), en un solo barrido."""
+    out, i = [], 0
+    for start, end in free:
+        while i < len(busy) and busy[i][1] <= start:
+            i += 1
+        j = i
+        while j < len(busy) and busy[j][0] < end:
+            if busy[j][0] > start:
+                out.append((start, busy[j][0]))
+            start = max(start, busy[j][1])
+            j += 1
+        if start < end:
+            out.append((start, end))
+    return out
+
+def _align(ts: datetime, step: timedelta) -> datetime:
+    """Primer múltiplo de ``step`` (desde epoch UTC) >= ``ts``: huecos a las en punto, y media..."""
+    offset = (ts - _EPOCH) % step
+    return ts + (step - offset) if offset else ts
+
+class TrainerCalendar:
+    __slots__ = ("trainer_id", "name", "specialties", "free", "_ends")
+
+    def __init__(self, trainer_id, name, specialties, free):
+        self.trainer_id = trainer_id
+        self.name = name
+        self.specialties = specialties or []
+        self.free = free
+        self._ends = [end for _, end in free]
+
+    def slots(self, window_start: datetime, window_end: datetime, duration: timedelta, step: timedelta):
+        """Huecos ``(inicio, fin)`` de ``duration`` dentro de la ventana, por orden de inicio."""
+        for i in range(bisect_right(self._ends, window_start), len(self.free)):
+            start, end = self.free[i]
+            if start >= window_end:
+                return
+            slot = _align(max(start, window_start), step)
+            stop = min(end, window_end)
+            while slot + duration <= stop:
+                yield slot, slot + duration
+                slot += step
+
+def build_calendars(trainers, availability, sessions, horizon_start: datetime, horizon_end: datetime) -> dict:
+    """Calendarios por entrenador a partir de filas planas (BD o benchmark).
+
+    ``trainers``: (id, nombre, especialidades); ``availability``: (trainer_id,
+    inicio, fin, rrule); ``sessions``: (trainer_id, inicio, fin) ocupados.
+    """
+    windows, busy = {}, {}
+    for trainer_id, start, end, rule in availability:
+        length = end - start
+        if rule:
+            try:
+                # Desde horizon_start - length: ocurrencias empezadas antes que siguen abiertas
+                starts = expand_rrule(rule, start, horizon_start - length, horizon_end)
+            except HTTPException:
+                logger.warning("RRULE inválida en la disponibilidad del entrenador %s: %r", trainer_id, rule)
+                continue
+        else:
+            starts = [start]
+        out = windows.setdefault(trainer_id, [])
+        for s in starts:
+            s, e = max(s, horizon_start), min(s + length, horizon_end)
+            if s < e:
+                out.append((s, e))
+    for trainer_id, start, end in sessions:
+        busy.setdefault(trainer_id, []).append((start, end))
+    return {
+        trainer_id: TrainerCalendar(
+            trainer_id, name, specialties,
+            subtract_intervals(merge_intervals(windows.get(trainer_id, ())), merge_intervals(busy.get(trainer_id, ()))),
+        )
+        for trainer_id, name, specialties in trainers
+    }
+
+def specialty_index(calendars: dict) -> dict:
+    index = {}
+    for cal in calendars.values():
+        for specialty in cal.specialties:
+            index.setdefault(specialty.strip().lower(), []).append(cal.trainer_id)
+    return index
+
+def _load(db: Session, horizon_start: datetime, horizon_end: datetime, trainer_ids=None):
+    """Filas de entrenadores activos, disponibilidad y sesiones del horizonte: tres consultas."""
+    trainers = select(Trainer.id, User.full_name, Trainer.specialties).join(User, User.id == Trainer.user_id) \
+        .filter(User.is_active.is_(True))
+    availability = select(
+        TrainerAvailability.trainer_id, TrainerAvailability.start_time, TrainerAvailability.end_time, TrainerAvailability.recurring_rule,
+    ).filter(or_(
+        TrainerAvailability.recurring_rule.isnot(None),
+        and_(TrainerAvailability.end_time > horizon_start, TrainerAvailability.start_time < horizon_end),
+    ))
+    sessions = select(SessionModel.trainer_id, SessionModel.start_time, SessionModel.end_time).filter(
+        SessionModel.trainer_id.isnot(None),
+        SessionModel.status != SessionStatus.cancelled,
+        SessionModel.end_time > horizon_start,
+        SessionModel.start_time < horizon_end,
+    )
+    if trainer_ids is not None:
+        trainers = trainers.filter(Trainer.id.in_(trainer_ids))
+        availability = availability.filter(TrainerAvailability.trainer_id.in_(trainer_ids))
+        sessions = sessions.filter(SessionModel.trainer_id.in_(trainer_ids))
+    return db.execute(trainers).all(), db.execute(availability).all(), db.execute(sessions).all()
+
+class SlotIndex:
+    """Índice cacheado por worker. Las búsquedas leen una instantánea inmutable;
+    las recargas construyen diccionarios nuevos y los sustituyen."""
+
+    def __init__(self):
+        self._build_lock = threading.Lock()
+        # Solo protege _dirty/_stale (invalidate se llama desde el event loop: nunca espera a una carga)
+        self._dirty_lock = threading.Lock()
+        self._dirty = set()
+        self._stale = True
+        # (calendarios, especialidad -> ids, horizonte): se sustituye entera, nunca se modifica
+        self._current = None
+        self._built_at = 0.0
+
+    def invalidate(self, trainer_id=None):
+        """Marca un entrenador (o todo, con None) para recargar en la siguiente búsqueda."""
+        with self._dirty_lock:
+            if trainer_id is None:
+                self._stale = True
+            else:
+                self._dirty.add(trainer_id)
+
+    def snapshot(self, db: Session):
+        """(calendarios, especialidad -> ids, (inicio, fin) del horizonte), recargando lo pendiente."""
+        horizon_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        # Sin esperar al lock: con DB_ASYNC la carga en curso corre en el mismo hilo (run_sync)
+        # y esperarla bloquearía el event loop. Mientras otro recarga se usa la instantánea actual.
+        if not self._build_lock.acquire(blocking=False):
+            if self._current is not None:
+                return self._current
+            horizon = (horizon_start, horizon_start + timedelta(days=SLOT_HORIZON_DAYS))
+            calendars = build_calendars(*_load(db, *horizon), *horizon)
+            SLOT_INDEX_LOADS.inc(kind="adhoc")
+            return calendars, specialty_index(calendars), horizon
+        try:
+            with self._dirty_lock:
+                stale, dirty = self._stale, self._dirty
+                self._stale, self._dirty = False, set()
+            try:
+                expired = time.monotonic() - self._built_at > SLOT_INDEX_MAX_AGE_SECONDS
+                if stale or expired or self._current is None or self._current[2][0] != horizon_start:
+                    horizon = (horizon_start, horizon_start + timedelta(days=SLOT_HORIZON_DAYS))
+                    calendars = build_calendars(*_load(db, *horizon), *horizon)
+                    self._built_at = time.monotonic()
+                    SLOT_INDEX_LOADS.inc(kind="full")
+                elif dirty:
+                    horizon = self._current[2]
+                    calendars = dict(self._current[0])
+                    for trainer_id in dirty:
+                        calendars.pop(trainer_id, None)
+                    # Un entrenador borrado o desactivado no vuelve en la recarga: queda fuera
+                    calendars.update(build_calendars(*_load(db, *horizon, trainer_ids=dirty), *horizon))
+                    SLOT_INDEX_LOADS.inc(kind="incremental")
+                else:
+                    return self._current
+            except Exception:
+                # Lo pendiente no se pierde: la siguiente búsqueda reconstruye entero
+                self.invalidate()
+                raise
+            self._current = (calendars, specialty_index(calendars), horizon)
+            return self._current
+        finally:
+            self._build_lock.release()
+
+index = SlotIndex()
+
+def on_notify(payload: Optional[str]):
+    """Callback del canal ``trainer_calendar`` en app/live.py (payload = id del entrenador)."""
+    index.invalidate(UUID(payload) if payload else None)
+
+def search(
+    db: Session,
+    window_start: datetime,
+    window_end: datetime,
+    duration_minutes: int = 60,
+    step_minutes: int = 30,
+    specialty: Optional[str] = None,
+    trainer_id: Optional[UUID] = None,
+    limit: int = 50,
+):
+    """Huecos reservables en la ventana, ordenados por inicio (y entrenador)."""
+    # Los huecos pasados no son reservables
+    window_start = max(_aware(window_start), datetime.now(timezone.utc))
+    window_end = _aware(window_end)
+    if window_end <= window_start:
+        raise HTTPException(status_code=400, detail="Ventana vacía")
+    if window_end - window_start > timedelta(days=SLOT_MAX_WINDOW_DAYS):
+        raise HTTPException(status_code=400, detail=f"Ventana máxima de {SLOT_MAX_WINDOW_DAYS} días")
+    calendars, by_specialty, horizon = index.snapshot(db)
+    if window_end > horizon[1]:
+        # Fuera del horizonte cacheado: cálculo puntual de la ventana pedida
+        calendars = build_calendars(*_load(db, window_start, window_end), window_start, window_end)
+        by_specialty = specialty_index(calendars)
+        SLOT_INDEX_LOADS.inc(kind="adhoc")
+    return find_slots(
+        calendars, by_specialty, window_start, window_end,
+        timedelta(minutes=duration_minutes), timedelta(minutes=step_minutes), specialty, trainer_id, limit,
+    )
+
+def find_slots(calendars: dict, by_specialty: dict, window_start, window_end, duration: timedelta, step: timedelta,
+               specialty: Optional[str] = None, trainer_id=None, limit: int = 50):
+    """Los ``limit`` primeros huecos de los entrenadores candidatos, por (inicio, entrenador)."""
+    ids = by_specialty.get(specialty.strip().lower(), ()) if specialty else calendars.keys()
+    if trainer_id is not None:
+        ids = [trainer_id] if trainer_id in ids else []
+
+    def stream(cal):
+        key = str(cal.trainer_id)
+        for start, end in cal.slots(window_start, window_end, duration, step):
+            yield start, key, end, cal
+
+    merged = heapq.merge(*(stream(calendars[i]) for i in ids), key=lambda item: (item[0], item[1]))
+    return [
+        {"trainer_id": cal.trainer_id, "trainer_name": cal.name, "specialties": cal.specialties, "start_time": start, "end_time": end}
+        for start, _, end, cal in islice(merged, limit)
+    ]
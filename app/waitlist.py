@@ -0,0 +1,192 @@
+# app/waitlist.py
+"""Motor de lista de espera.
+
+Invariantes, todas bajo el lock FOR UPDATE de la fila de ``gym.sessions`` (el
+mismo que ya serializa reservas y cancelaciones de esa sesión):
+
+- Las entradas en espera (``notified_at IS NULL``) ocupan las posiciones 1..n
+  sin huecos; ``compact`` renumera tras cada baja o promoción.
+- ``promote`` llena todas las plazas libres, cada reserva en su savepoint. La
+  entrada promovida se conserva con ``notified_at`` (relevo para el envío de
+  avisos) y ``position = 0``.
+- ``drain_waitlists`` recorre las sesiones con plazas libres y cola usando
+  ``FOR UPDATE SKIP LOCKED``: varios workers pueden vaciar colas en paralelo
+  sin esperarse entre sí ni promover dos veces a la misma persona.
+"""
+from datetime import datetime, timezone
+from uuid import UUID, uuid4
+from sqlalchemy import select, update, delete, func, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from . import audit, quota
+from .metrics import WAITLIST_PROMOTIONS
+from .models import Session as SessionModel, Reservation, WaitlistEntry, UserBookedInterval, SessionStatus, ReservationStatus
+
+_COMPACT_SQL = text("""
+    UPDATE gym.waitlist_entries w
+       SET position = q.rn
+      FROM (SELECT id, row_number() OVER (ORDER BY position, created_at, id) AS rn
+              FROM gym.waitlist_entries
+             WHERE session_id = :session_id AND notified_at IS NULL) q
+     WHERE w.id = q.id AND w.position <> q.rn
+""")
+
+def enqueue(db: Session, user_id: UUID, session_ids) -> dict:
+    """Pone a ``user_id`` al final de la cola de cada sesión (bloqueadas por el llamante).
+
+    Devuelve ``{session_id: position}``; las sesiones en las que ya estaba
+    esperando no aparecen. Una entrada de una promoción anterior se reutiliza
+    (UNIQUE(session_id, user_id)).
+    """
+    session_ids = list(session_ids)
+    if not session_ids:
+        return {}
+    tails = dict(db.execute(
+        select(WaitlistEntry.session_id, func.max(WaitlistEntry.position))
+        .filter(WaitlistEntry.session_id.in_(session_ids), WaitlistEntry.notified_at.is_(None))
+        .group_by(WaitlistEntry.session_id)
+    ).all())
+    stmt = pg_insert(WaitlistEntry).values([
+        {"id": uuid4(), "session_id": sid, "user_id": user_id, "position": (tails.get(sid) or 0) + 1}
+        for sid in session_ids
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[WaitlistEntry.session_id, WaitlistEntry.user_id],
+        set_={"position": stmt.excluded.position, "notified_at": None, "created_at": func.now()},
+        where=WaitlistEntry.notified_at.is_not(None),
+    ).returning(WaitlistEntry.session_id, WaitlistEntry.position)
+    return dict(db.execute(stmt).all())
+
+def compact(db: Session, session_id: UUID):
+    db.execute(_COMPACT_SQL, {"session_id": session_id})
+
+def leave(db: Session, user_id: UUID, session_id: UUID) -> bool:
+    """Saca a ``user_id`` de la cola (sesión bloqueada por el llamante)."""
+    removed = db.execute(
+        delete(WaitlistEntry)
+        .filter(WaitlistEntry.session_id == session_id, WaitlistEntry.user_id == user_id, WaitlistEntry.notified_at.is_(None))
+        .returning(WaitlistEntry.id)
+    ).first()
+    if removed:
+        compact(db, session_id)
+    return removed is not None
+
+# Reglas que la BD puede imponer al insertar la reserva promovida (ver booking._DB_RULES):
+# otra reserva que solapa (ex_user_booked_intervals_overlap) o cuota mensual agotada
+_SKIP_SQLSTATES = ("23P01", quota.QUOTA_SQLSTATE)
+
+def _book_entry(db: Session, sess_row, user_id: UUID) -> bool:
+    """Reserva para ``user_id`` en un savepoint; False si no se pudo (sigue en la cola)."""
+    stmt = pg_insert(Reservation).values(
+        id=uuid4(), session_id=sess_row.id, user_id=user_id, status=ReservationStatus.booked,
+    )
+    # Solo se reactiva una reserva cancelada; booked/attended/no_show no devuelven fila
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Reservation.session_id, Reservation.user_id],
+        set_={"status": ReservationStatus.booked, "updated_at": func.now()},
+        where=Reservation.status == ReservationStatus.cancelled,
+    ).returning(Reservation.user_id)
+    try:
+        with db.begin_nested():
+            return db.execute(stmt).first() is not None
+    except DBAPIError as exc:
+        if getattr(exc.orig, "pgcode", None) not in _SKIP_SQLSTATES:
+            raise
+        return False
+
+def promote(db: Session, sess_row) -> list:
+    """Ocupa todas las plazas libres de ``sess_row`` (bloqueada FOR UPDATE y recién leída).
+
+    Se saltan, sin perder su turno, quienes tengan otra reserva que solape o
+    hayan agotado la cuota mensual de su plan para el mes de la sesión. Los
+    filtros previos son lecturas: una reserva o un consumo de cuota que llegue
+    entre ellas y el INSERT lo rechaza la BD, y cada promoción va en su
+    savepoint para que ese rechazo solo salte a esa persona (sin tumbar la
+    cancelación que liberó la plaza). Las plazas que quedan se ofrecen a los
+    siguientes de la cola.
+    No confirma: el llamante hace commit junto con el cambio que liberó plazas.
+    """
+    free = sess_row.capacity - sess_row.booked_count
+    if free <= 0 or sess_row.status != SessionStatus.scheduled or not sess_row.waitlist_count:
+        return []
+    busy = (
+        select(UserBookedInterval.reservation_id)
+        .filter(
+            UserBookedInterval.user_id == WaitlistEntry.user_id,
+            UserBookedInterval.period.op("&&")(func.tstzrange(sess_row.start_time, sess_row.end_time)),
+        )
+        .exists()
+    )
+    promoted, tried = [], []
+    while len(promoted) < free:
+        q = (
+            select(WaitlistEntry.id, WaitlistEntry.user_id)
+            .filter(
+                WaitlistEntry.session_id == sess_row.id,
+                WaitlistEntry.notified_at.is_(None),
+                ~busy,
+                ~quota.over_quota_clause(sess_row.start_time),
+            )
+            .order_by(WaitlistEntry.position, WaitlistEntry.created_at)
+            .limit(free - len(promoted))
+        )
+        if tried:
+            q = q.filter(WaitlistEntry.id.not_in(tried))
+        entries = db.execute(q).all()
+        if not entries:
+            break
+        for entry_id, user_id in entries:
+            tried.append(entry_id)
+            if _book_entry(db, sess_row, user_id):
+                promoted.append((entry_id, user_id))
+    if not promoted:
+        return []
+
+    notified_at = datetime.now(timezone.utc)
+    db.execute(
+        update(WaitlistEntry)
+        .filter(WaitlistEntry.id.in_([entry_id for entry_id, _ in promoted]))
+        .values(notified_at=notified_at, position=0)
+        .execution_options(synchronize_session=False)
+    )
+    compact(db, sess_row.id)
+    WAITLIST_PROMOTIONS.inc(len(promoted))
+    return [{"user_id": user_id, "session_id": sess_row.id, "notified_at": notified_at} for _, user_id in promoted]
+
+def drain_waitlists(db: Session, batch_size: int = 100) -> int:
+    """Promueve en todas las sesiones futuras con plazas libres y gente esperando.
+
+    Una pasada por id; las sesiones bloqueadas por otro worker (o por una
+    reserva en curso) se saltan. Confirma por lotes y devuelve cuántas
+    personas se promovieron.
+    """
+    promoted = 0
+    last_id = None
+    while True:
+        q = (
+            select(SessionModel)
+            .filter(
+                SessionModel.status == SessionStatus.scheduled,
+                SessionModel.waitlist_count > 0,
+                SessionModel.booked_count < SessionModel.capacity,
+                SessionModel.start_time > func.now(),
+            )
+            .order_by(SessionModel.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .execution_options(populate_existing=True)
+        )
+        if last_id is not None:
+            q = q.filter(SessionModel.id > last_id)
+        rows = db.execute(q).scalars().all()
+        if not rows:
+            break
+        batch = []
+        for sess_row in rows:
+            batch.extend(promote(db, sess_row))
+        db.commit()
+        audit.record_promotions(batch)
+        promoted += len(batch)
+        last_id = rows[-1].id
+    return promoted
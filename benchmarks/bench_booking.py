@@ -0,0 +1,324 @@
+# benchmarks/bench_booking.py
+"""Carga y corrección bajo contención de reservas, contra un servidor real.
+
+    python -m benchmarks.bench_booking --clients 300 --sessions 1 --capacity 20 --json hot.json
+    python -m benchmarks.bench_booking --clients 200 --sessions 200 --ops 10 --json spread.json
+    python -m benchmarks.bench_booking ... --compare hot.json     # diferencias con una ejecución anterior
+
+1. Crea una base de datos desechable (``gym_bench_<pid>``) en el servidor de
+   ``DATABASE_URL`` y le aplica ``frontend/data/ddl.sql``.
+2. Siembra usuarios (hash bcrypt calculado una vez) y sesiones sin solapes.
+3. Arranca ``uvicorn app.main:app`` contra esa BD y lanza N clientes
+   concurrentes: login, ``POST /reservations`` y, con probabilidad
+   ``--cancel-ratio``, ``PATCH /reservations/{id}/cancel``.
+4. Informa de throughput, p50/p95/p99 por endpoint, reintentos (503/429 con
+   Retry-After), errores 5xx y deadlocks (``pg_stat_database``), y comprueba
+   invariantes: sin sobreventa, contadores exactos, posiciones de espera
+   únicas y sin huecos, sin reservas solapadas del mismo usuario.
+
+Sale con código 1 si algún invariante falla.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+DDL_PATH = REPO_ROOT / "frontend" / "data" / "ddl.sql"
+PASSWORD = "bench-password"
+
+INVARIANT_SQL = {
+    "overbooked_sessions": """
+        SELECT count(*) FROM (
+          SELECT s.id FROM gym.sessions s JOIN gym.reservations r ON r.session_id = s.id AND r.status = 'booked'
+           GROUP BY s.id, s.capacity HAVING count(*) > s.capacity) x
+    """,
+    "counter_drift": """
+        SELECT count(*) FROM gym.sessions s
+         WHERE s.booked_count <> (SELECT count(*) FROM gym.reservations r WHERE r.session_id = s.id AND r.status = 'booked')
+            OR s.waitlist_count <> (SELECT count(*) FROM gym.waitlist_entries w WHERE w.session_id = s.id AND w.notified_at IS NULL)
+    """,
+    "duplicate_waitlist_positions": """
+        SELECT count(*) FROM (
+          SELECT session_id, position FROM gym.waitlist_entries WHERE notified_at IS NULL
+           GROUP BY session_id, position HAVING count(*) > 1) x
+    """,
+    "waitlist_gaps": """
+        SELECT count(*) FROM (
+          SELECT session_id FROM gym.waitlist_entries WHERE notified_at IS NULL
+           GROUP BY session_id HAVING max(position) <> count(*) OR min(position) <> 1) x
+    """,
+    "overlapping_bookings": """
+        SELECT count(*) FROM gym.reservations r1
+          JOIN gym.sessions s1 ON s1.id = r1.session_id
+          JOIN gym.reservations r2 ON r2.user_id = r1.user_id AND r2.id > r1.id AND r2.status = 'booked'
+          JOIN gym.sessions s2 ON s2.id = r2.session_id
+         WHERE r1.status = 'booked' AND tstzrange(s1.start_time, s1.end_time) && tstzrange(s2.start_time, s2.end_time)
+    """,
+}
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    # nearest-rank
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+# --- Base de datos desechable ---
+
+def provision(base_url, db_name):
+    admin = create_engine(base_url.set(database="postgres"), isolation_level="AUTOCOMMIT")
+    with admin.connect() as conn:
+        conn.execute(text(f'DROP DATABASE IF EXISTS "{db_name}"'))
+        conn.execute(text(f'CREATE DATABASE "{db_name}" ENCODING \'UTF8\' TEMPLATE template0'))
+    admin.dispose()
+    bench = create_engine(base_url.set(database=db_name))
+    raw = bench.raw_connection()
+    try:
+        # Cursor DBAPI sin parámetros: el DDL contiene '%' (RAISE) y bloques $$
+        with raw.cursor() as cur:
+            cur.execute(DDL_PATH.read_text())
+        raw.commit()
+    finally:
+        raw.close()
+    return bench
+
+def drop(base_url, db_name):
+    admin = create_engine(base_url.set(database="postgres"), isolation_level="AUTOCOMMIT")
+    with admin.connect() as conn:
+        conn.execute(text(f'DROP DATABASE IF EXISTS "{db_name}" WITH (FORCE)'))
+    admin.dispose()
+
+def seed(bench, users, sessions, capacity, bcrypt_rounds):
+    os.environ["BCRYPT_ROUNDS"] = str(bcrypt_rounds)
+    from app.hashing import pwd_context
+    password_hash = pwd_context.hash(PASSWORD)
+    emails = [f"bench-{i}@example.com" for i in range(users)]
+    with bench.begin() as conn:
+        conn.execute(
+            text("INSERT INTO gym.users (full_name, email, password_hash) VALUES (:name, :email, :hash)"),
+            [{"name": f"Bench {i}", "email": email, "hash": password_hash} for i, email in enumerate(emails)],
+        )
+        class_type_id = conn.execute(text(
+            "INSERT INTO gym.class_types (title, duration_minutes, price_cents) VALUES ('Bench', 60, 0) RETURNING id"
+        )).scalar_one()
+        session_ids = conn.execute(text("""
+            INSERT INTO gym.sessions (class_type_id, start_time, end_time, capacity)
+            SELECT :ct, date_trunc('hour', now()) + make_interval(days => 1, hours => i),
+                   date_trunc('hour', now()) + make_interval(days => 1, hours => i + 1), :cap
+              FROM generate_series(0, :n - 1) AS i
+            RETURNING id
+        """), {"ct": class_type_id, "cap": capacity, "n": sessions}).scalars().all()
+    return emails, [str(sid) for sid in session_ids]
+
+def deadlocks(bench):
+    with bench.connect() as conn:
+        return conn.execute(text("SELECT deadlocks FROM pg_stat_database WHERE datname = current_database()")).scalar_one()
+
+def check_invariants(bench):
+    with bench.connect() as conn:
+        result = {name: conn.execute(text(sql)).scalar_one() for name, sql in INVARIANT_SQL.items()}
+    result["ok"] = not any(result.values())
+    return result
+
+# --- Servidor ---
+
+def start_server(db_url, port, workers, bcrypt_rounds):
+    env = dict(os.environ, DATABASE_URL=db_url, BCRYPT_ROUNDS=str(bcrypt_rounds))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=REPO_ROOT, env=env,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"uvicorn terminó con código {proc.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code < 500:
+                return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("uvicorn no respondió en 60 s")
+
+# --- Carga ---
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.outcomes = defaultdict(int)
+        self.retries = 0
+
+    async def call(self, endpoint, send, max_retries):
+        for attempt in range(max_retries + 1):
+            start = time.perf_counter()
+            resp = await send()
+            self.latencies[endpoint].append(time.perf_counter() - start)
+            self.statuses[endpoint][resp.status_code] += 1
+            if resp.status_code not in (429, 503) or attempt == max_retries:
+                return resp
+            self.retries += 1
+            retry_after = float(resp.headers.get("Retry-After", "1"))
+            await asyncio.sleep(min(retry_after, 1.0) * random.uniform(0.5, 1.5))
+        return resp
+
+async def client_loop(client, rec, email, session_ids, args, rng):
+    resp = await rec.call("login", lambda: client.post("/auth/login", data={"username": email, "password": PASSWORD}), args.max_retries)
+    if resp.status_code != 200:
+        rec.outcomes["login_failed"] += 1
+        return
+    headers = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+    for _ in range(args.ops):
+        session_id = session_ids[0] if len(session_ids) == 1 else rng.choice(session_ids)
+        payload = {"session_id": session_id, "auto_waitlist": not args.no_waitlist}
+        resp = await rec.call("reserve", lambda: client.post("/reservations", json=payload, headers=headers), args.max_retries)
+        body = resp.json() if resp.headers.get("content-type", "").startswith("application/json") else {}
+        if resp.status_code == 200:
+            rec.outcomes[body.get("status", "ok")] += 1
+        else:
+            rec.outcomes[f"rejected_{resp.status_code}"] += 1
+        if resp.status_code == 200 and body.get("status") == "booked" and rng.random() < args.cancel_ratio:
+            url = f"/reservations/{body['reservation_id']}/cancel"
+            resp = await rec.call("cancel", lambda: client.patch(url, headers=headers), args.max_retries)
+            rec.outcomes["cancelled" if resp.status_code == 200 else f"cancel_failed_{resp.status_code}"] += 1
+
+async def drive(base_url, emails, session_ids, args):
+    rec = Recorder()
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            client_loop(client, rec, emails[i % len(emails)], session_ids, args, random.Random(args.seed + i))
+            for i in range(args.clients)
+        ))
+        elapsed = time.perf_counter() - start
+    return rec, elapsed
+
+def summarize(rec, elapsed):
+    endpoints = {}
+    total = 0
+    for endpoint, values in rec.latencies.items():
+        values.sort()
+        total += len(values)
+        endpoints[endpoint] = {
+            "count": len(values),
+            "p50_ms": round(1000 * percentile(values, 50), 2),
+            "p95_ms": round(1000 * percentile(values, 95), 2),
+            "p99_ms": round(1000 * percentile(values, 99), 2),
+            "max_ms": round(1000 * values[-1], 2),
+            "status": {str(code): n for code, n in sorted(rec.statuses[endpoint].items())},
+        }
+    server_errors = sum(n for codes in rec.statuses.values() for code, n in codes.items() if code >= 500 and code != 503)
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 1) if elapsed else 0.0,
+        "endpoints": endpoints,
+        "outcomes": dict(rec.outcomes),
+        "retries": rec.retries,
+        "server_errors": server_errors,
+    }
+
+def compare(current, baseline):
+    def pct(new, old):
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+    print(f"\nvs {baseline.get('version', {}).get('git')} ({baseline.get('version', {}).get('timestamp')})")
+    print(f"  throughput {current['throughput_rps']} rps ({pct(current['throughput_rps'], baseline['throughput_rps'])})")
+    for endpoint, stats in current["endpoints"].items():
+        old = baseline["endpoints"].get(endpoint)
+        if old:
+            print(f"  {endpoint:<8} p95 {stats['p95_ms']} ms ({pct(stats['p95_ms'], old['p95_ms'])})  "
+                  f"p99 {stats['p99_ms']} ms ({pct(stats['p99_ms'], old['p99_ms'])})")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_booking")
+    parser.add_argument("--clients", type=int, default=200, help="Clientes concurrentes")
+    parser.add_argument("--users", type=int, help="Usuarios sembrados (por defecto = clients)")
+    parser.add_argument("--sessions", type=int, default=1, help="1 = una sesión caliente; N = carga repartida")
+    parser.add_argument("--capacity", type=int, default=20)
+    parser.add_argument("--ops", type=int, default=3, help="Intentos de reserva por cliente")
+    parser.add_argument("--cancel-ratio", type=float, default=0.3)
+    parser.add_argument("--no-waitlist", action="store_true", help="Reservar con auto_waitlist=false")
+    parser.add_argument("--workers", type=int, default=1, help="Procesos uvicorn")
+    parser.add_argument("--bcrypt-rounds", type=int, default=4, help="Bajo por defecto: se mide la reserva, no el hash")
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"), help="Servidor donde crear la BD desechable")
+    parser.add_argument("--keep", action="store_true", help="No borrar la BD al terminar")
+    parser.add_argument("--json", help="Guardar resultados en este fichero")
+    parser.add_argument("--compare", help="JSON de una ejecución anterior")
+    args = parser.parse_args(argv)
+    if not args.database_url:
+        parser.error("DATABASE_URL o --database-url es obligatorio")
+
+    base_url = make_url(args.database_url)
+    db_name = f"gym_bench_{os.getpid()}"
+    bench = server = None
+    try:
+        bench = provision(base_url, db_name)
+        emails, session_ids = seed(bench, args.users or args.clients, args.sessions, args.capacity, args.bcrypt_rounds)
+        port = _free_port()
+        server = start_server(base_url.set(database=db_name).render_as_string(hide_password=False), port, args.workers, args.bcrypt_rounds)
+        deadlocks_before = deadlocks(bench)
+        rec, elapsed = asyncio.run(drive(f"http://127.0.0.1:{port}", emails, session_ids, args))
+        result = summarize(rec, elapsed)
+        result["deadlocks"] = deadlocks(bench) - deadlocks_before
+        result["invariants"] = check_invariants(bench)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        if bench is not None:
+            bench.dispose()
+        if not args.keep:
+            drop(base_url, db_name)
+
+    config = {k: v for k, v in vars(args).items() if k not in ("database_url", "json", "compare", "keep")}
+    report = {
+        "version": {"git": _git_revision(), "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds")},
+        "config": config,
+        **result,
+    }
+    for endpoint, stats in result["endpoints"].items():
+        print(f"{endpoint:<8} n={stats['count']:<6} p50={stats['p50_ms']} ms  p95={stats['p95_ms']} ms  "
+              f"p99={stats['p99_ms']} ms  status={stats['status']}")
+    print(f"throughput={result['throughput_rps']} rps  retries={result['retries']}  "
+          f"5xx={result['server_errors']}  deadlocks={result['deadlocks']}  outcomes={result['outcomes']}")
+    print(f"invariants: {result['invariants']}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0 if result["invariants"]["ok"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+# benchmarks/bench_hashing.py
+"""Throughput de login (bcrypt verify) frente a número de procesos del pool.
+
+    python -m benchmarks.bench_hashing --logins 200 --rounds 12 [--json out.json]
+
+Mide lo mismo que hace /auth/login vía app.hashing: verify_and_update en un
+ProcessPoolExecutor (spawn) con N workers, para N = 1 .. nº de CPUs.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+os.environ.setdefault("BCRYPT_ROUNDS", "12")
+
+def _warmup(_):
+    from app import hashing
+    return hashing.pwd_context.hash("warmup")
+
+def run(logins: int, workers: int, hashed: str):
+    from app import hashing
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        # Arrancar los procesos fuera de la medición
+        list(pool.map(_warmup, range(workers)))
+        start = time.perf_counter()
+        results = list(pool.map(hashing._verify_and_update, ["secret"] * logins, [hashed] * logins, chunksize=1))
+        elapsed = time.perf_counter() - start
+    assert all(ok for ok, _ in results)
+    return {"workers": workers, "logins": logins, "seconds": round(elapsed, 3), "logins_per_sec": round(logins / elapsed, 1)}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=int(os.environ["BCRYPT_ROUNDS"]))
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--json", help="Guardar resultados en este fichero")
+    args = parser.parse_args()
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+
+    from app import hashing
+    hashed = hashing.pwd_context.hash("secret")
+    counts = sorted({2 ** i for i in range(args.max_workers.bit_length()) if 2 ** i <= args.max_workers} | {args.max_workers})
+    rows = []
+    for workers in counts:
+        row = run(args.logins, workers, hashed)
+        rows.append(row)
+        print(f"workers={row['workers']:>3}  {row['logins_per_sec']:>8} logins/s  ({row['seconds']} s)")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"rounds": args.rounds, "cpu_count": os.cpu_count(), "results": rows}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# benchmarks/bench_slots.py
+"""Búsqueda de huecos de entrenadores: índice en memoria frente a recálculo por consulta.
+
+    python -m benchmarks.bench_slots --trainers 300 --days 92 --queries 2000 [--json out.json]
+
+Sin BD: genera ``--trainers`` entrenadores con disponibilidad semanal (RRULE)
+y ``--sessions-per-day`` sesiones por día laborable durante ``--days`` días, y
+mide con el mismo código que GET /trainers/slots (app.slots):
+
+1. construcción completa del índice (``build_calendars``, expandiendo RRULEs);
+2. recarga incremental de un entrenador (lo que provoca un NOTIFY trainer_calendar);
+3. consultas "especialidad X, 60 min, una tarde" desde el índice (``find_slots``);
+4. las mismas consultas recalculando los calendarios de los candidatos en cada
+   una (lo que haría una búsqueda por entrenador sin índice, sin contar la BD).
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+from app.slots import build_calendars, specialty_index, find_slots
+
+SPECIALTIES = ["yoga", "pilates", "fuerza", "crossfit", "boxeo", "spinning", "movilidad", "running"]
+WEEKLY = ["MO,WE,FR", "TU,TH", "MO,TU,WE,TH,FR", "SA,SU", "MO,TH,SA"]
+
+def generate(trainers: int, days: int, sessions_per_day: int, seed: int):
+    rng = random.Random(seed)
+    start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    trainer_rows, availability, sessions = [], [], []
+    for n in range(trainers):
+        trainer_id = uuid4()
+        trainer_rows.append((trainer_id, f"Entrenador {n}", rng.sample(SPECIALTIES, rng.randint(1, 3))))
+        # Mañana y tarde en días distintos, turnos de 4-6 h
+        for first_hour in (8, 15):
+            dtstart = start + timedelta(hours=first_hour + rng.choice((0, 1)))
+            rule = f"FREQ=WEEKLY;BYDAY={rng.choice(WEEKLY)}"
+            availability.append((trainer_id, dtstart, dtstart + timedelta(hours=rng.randint(4, 6)), rule))
+        for day in range(days):
+            for _ in range(rng.randint(0, sessions_per_day)):
+                s = start + timedelta(days=day, hours=rng.randint(8, 20), minutes=rng.choice((0, 30)))
+                sessions.append((trainer_id, s, s + timedelta(minutes=rng.choice((45, 60, 90)))))
+    return start, trainer_rows, availability, sessions
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trainers", type=int, default=300)
+    parser.add_argument("--days", type=int, default=92)
+    parser.add_argument("--sessions-per-day", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="Guardar resultados en este fichero")
+    args = parser.parse_args()
+
+    start, trainers, availability, sessions = generate(args.trainers, args.days, args.sessions_per_day, args.seed)
+    horizon = (start, start + timedelta(days=args.days))
+    print(f"{len(trainers)} entrenadores, {len(availability)} reglas de disponibilidad, {len(sessions)} sesiones, {args.days} días")
+
+    t = time.perf_counter()
+    calendars = build_calendars(trainers, availability, sessions, *horizon)
+    by_specialty = specialty_index(calendars)
+    build_ms = (time.perf_counter() - t) * 1000
+    print(f"índice completo: {build_ms:.1f} ms, {sum(len(c.free) for c in calendars.values())} intervalos libres")
+
+    rng = random.Random(args.seed)
+    sample = [row[0] for row in rng.sample(trainers, min(50, len(trainers)))]
+    rows_by_trainer = {}
+    for row in availability:
+        rows_by_trainer.setdefault(row[0], ([], []))[0].append(row)
+    for row in sessions:
+        rows_by_trainer.setdefault(row[0], ([], []))[1].append(row)
+    incremental = []
+    for trainer_id in sample:
+        t = time.perf_counter()
+        own_availability, own_sessions = rows_by_trainer.get(trainer_id, ([], []))
+        build_calendars([r for r in trainers if r[0] == trainer_id], own_availability, own_sessions, *horizon)
+        incremental.append((time.perf_counter() - t) * 1000)
+    print(f"recarga incremental de un entrenador: p50={statistics.median(incremental):.2f} ms")
+
+    queries = []
+    for _ in range(args.queries):
+        day = start + timedelta(days=rng.randrange(1, args.days - 1))
+        queries.append((rng.choice(SPECIALTIES), day + timedelta(hours=14), day + timedelta(hours=19)))
+    duration, step = timedelta(minutes=60), timedelta(minutes=30)
+
+    def measure(search):
+        times, found = [], 0
+        for specialty, w_start, w_end in queries:
+            t = time.perf_counter()
+            found += len(search(specialty, w_start, w_end))
+            times.append((time.perf_counter() - t) * 1000)
+        return times, found
+
+    indexed, found_indexed = measure(lambda sp, ws, we: find_slots(calendars, by_specialty, ws, we, duration, step, sp, None, args.limit))
+
+    def naive(sp, ws, we):
+        candidates = [row for row in trainers if sp in row[2]]
+        rebuilt = {}
+        for row in candidates:
+            own_availability, own_sessions = rows_by_trainer.get(row[0], ([], []))
+            rebuilt.update(build_calendars([row], own_availability, own_sessions, ws, we))
+        return find_slots(rebuilt, specialty_index(rebuilt), ws, we, duration, step, sp, None, args.limit)
+
+    naive_times, found_naive = measure(naive)
+    assert found_indexed == found_naive, (found_indexed, found_naive)
+
+    rows = []
+    for name, times in (("índice", indexed), ("recálculo", naive_times)):
+        row = {
+            "mode": name,
+            "queries": len(times),
+            "p50_ms": round(statistics.median(times), 3),
+            "p95_ms": round(percentile(times, 0.95), 3),
+            "p99_ms": round(percentile(times, 0.99), 3),
+        }
+        rows.append(row)
+        print(f"{name:>10}: p50={row['p50_ms']:.3f} ms  p95={row['p95_ms']:.3f} ms  p99={row['p99_ms']:.3f} ms")
+    print(f"huecos devueltos: {found_indexed} (idénticos en ambos modos)")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "trainers": args.trainers, "days": args.days, "sessions": len(sessions),
+                "build_ms": round(build_ms, 1), "incremental_p50_ms": round(statistics.median(incremental), 3),
+                "results": rows,
+            }, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,8 @@
 -- 1) DDL para Postgres (ejecutar en tu BD)
 -- Recomendación: crear un schema, p.ej. "gym"
 CREATE SCHEMA IF NOT EXISTS gym;
+-- GiST on uuid (= operator) for the per-user overlap exclusion constraint
+CREATE EXTENSION IF NOT EXISTS btree_gist;
 
 -- ENUM types
 CREATE TYPE gym.user_role AS ENUM ('member','trainer','admin');
@@ -73,20 +75,31 @@ CREATE TABLE gym.sessions (
   start_time TIMESTAMPTZ NOT NULL,
   end_time TIMESTAMPTZ NOT NULL,
   capacity INT NOT NULL DEFAULT 20, -- relevant for group classes
+  booked_count INT NOT NULL DEFAULT 0, -- maintained by trg_count_session_booked
+  waitlist_count INT NOT NULL DEFAULT 0, -- maintained by trg_count_session_waitlist
+  period TSTZRANGE GENERATED ALWAYS AS (tstzrange(start_time, end_time)) STORED,
   status gym.session_status NOT NULL DEFAULT 'scheduled',
   created_at TIMESTAMPTZ DEFAULT now(),
   updated_at TIMESTAMPTZ DEFAULT now(),
-  CHECK (end_time > start_time)
+  CHECK (end_time > start_time),
+  CONSTRAINT ck_session_counters CHECK (booked_count >= 0 AND waitlist_count >= 0)
 );
 
 -- Index to speed up queries by date range
 CREATE INDEX idx_sessions_time ON gym.sessions USING BRIN (start_time);
+-- Keyset pagination for GET /sessions: ORDER BY (start_time, id), optionally filtered by one FK
+CREATE INDEX idx_sessions_start_id ON gym.sessions (start_time, id);
+CREATE INDEX idx_sessions_location_start ON gym.sessions (location_id, start_time, id);
+CREATE INDEX idx_sessions_class_type_start ON gym.sessions (class_type_id, start_time, id);
+CREATE INDEX idx_sessions_trainer_start ON gym.sessions (trainer_id, start_time, id);
+CREATE INDEX idx_sessions_scheduled_start ON gym.sessions (start_time, id) WHERE status = 'scheduled';
+-- Range queries on the stored period (&&, @>)
+CREATE INDEX idx_sessions_period ON gym.sessions USING GIST (period);
 
 -- Payments
 CREATE TABLE gym.payments (
   id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
   user_id UUID REFERENCES gym.users(id),
-  reservation_id UUID REFERENCES gym.reservations(id), -- created below as FK; circular ref avoided by nullable here
   amount_cents INT NOT NULL,
   currency TEXT NOT NULL DEFAULT 'USD',
   provider TEXT,
@@ -117,7 +130,7 @@ CREATE TABLE gym.waitlist_entries (
   id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
   session_id UUID NOT NULL REFERENCES gym.sessions(id) ON DELETE CASCADE,
   user_id UUID NOT NULL REFERENCES gym.users(id) ON DELETE CASCADE,
-  position INT NOT NULL, -- smaller = higher priority
+  position INT NOT NULL, -- 1..n while waiting (gap-free), 0 once promoted
   notified_at TIMESTAMPTZ,
   created_at TIMESTAMPTZ DEFAULT now(),
   UNIQUE (session_id, user_id)
@@ -125,6 +138,17 @@ CREATE TABLE gym.waitlist_entries (
 
 CREATE INDEX idx_waitlist_session_pos ON gym.waitlist_entries (session_id, position);
 
+-- Intervals held by 'booked' reservations (maintained by trg_sync_user_booked_intervals).
+-- The exclusion constraint is the no-overlap rule: one GiST index probe per booking.
+CREATE TABLE gym.user_booked_intervals (
+  reservation_id UUID PRIMARY KEY REFERENCES gym.reservations(id) ON DELETE CASCADE,
+  user_id UUID NOT NULL REFERENCES gym.users(id) ON DELETE CASCADE,
+  session_id UUID NOT NULL REFERENCES gym.sessions(id) ON DELETE CASCADE,
+  period TSTZRANGE NOT NULL,
+  CONSTRAINT ex_user_booked_intervals_overlap EXCLUDE USING GIST (user_id WITH =, period WITH &&)
+);
+CREATE INDEX idx_user_booked_intervals_session ON gym.user_booked_intervals (session_id);
+
 -- Availability for trainers (for 1:1 sessions)
 CREATE TABLE gym.trainer_availability (
   id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -147,81 +171,353 @@ CREATE TABLE gym.audit_logs (
   created_at TIMESTAMPTZ DEFAULT now()
 );
 
+-- Consumo de la cuota del plan: plazas ocupadas (booked/attended/no_show) por usuario y mes de la
+-- sesión (lo mantiene trg_sync_user_monthly_usage, ver app/quota.py)
+CREATE TABLE gym.user_monthly_usage (
+  user_id UUID NOT NULL REFERENCES gym.users(id) ON DELETE CASCADE,
+  month DATE NOT NULL, -- gym.quota_month(sessions.start_time)
+  booked INT NOT NULL DEFAULT 0 CONSTRAINT ck_user_monthly_usage_booked CHECK (booked >= 0),
+  PRIMARY KEY (user_id, month)
+);
+
+-- Reporting (app/reporting.py): change log of sessions whose daily rollup is stale.
+-- Append-only (no unique key) so booking transactions never wait on each other here.
+CREATE TABLE gym.report_changes (
+  id BIGSERIAL PRIMARY KEY,
+  session_id UUID NOT NULL,
+  start_time TIMESTAMPTZ NOT NULL, -- day(s) to recompute
+  created_at TIMESTAMPTZ DEFAULT now()
+);
+
+-- Daily rollup per (day, class type, trainer, location); rebuilt per day from report_changes
+CREATE TABLE gym.report_daily_occupancy (
+  id BIGSERIAL PRIMARY KEY,
+  day DATE NOT NULL,
+  class_type_id UUID NOT NULL,
+  trainer_id UUID,
+  location_id UUID,
+  currency TEXT NOT NULL,
+  sessions INT NOT NULL,
+  sessions_cancelled INT NOT NULL,
+  capacity INT NOT NULL,
+  booked INT NOT NULL,
+  attended INT NOT NULL,
+  no_show INT NOT NULL,
+  cancelled INT NOT NULL,
+  list_revenue_cents BIGINT NOT NULL, -- class_types.price_cents x seats taken
+  paid_revenue_cents BIGINT NOT NULL, -- succeeded payments linked to the session's reservations
+  refreshed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX idx_report_daily_occupancy_day ON gym.report_daily_occupancy (day);
+
+-- Idempotency-Key of booking/cancel requests (app/idempotency.py): claimed before any
+-- session lock, then holds the stored response (status_code NULL = in progress)
+CREATE TABLE gym.idempotency_keys (
+  user_id UUID NOT NULL REFERENCES gym.users(id) ON DELETE CASCADE,
+  key TEXT NOT NULL,
+  request_hash TEXT NOT NULL,
+  status_code INT,
+  response JSONB,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  expires_at TIMESTAMPTZ NOT NULL,
+  PRIMARY KEY (user_id, key)
+);
+CREATE INDEX idx_idempotency_keys_expires ON gym.idempotency_keys (expires_at);
+
 -- FUNCTIONS / TRIGGERS for integrity & overbooking prevention
--- 1) Before insert reservation: check capacity and overlapping bookings for user
+-- 1) Before a reservation becomes 'booked': check capacity.
+--    Overlapping bookings are rejected by ex_user_booked_intervals_overlap (see 4).
 CREATE OR REPLACE FUNCTION gym.check_reservation_constraints() RETURNS TRIGGER AS $$
 DECLARE
   current_bookings INT;
   sess_capacity INT;
-  overlap_count INT;
-  sess_start TIMESTAMPTZ;
-  sess_end TIMESTAMPTZ;
 BEGIN
-  -- get session times & capacity
-  SELECT start_time, end_time, capacity INTO sess_start, sess_end, sess_capacity
-    FROM gym.sessions WHERE id = NEW.session_id FOR SHARE;
+  IF NEW.status <> 'booked' OR (TG_OP = 'UPDATE' AND OLD.status = 'booked' AND OLD.session_id = NEW.session_id) THEN
+    RETURN NEW;
+  END IF;
+
+  -- FOR UPDATE because trg_count_session_booked updates this same row afterwards
+  -- (FOR SHARE -> UPDATE would deadlock concurrent inserts)
+  SELECT capacity, booked_count INTO sess_capacity, current_bookings
+    FROM gym.sessions WHERE id = NEW.session_id FOR UPDATE;
 
   IF NOT FOUND THEN
     RAISE EXCEPTION 'Session % not found', NEW.session_id;
   END IF;
 
-  -- count active bookings for that session
-  SELECT COUNT(*) INTO current_bookings
-    FROM gym.reservations
-    WHERE session_id = NEW.session_id AND status = 'booked';
-
+  -- booked_count is a maintained counter: O(1) instead of COUNT(*) over reservations
   IF current_bookings >= sess_capacity THEN
     RAISE EXCEPTION 'Session is full';
   END IF;
 
-  -- prevent a user from booking overlapping sessions
-  SELECT COUNT(*) INTO overlap_count
-    FROM gym.reservations r
-    JOIN gym.sessions s ON r.session_id = s.id
-    WHERE r.user_id = NEW.user_id
-      AND r.status = 'booked'
-      AND tstzrange(s.start_time, s.end_time) && tstzrange(sess_start, sess_end);
-
-  IF overlap_count > 0 THEN
-    RAISE EXCEPTION 'User has another booking that overlaps this session';
-  END IF;
-
   RETURN NEW;
 END;
 $$ LANGUAGE plpgsql;
 
 CREATE TRIGGER trg_check_reservation_constraints
-  BEFORE INSERT ON gym.reservations
+  BEFORE INSERT OR UPDATE OF status, session_id ON gym.reservations
   FOR EACH ROW EXECUTE FUNCTION gym.check_reservation_constraints();
 
--- 2) On reservation cancellation: auto-promote waitlist (simplified)
-CREATE OR REPLACE FUNCTION gym.on_reservation_cancel_promote_waitlist() RETURNS TRIGGER AS $$
+-- 2) Maintain gym.sessions.booked_count / waitlist_count
+CREATE OR REPLACE FUNCTION gym.sync_session_booked_count() RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'UPDATE' THEN
+    IF OLD.status = NEW.status AND OLD.session_id = NEW.session_id THEN
+      RETURN NULL;
+    END IF;
+  END IF;
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    IF OLD.status = 'booked' THEN
+      UPDATE gym.sessions SET booked_count = booked_count - 1 WHERE id = OLD.session_id;
+    END IF;
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    IF NEW.status = 'booked' THEN
+      UPDATE gym.sessions SET booked_count = booked_count + 1 WHERE id = NEW.session_id;
+    END IF;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_count_session_booked
+  AFTER INSERT OR UPDATE OF status, session_id OR DELETE ON gym.reservations
+  FOR EACH ROW EXECUTE FUNCTION gym.sync_session_booked_count();
+
+CREATE OR REPLACE FUNCTION gym.sync_session_waitlist_count() RETURNS TRIGGER AS $$
+BEGIN
+  -- only entries still waiting (notified_at IS NULL) count; promoted ones stay for the notification hand-off
+  IF TG_OP = 'UPDATE' THEN
+    IF (OLD.notified_at IS NULL) = (NEW.notified_at IS NULL) AND OLD.session_id = NEW.session_id THEN
+      RETURN NULL;
+    END IF;
+  END IF;
+  IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.notified_at IS NULL THEN
+    UPDATE gym.sessions SET waitlist_count = waitlist_count - 1 WHERE id = OLD.session_id;
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.notified_at IS NULL THEN
+    UPDATE gym.sessions SET waitlist_count = waitlist_count + 1 WHERE id = NEW.session_id;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_count_session_waitlist
+  AFTER INSERT OR UPDATE OF notified_at, session_id OR DELETE ON gym.waitlist_entries
+  FOR EACH ROW EXECUTE FUNCTION gym.sync_session_waitlist_count();
+
+-- 3) Waitlist promotion lives in the application (app/waitlist.py): it fills every
+--    free seat in one pass, stamps notified_at and keeps positions gap-free.
+
+-- 4) Maintain gym.user_booked_intervals; an overlapping booking fails with
+--    exclusion_violation (SQLSTATE 23P01) on ex_user_booked_intervals_overlap
+CREATE OR REPLACE FUNCTION gym.sync_user_booked_intervals() RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'UPDATE' THEN
+    IF OLD.status = NEW.status AND OLD.session_id = NEW.session_id THEN
+      RETURN NULL;
+    END IF;
+    IF OLD.status = 'booked' THEN
+      DELETE FROM gym.user_booked_intervals WHERE reservation_id = OLD.id;
+    END IF;
+  END IF;
+  IF NEW.status = 'booked' THEN
+    INSERT INTO gym.user_booked_intervals (reservation_id, user_id, session_id, period)
+      SELECT NEW.id, NEW.user_id, s.id, s.period FROM gym.sessions s WHERE s.id = NEW.session_id;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_sync_user_booked_intervals
+  AFTER INSERT OR UPDATE OF status, session_id ON gym.reservations
+  FOR EACH ROW EXECUTE FUNCTION gym.sync_user_booked_intervals();
+
+-- Rescheduling a session moves its members' intervals (and re-checks overlaps)
+CREATE OR REPLACE FUNCTION gym.sync_session_period_intervals() RETURNS TRIGGER AS $$
+BEGIN
+  UPDATE gym.user_booked_intervals SET period = NEW.period WHERE session_id = NEW.id;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_sync_session_period_intervals
+  AFTER UPDATE OF start_time, end_time ON gym.sessions
+  FOR EACH ROW WHEN (OLD.period IS DISTINCT FROM NEW.period)
+  EXECUTE FUNCTION gym.sync_session_period_intervals();
+
+-- 5) Log report changes: one appended row per write that can alter a day's rollup
+CREATE OR REPLACE FUNCTION gym.log_report_change_session() RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP <> 'DELETE' THEN
+    INSERT INTO gym.report_changes (session_id, start_time) VALUES (NEW.id, NEW.start_time);
+  END IF;
+  IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND OLD.start_time <> NEW.start_time) THEN
+    INSERT INTO gym.report_changes (session_id, start_time) VALUES (OLD.id, OLD.start_time);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- booked_count/waitlist_count are not in the column list: counter updates do not log
+CREATE TRIGGER trg_log_report_change_session
+  AFTER INSERT OR UPDATE OF start_time, capacity, status, class_type_id, trainer_id, location_id OR DELETE ON gym.sessions
+  FOR EACH ROW EXECUTE FUNCTION gym.log_report_change_session();
+
+CREATE OR REPLACE FUNCTION gym.log_report_change_reservation() RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP <> 'DELETE' THEN
+    INSERT INTO gym.report_changes (session_id, start_time)
+      SELECT id, start_time FROM gym.sessions WHERE id = NEW.session_id;
+  END IF;
+  IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND OLD.session_id <> NEW.session_id) THEN
+    INSERT INTO gym.report_changes (session_id, start_time)
+      SELECT id, start_time FROM gym.sessions WHERE id = OLD.session_id;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_log_report_change_reservation
+  AFTER INSERT OR UPDATE OF status, session_id OR DELETE ON gym.reservations
+  FOR EACH ROW EXECUTE FUNCTION gym.log_report_change_reservation();
+
+CREATE OR REPLACE FUNCTION gym.log_report_change_payment() RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP <> 'DELETE' AND NEW.reservation_id IS NOT NULL THEN
+    INSERT INTO gym.report_changes (session_id, start_time)
+      SELECT s.id, s.start_time FROM gym.reservations r JOIN gym.sessions s ON s.id = r.session_id WHERE r.id = NEW.reservation_id;
+  END IF;
+  IF TG_OP <> 'INSERT' AND OLD.reservation_id IS NOT NULL AND OLD.reservation_id IS DISTINCT FROM NEW.reservation_id THEN
+    INSERT INTO gym.report_changes (session_id, start_time)
+      SELECT s.id, s.start_time FROM gym.reservations r JOIN gym.sessions s ON s.id = r.session_id WHERE r.id = OLD.reservation_id;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_log_report_change_payment
+  AFTER INSERT OR UPDATE OF status, amount_cents, reservation_id OR DELETE ON gym.payments
+  FOR EACH ROW EXECUTE FUNCTION gym.log_report_change_payment();
+
+-- 6) Cuota del plan: contador de consumo por (usuario, mes) contra plans.max_monthly_bookings.
+--    Pasarse del límite lanza SQLSTATE 23Q01 (la app lo traduce a un 400).
+--    Los meses de cuota son meses naturales en UTC; si cambia, aquí y en la migración a la vez.
+CREATE OR REPLACE FUNCTION gym.quota_month(ts TIMESTAMPTZ) RETURNS DATE AS $$
+  SELECT date_trunc('month', ts AT TIME ZONE 'UTC')::date
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION gym.sync_user_monthly_usage() RETURNS TRIGGER AS $$
 DECLARE
-  next_waitlist RECORD;
+  old_counts BOOLEAN := TG_OP <> 'INSERT' AND OLD.status IN ('booked', 'attended', 'no_show');
+  new_counts BOOLEAN := TG_OP <> 'DELETE' AND NEW.status IN ('booked', 'attended', 'no_show');
+  used INT;
+  quota INT;
 BEGIN
-  IF (TG_OP = 'UPDATE' AND NEW.status = 'cancelled' AND OLD.status <> 'cancelled') THEN
-    -- find first waitlist entry for this session by position
-    SELECT * INTO next_waitlist FROM gym.waitlist_entries
-      WHERE session_id = OLD.session_id
-      ORDER BY position ASC, created_at ASC LIMIT 1;
-
-    IF FOUND THEN
-      -- create reservation for that user (can raise if constraints fail; consider wrapping in transaction in app)
-      INSERT INTO gym.reservations (session_id, user_id, status, created_at)
-        VALUES (OLD.session_id, next_waitlist.user_id, 'booked', now());
-      -- remove promoted waitlist entry
-      DELETE FROM gym.waitlist_entries WHERE id = next_waitlist.id;
-      -- Note: Ideally notify the user via app-level job
+  IF TG_OP = 'UPDATE' AND old_counts = new_counts AND OLD.session_id = NEW.session_id THEN
+    RETURN NULL;
+  END IF;
+  -- Lock compartido por usuario: las reservas no se esperan entre sí; reconcile-usage lo toma en exclusiva
+  PERFORM pg_advisory_xact_lock_shared(7301, hashtext(COALESCE(NEW.user_id, OLD.user_id)::text));
+  IF old_counts THEN
+    UPDATE gym.user_monthly_usage SET booked = booked - 1
+     WHERE user_id = OLD.user_id
+       AND month = (SELECT gym.quota_month(start_time) FROM gym.sessions WHERE id = OLD.session_id);
+  END IF;
+  IF new_counts THEN
+    INSERT INTO gym.user_monthly_usage AS u (user_id, month, booked)
+      SELECT NEW.user_id, gym.quota_month(s.start_time), 1 FROM gym.sessions s WHERE s.id = NEW.session_id
+    ON CONFLICT (user_id, month) DO UPDATE SET booked = u.booked + 1
+    RETURNING booked INTO used;
+    SELECT p.max_monthly_bookings INTO quota
+      FROM gym.users usr JOIN gym.plans p ON p.id = usr.plan_id WHERE usr.id = NEW.user_id;
+    IF quota IS NOT NULL AND used > quota THEN
+      RAISE EXCEPTION 'Monthly booking quota exceeded (% of %)', used, quota USING ERRCODE = '23Q01';
     END IF;
   END IF;
-  RETURN NEW;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_sync_user_monthly_usage
+  AFTER INSERT OR UPDATE OF status, session_id OR DELETE ON gym.reservations
+  FOR EACH ROW EXECUTE FUNCTION gym.sync_user_monthly_usage();
+
+-- Mover una sesión a otro mes traslada sus plazas (sin comprobar cuota: es una acción de admin)
+CREATE OR REPLACE FUNCTION gym.move_session_monthly_usage() RETURNS TRIGGER AS $$
+BEGIN
+  UPDATE gym.user_monthly_usage u SET booked = u.booked - 1
+    FROM gym.reservations r
+   WHERE r.session_id = NEW.id AND r.status IN ('booked', 'attended', 'no_show')
+     AND u.user_id = r.user_id AND u.month = gym.quota_month(OLD.start_time);
+  INSERT INTO gym.user_monthly_usage AS u (user_id, month, booked)
+    SELECT r.user_id, gym.quota_month(NEW.start_time), 1
+      FROM gym.reservations r
+     WHERE r.session_id = NEW.id AND r.status IN ('booked', 'attended', 'no_show')
+  ON CONFLICT (user_id, month) DO UPDATE SET booked = u.booked + 1;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_move_session_monthly_usage
+  AFTER UPDATE OF start_time ON gym.sessions
+  FOR EACH ROW WHEN (gym.quota_month(OLD.start_time) <> gym.quota_month(NEW.start_time))
+  EXECUTE FUNCTION gym.move_session_monthly_usage();
+
+-- 7) Push seat counts to app/live.py (LISTEN session_seats -> SSE). Delivered on commit,
+--    in commit order; the app coalesces bursts per session.
+CREATE OR REPLACE FUNCTION gym.notify_session_seats() RETURNS TRIGGER AS $$
+BEGIN
+  PERFORM pg_notify('session_seats', json_build_object(
+    'id', NEW.id, 'capacity', NEW.capacity, 'booked_count', NEW.booked_count,
+    'waitlist_count', NEW.waitlist_count, 'status', NEW.status
+  )::text);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_notify_session_seats
+  AFTER UPDATE OF booked_count, waitlist_count, capacity, status ON gym.sessions
+  FOR EACH ROW WHEN ((OLD.booked_count, OLD.waitlist_count, OLD.capacity, OLD.status)
+                     IS DISTINCT FROM (NEW.booked_count, NEW.waitlist_count, NEW.capacity, NEW.status))
+  EXECUTE FUNCTION gym.notify_session_seats();
+
+-- 8) Invalidate the trainer free-slot index of app/slots.py: NOTIFY trainer_calendar with the
+--    trainer id (TG_ARGV[0] = column holding it). Identical payloads in one transaction are
+--    delivered once, so a bulk schedule generation sends one per trainer. Changes to the
+--    trainer's user (name, is_active) wait for SLOT_INDEX_MAX_AGE_SECONDS.
+CREATE OR REPLACE FUNCTION gym.notify_trainer_calendar() RETURNS TRIGGER AS $$
+DECLARE
+  old_id TEXT;
+  new_id TEXT;
+BEGIN
+  IF TG_OP <> 'INSERT' THEN
+    old_id := to_jsonb(OLD) ->> TG_ARGV[0];
+  END IF;
+  IF TG_OP <> 'DELETE' THEN
+    new_id := to_jsonb(NEW) ->> TG_ARGV[0];
+  END IF;
+  IF old_id IS NOT NULL THEN
+    PERFORM pg_notify('trainer_calendar', old_id);
+  END IF;
+  IF new_id IS NOT NULL AND new_id IS DISTINCT FROM old_id THEN
+    PERFORM pg_notify('trainer_calendar', new_id);
+  END IF;
+  RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
-CREATE TRIGGER trg_on_cancel_promote_waitlist
-  AFTER UPDATE ON gym.reservations
-  FOR EACH ROW EXECUTE FUNCTION gym.on_reservation_cancel_promote_waitlist();
+CREATE TRIGGER trg_notify_trainer_calendar_session
+  AFTER INSERT OR DELETE OR UPDATE OF trainer_id, start_time, end_time, status ON gym.sessions
+  FOR EACH ROW EXECUTE FUNCTION gym.notify_trainer_calendar('trainer_id');
+CREATE TRIGGER trg_notify_trainer_calendar_availability
+  AFTER INSERT OR DELETE OR UPDATE ON gym.trainer_availability
+  FOR EACH ROW EXECUTE FUNCTION gym.notify_trainer_calendar('trainer_id');
+CREATE TRIGGER trg_notify_trainer_calendar_trainer
+  AFTER INSERT OR DELETE OR UPDATE OF user_id, specialties ON gym.trainers
+  FOR EACH ROW EXECUTE FUNCTION gym.notify_trainer_calendar('id');
 
 -- Helpful indexes
 CREATE INDEX idx_reservations_user ON gym.reservations (user_id);
 CREATE INDEX idx_reservations_session ON gym.reservations (session_id);
+CREATE INDEX idx_payments_reservation ON gym.payments (reservation_id);
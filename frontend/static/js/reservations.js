@@ -3,8 +3,9 @@ document.addEventListener('DOMContentLoaded', async () => {
   loadHeader();
   const container = document.getElementById('my-reservations');
   try {
-    const rows = await apiFetch('/me/reservations');
-    if (!rows || !rows.length) { container.textContent = 'No tienes reservas.'; return; }
+    const page = await apiFetch('/me/reservations');
+    const rows = page ? page.items : [];
+    if (!rows.length) { container.textContent = 'No tienes reservas.'; return; }
     container.innerHTML = '';
     rows.forEach(r => {
       const el = document.createElement('div');
@@ -3,8 +3,9 @@ document.addEventListener('DOMContentLoaded', async () => {
   loadHeader();
   const container = document.getElementById('sessions-list');
   try {
-    const sessions = await apiFetch('/sessions');
-    if (!sessions || !sessions.length) { container.textContent = 'No hay sesiones.'; return; }
+    const page = await apiFetch('/sessions');
+    const sessions = page ? page.items : [];
+    if (!sessions.length) { container.textContent = 'No hay sesiones.'; return; }
     container.innerHTML = '';
     sessions.forEach(s => {
       const el = document.createElement('article');
@@ -15,11 +16,16 @@ document.addEventListener('DOMContentLoaded', async () => {
       el.innerHTML = `
         <h3>${escapeHtml(title)}</h3>
         <p>${start} — ${end}</p>
-        <p>Capacidad: ${s.capacity ?? '—'}</p>
+        <p>Capacidad: ${s.capacity ?? '—'} (libres: <span class="free-seats">${freeSeats(s)}</span>)</p>
         <a href="/pages/session.html?id=${s.id}" class="btn">Ver / Reservar</a>
       `;
+      el.dataset.sessionId = s.id;
       container.appendChild(el);
     });
+    subscribeSeats(sessions.map(s => s.id), s => {
+      const span = container.querySelector(`[data-session-id="${s.id}"] .free-seats`);
+      if (span) span.textContent = freeSeats(s);
+    }, () => location.reload());
   } catch (err) {
     console.error(err);
     container.textContent = 'Error cargando sesiones';
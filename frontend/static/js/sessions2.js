@@ -3,8 +3,9 @@ document.addEventListener('DOMContentLoaded', async () => {
   loadHeader();
   const container = document.getElementById('sessions-list');
   try {
-    const sessions = await apiFetch('/sessions');
-    if (!sessions || !sessions.length) { container.textContent = 'No hay sesiones.'; return; }
+    const page = await apiFetch('/sessions');
+    const sessions = page ? page.items : [];
+    if (!sessions.length) { container.textContent = 'No hay sesiones.'; return; }
     container.innerHTML = '';
     sessions.forEach(s => {
       const el = document.createElement('article');
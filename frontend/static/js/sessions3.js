@@ -10,17 +10,19 @@ document.addEventListener('DOMContentLoaded', async () => {
     try {
       s = await apiFetch(`/sessions/${id}`);
     } catch (e) {
-      const sessions = await apiFetch('/sessions');
-      s = sessions.find(x => x.id === id);
+      if (e?.status !== 404) throw e;
     }
     if (!s) { container.textContent = 'Sesión no encontrada'; return; }
     container.innerHTML = `
       <h2>${escapeHtml(s.class_type?.title || 'Clase')}</h2>
       <p>${new Date(s.start_time).toLocaleString()} - ${new Date(s.end_time).toLocaleString()}</p>
-      <p>Capacidad: ${s.capacity}</p>
+      <p>Capacidad: ${s.capacity} (libres: <span id="free-seats">${freeSeats(s)}</span>)</p>
       <button id="reserve-btn" class="btn">Reservar</button>
       <div id="reserve-result"></div>
     `;
+    subscribeSeats([id], live => {
+      document.getElementById('free-seats').textContent = freeSeats(live);
+    }, () => location.reload());
     document.getElementById('reserve-btn').addEventListener('click', async () => {
       try {
         const res = await apiFetch('/reservations', {
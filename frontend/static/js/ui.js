@@ -26,3 +26,18 @@ function showToast(msg, type='info') {
   // Fallback simple
   alert(msg);
 }
+
+// Plazas en tiempo real (SSE). onSeats(s) recibe {id, capacity, booked_count, waitlist_count, status};
+// onResync() se llama si el servidor pudo perder cambios (releer con apiFetch).
+function subscribeSeats(ids, onSeats, onResync) {
+  if (!window.EventSource) return null;
+  const qs = (ids || []).map(id => 'session_id=' + encodeURIComponent(id)).join('&');
+  const es = new EventSource('/live/seats' + (qs ? '?' + qs : ''));
+  es.addEventListener('seats', ev => onSeats(JSON.parse(ev.data)));
+  if (onResync) es.addEventListener('resync', () => onResync());
+  return es;
+}
+
+function freeSeats(s) {
+  return Math.max(s.capacity - s.booked_count, 0);
+}
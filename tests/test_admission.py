@@ -0,0 +1,49 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from app import admission
+
+@pytest.fixture(autouse=True)
+def clean_admission():
+    """Pista de plazas y gates son globales del módulo: cada test empieza y acaba sin ellos."""
+    admission._gates.clear()
+    admission._seats.clear()
+    yield
+    admission._gates.clear()
+    admission._seats.clear()
+
+def test_full_session_is_rejected_without_queueing():
+    admission.note_seats("s-full", 0)
+    async def attempt():
+        async with admission.admit("s-full", auto_waitlist=False):
+            pass
+    with pytest.raises(HTTPException) as err:
+        asyncio.run(attempt())
+    assert err.value.status_code == 400
+    # Con lista de espera sí se admite (el alta en cola necesita el lock)
+    async def waitlisted():
+        async with admission.admit("s-full", auto_waitlist=True):
+            return True
+    assert asyncio.run(waitlisted())
+
+def test_requests_beyond_free_seats_get_retry_after():
+    admission.note_seats("s-one", 1)
+    async def scenario():
+        inside = asyncio.Event()
+        release = asyncio.Event()
+        async def holder():
+            async with admission.admit("s-one", auto_waitlist=False):
+                inside.set()
+                await release.wait()
+        task = asyncio.create_task(holder())
+        await inside.wait()
+        try:
+            async with admission.admit("s-one", auto_waitlist=False):
+                pass
+        finally:
+            release.set()
+            await task
+    with pytest.raises(HTTPException) as err:
+        asyncio.run(scenario())
+    assert err.value.status_code == 503 and "Retry-After" in err.value.headers
+    assert "s-one" not in admission._gates
@@ -0,0 +1,18 @@
+from app.audit import AuditBuffer
+
+def test_drop_newest_keeps_queued_events():
+    buf = AuditBuffer(maxsize=2, drop_policy="newest")
+    assert buf.put(1) and buf.put(2)
+    assert not buf.put(3)
+    assert buf.take(10) == [1, 2]
+    assert buf.dropped == 1
+
+def test_drop_oldest_keeps_latest_events():
+    buf = AuditBuffer(maxsize=2, drop_policy="oldest")
+    buf.put(1)
+    buf.put(2)
+    assert not buf.put(3)
+    assert buf.take(1) == [2]
+    assert buf.take(1) == [3]
+    assert len(buf) == 0
+    assert buf.dropped == 1
@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from uuid import UUID, uuid4
+import pytest
+from fastapi import HTTPException
+from app import booking
+
+T0 = datetime(2026, 11, 2, 9, tzinfo=timezone.utc)
+USER = SimpleNamespace(id=UUID("00000000-0000-0000-0000-0000000000aa"))
+
+def _sid(n):
+    return UUID(int=n)
+
+def _session(n, hour, capacity=10, booked=0, status="scheduled"):
+    start = T0 + timedelta(hours=hour)
+    return SimpleNamespace(id=_sid(n), start_time=start, end_time=start + timedelta(hours=1), capacity=capacity, booked_count=booked, status=status)
+
+class FakeDb:
+    """Solo lo que toca create_reservations_batch tras _load_batch: el INSERT multi-fila y la transacción."""
+
+    def __init__(self):
+        self.inserted, self.committed, self.rolled_back = [], False, False
+
+    def execute(self, stmt, params=None):
+        self.inserted.extend(p["session_id"] for p in params)
+        return SimpleNamespace(all=lambda: [(uuid4(), p["session_id"]) for p in params])
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        self.rolled_back = True
+
+@pytest.fixture
+def batch(monkeypatch):
+    sessions = {
+        s.id: s for s in (
+            _session(1, 0),                          # libre
+            _session(2, 2, capacity=1, booked=1),    # llena -> cola
+            _session(3, 4, status="cancelled"),
+            _session(4, 6),                          # solapa con una reserva previa
+            _session(6, 0.5),                        # solapa con la 1 dentro del lote
+            _session(7, 8),                          # cuota agotada
+            _session(8, 10),                         # ya asistió
+        )
+    }
+    # La cuota va por mes: la 7 cae en un mes ya agotado
+    quota_left = {sid: ("2026-12", 0) if sid == _sid(7) else ("2026-11", None) for sid in sessions}
+    def load(db, user_id, ids):
+        # Como la consulta real: solo las sesiones pedidas que existen
+        return {sid: sessions[sid] for sid in ids if sid in sessions}, {_sid(8): "attended"}, {}, {_sid(4)}, quota_left
+    monkeypatch.setattr(booking, "_load_batch", load)
+    monkeypatch.setattr(booking.waitlist, "enqueue", lambda db, user_id, sids: {sid: 3 for sid in sids})
+    return [_sid(n) for n in (1, 2, 3, 4, 5, 6, 7, 8)]
+
+def test_non_atomic_maps_each_session_to_its_outcome(batch):
+    db = FakeDb()
+    out = booking.create_reservations_batch(db, USER, batch, auto_waitlist=True, atomic=False)
+    items = {item["session_id"]: item for item in out["items"]}
+    assert items[_sid(1)]["status"] == "booked" and db.inserted == [_sid(1)]
+    assert items[_sid(2)] == {"session_id": _sid(2), "status": "waitlisted", "position": 3}
+    reasons = {n: items[_sid(n)].get("reason") for n in (3, 4, 5, 6, 7, 8)}
+    assert reasons == {
+        3: "Session no está disponible",
+        4: booking.OVERLAP_DETAIL,
+        5: "Session no encontrada",
+        6: booking.OVERLAP_DETAIL,
+        7: booking.quota.QUOTA_DETAIL,
+        8: booking.ALREADY_BOOKED_DETAIL,
+    }
+    assert (out["booked"], out["waitlisted"], out["failed"]) == (1, 1, 6)
+    assert db.committed
+
+def test_full_session_without_auto_waitlist_fails(batch):
+    out = booking.create_reservations_batch(FakeDb(), USER, batch[:2], auto_waitlist=False)
+    assert [i["status"] for i in out["items"]] == ["booked", "failed"]
+    assert out["items"][1]["reason"] == "Session llena"
+
+def test_atomic_rejects_whole_batch_without_writing(batch):
+    db = FakeDb()
+    with pytest.raises(HTTPException) as err:
+        booking.create_reservations_batch(db, USER, batch, atomic=True)
+    assert err.value.status_code == 409
+    # Solo se informa de lo que falló; nada se insertó ni se confirmó
+    failed = {item["session_id"] for item in err.value.detail["items"] if item["status"] == "failed"}
+    assert failed == {str(_sid(n)) for n in (3, 4, 5, 6, 7, 8)}
+    assert db.rolled_back and not db.committed and db.inserted == []
+
+def test_atomic_books_everything_when_nothing_fails(batch):
+    db = FakeDb()
+    out = booking.create_reservations_batch(db, USER, batch[:2], atomic=True)
+    assert (out["booked"], out["waitlisted"], out["failed"]) == (1, 1, 0) and db.committed
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from uuid import UUID
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.exc import DBAPIError
+from app import booking, quota
+
+T0 = datetime(2026, 11, 2, 9, tzinfo=timezone.utc)
+SID = UUID(int=1)
+USER = SimpleNamespace(id=UUID("00000000-0000-0000-0000-0000000000aa"))
+
+def _session(capacity=10, booked=0, status="scheduled"):
+    return SimpleNamespace(id=SID, start_time=T0, end_time=T0 + timedelta(hours=1), capacity=capacity, booked_count=booked, status=status)
+
+class FakeDb:
+    """Lo que toca create_reservation tras bloquear la sesión: la reserva previa y la transacción."""
+
+    def __init__(self, existing=None, flush_error=None):
+        self.existing, self.flush_error = existing, flush_error
+        self.events = []
+
+    def execute(self, stmt, params=None):
+        return SimpleNamespace(scalar_one_or_none=lambda: self.existing)
+
+    def add(self, obj):
+        self.added = obj
+
+    def flush(self):
+        if self.flush_error is not None:
+            raise self.flush_error
+        if getattr(self.added, "id", None) is None:
+            self.added.id = UUID(int=7)
+
+    def commit(self):
+        self.events.append("commit")
+
+    def rollback(self):
+        self.events.append("rollback")
+
+@pytest.fixture
+def session_row(monkeypatch):
+    """La sesión que devuelve el SELECT ... FOR UPDATE; el resto de la BD, sin plazas ni solapes."""
+    state = SimpleNamespace(row=_session(), overlap=False, remaining=None)
+    monkeypatch.setattr(booking, "get_session_for_update", lambda db, sid: state.row)
+    monkeypatch.setattr(booking, "_has_overlap", lambda db, user_id, sess_row: state.overlap)
+    monkeypatch.setattr(booking.admission, "note_seats", lambda *args, **kwargs: None)
+    monkeypatch.setattr(booking.quota, "remaining_by_session", lambda db, user_id, ids: {sid: ("2026-11", state.remaining) for sid in ids})
+    monkeypatch.setattr(booking.audit, "record", lambda *args, **kwargs: None)
+    return state
+
+@pytest.mark.parametrize("row, existing, overlap, status_code, detail", [
+    (None, None, False, 404, "Session no encontrada"),
+    (_session(status="cancelled"), None, False, 400, "Session no está disponible"),
+    (_session(), SimpleNamespace(status="attended"), False, 400, booking.ALREADY_BOOKED_DETAIL),
+    (_session(capacity=1, booked=1), None, True, 400, booking.OVERLAP_DETAIL),
+    (_session(capacity=1, booked=1), None, False, 400, "Session llena"),
+])
+def test_rejections_release_the_session_lock_before_raising(session_row, row, existing, overlap, status_code, detail):
+    session_row.row, session_row.overlap = row, overlap
+    db = FakeDb(existing=existing)
+    with pytest.raises(HTTPException) as err:
+        booking.create_reservation(db, USER, SID, auto_waitlist=False)
+    assert (err.value.status_code, err.value.detail) == (status_code, detail)
+    # Rollback ya, no al cerrar la sesión tras la respuesta
+    assert db.events == ["rollback"]
+
+def test_cancelled_reservation_is_reactivated(session_row):
+    previous = SimpleNamespace(id=UUID(int=5), status="cancelled")
+    db = FakeDb(existing=previous)
+    assert booking.create_reservation(db, USER, SID) == {"reservation_id": str(previous.id), "status": "booked"}
+    assert db.added is previous and previous.status == "booked" and db.events == ["commit"]
+
+@pytest.mark.parametrize("auto_waitlist", [True, False])
+def test_full_session_rejects_member_over_quota_before_queueing(session_row, monkeypatch, auto_waitlist):
+    session_row.row, session_row.remaining = _session(capacity=1, booked=1), 0
+    monkeypatch.setattr(booking.waitlist, "enqueue", lambda *args: pytest.fail("no debe entrar en la cola"))
+    db = FakeDb()
+    with pytest.raises(HTTPException) as err:
+        booking.create_reservation(db, USER, SID, auto_waitlist=auto_waitlist)
+    assert (err.value.status_code, err.value.detail) == (400, quota.QUOTA_DETAIL)
+    assert db.events == ["rollback"]
+
+def test_quota_trigger_rejection_is_a_400(session_row):
+    # Con plaza libre no hay consulta previa: el trigger rechaza el INSERT con 23Q01
+    db = FakeDb(flush_error=DBAPIError("INSERT", {}, SimpleNamespace(pgcode=quota.QUOTA_SQLSTATE)))
+    with pytest.raises(HTTPException) as err:
+        booking.create_reservation(db, USER, SID)
+    assert (err.value.status_code, err.value.detail) == (400, quota.QUOTA_DETAIL)
+    assert db.events == ["rollback"]
+
+def test_unexpected_db_error_on_insert_propagates(session_row):
+    db = FakeDb(flush_error=DBAPIError("INSERT", {}, SimpleNamespace(pgcode="40P01")))
+    with pytest.raises(DBAPIError):
+        booking.create_reservation(db, USER, SID)
+    assert db.events == ["rollback"]
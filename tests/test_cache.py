@@ -0,0 +1,46 @@
+from app.cache import TTLCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+
+def test_ttl_expiry_and_counters():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=10, ttl=60, clock=clock)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    clock.now = 61
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_per_item_ttl_never_exceeds_default():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=10, ttl=60, clock=clock)
+    cache.set("short", 1, ttl=5)
+    cache.set("long", 2, ttl=3600)
+    clock.now = 30
+    assert cache.get("short") is None
+    assert cache.get("long") == 2
+    clock.now = 61
+    assert cache.get("long") is None
+
+def test_lru_bound_and_invalidate():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+    assert cache.invalidate("a")
+    assert cache.get("a") is None
+
+def test_disabled_cache_stores_nothing():
+    cache = TTLCache(maxsize=0, ttl=60)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+    assert len(cache) == 0
@@ -0,0 +1,84 @@
+import asyncio
+from types import SimpleNamespace
+from uuid import UUID
+import pytest
+from fastapi import HTTPException
+from app import admission, idempotency
+from app.idempotency import fingerprint, replay, run, run_admitted, REPLAY_HEADER
+
+SID = UUID("00000000-0000-0000-0000-000000000001")
+
+def test_fingerprint_depends_on_operation_and_arguments():
+    assert fingerprint("reservations.create", SID, True) == fingerprint("reservations.create", str(SID), True)
+    assert fingerprint("reservations.create", SID, True) != fingerprint("reservations.create", SID, False)
+    assert fingerprint("reservations.create", SID, True) != fingerprint("reservations.cancel", SID, True)
+
+def test_replay_returns_stored_response_or_error():
+    h = fingerprint("reservations.create", SID, True)
+    ok = replay(SimpleNamespace(request_hash=h, status_code=200, response={"status": "booked"}), h)
+    assert ok.status_code == 200 and ok.headers[REPLAY_HEADER] == "true"
+    with pytest.raises(HTTPException) as err:
+        replay(SimpleNamespace(request_hash=h, status_code=400, response={"detail": "Session llena"}), h)
+    assert err.value.status_code == 400 and err.value.detail == "Session llena"
+    with pytest.raises(HTTPException) as err:
+        replay(SimpleNamespace(request_hash="otra", status_code=200, response={}), h)
+    assert err.value.status_code == 422
+    with pytest.raises(HTTPException) as err:
+        replay(SimpleNamespace(request_hash=h, status_code=None, response=None), h)
+    assert err.value.status_code == 409
+
+def test_replayed_error_keeps_its_headers(monkeypatch):
+    rows = {}
+    monkeypatch.setattr(idempotency, "_claim", lambda db, user_id, key, request_hash: None)
+    def store(db, user_id, key, status_code, response):
+        rows[key] = SimpleNamespace(request_hash=fingerprint("reservations.create", SID, True), status_code=status_code, response=response)
+    monkeypatch.setattr(idempotency, "_store", store)
+    user = SimpleNamespace(id=UUID("00000000-0000-0000-0000-0000000000aa"))
+
+    def busy(db, user, session_id, auto_waitlist):
+        raise HTTPException(status_code=429, detail="Reintenta luego", headers={"Retry-After": "5"})
+
+    with pytest.raises(HTTPException):
+        run(None, user, "k1", "reservations.create", busy, SID, True)
+    with pytest.raises(HTTPException) as err:
+        replay(rows["k1"], fingerprint("reservations.create", SID, True))
+    assert err.value.status_code == 429 and err.value.headers == {REPLAY_HEADER: "true", "Retry-After": "5"}
+
+class _StoredDb:
+    """Session mínima para ``stored``: una fila guardada y rollback sin efecto."""
+
+    def __init__(self, row):
+        self.row = row
+
+    def execute(self, stmt):
+        return SimpleNamespace(first=lambda: self.row)
+
+    def rollback(self):
+        pass
+
+def test_full_session_still_replays_stored_response(monkeypatch):
+    sid = UUID("00000000-0000-0000-0000-000000000002")
+    # Pista de plazas propia del test: no queda en el módulo para los demás
+    monkeypatch.setattr(admission, "_seats", {})
+    monkeypatch.setattr(admission, "_gates", {})
+    admission.note_seats(sid, 0)
+    user = SimpleNamespace(id=UUID("00000000-0000-0000-0000-0000000000aa"))
+    h = fingerprint("reservations.create", sid, False)
+
+    def book(db, user, session_id, auto_waitlist):
+        raise AssertionError("un reintento con respuesta guardada no vuelve a reservar")
+
+    def attempt(row):
+        db = _StoredDb(row)
+        async def call(fn, *args):
+            return fn(db, *args)
+        return asyncio.run(run_admitted(
+            call, admission.admit(sid, auto_waitlist=False), user, "k1", "reservations.create", book, sid, False,
+        ))
+
+    response = attempt(SimpleNamespace(request_hash=h, status_code=200, response={"status": "booked"}))
+    assert response.status_code == 200 and response.headers[REPLAY_HEADER] == "true"
+    # Una clave nueva sí pasa por la admisión: la pista de plazas la rechaza sin tocar la BD
+    with pytest.raises(HTTPException) as err:
+        attempt(None)
+    assert err.value.status_code == 400 and err.value.detail == "Session llena"
@@ -0,0 +1,39 @@
+import asyncio
+from app import live
+from app.live import SeatHub
+
+def _seats(sid, booked):
+    return {"id": sid, "capacity": 10, "booked_count": booked, "waitlist_count": 0, "status": "scheduled"}
+
+def test_burst_is_coalesced_per_session():
+    hub = SeatHub()
+    one = hub.subscribe(["a"])
+    everything = hub.subscribe()
+    for booked in (1, 2, 3):
+        hub.publish(_seats("a", booked))
+    hub.publish(_seats("b", 1))
+    assert hub.flush() == 3
+    _, pending = one.drain()
+    assert list(pending) == ["a"] and '"booked_count": 3' in pending["a"]
+    _, pending = everything.drain()
+    assert sorted(pending) == ["a", "b"]
+
+def test_unsubscribe_stops_delivery():
+    hub = SeatHub()
+    sub = hub.subscribe(["a"])
+    hub.unsubscribe(sub)
+    hub.publish(_seats("a", 1))
+    assert hub.flush() == 0 and len(hub) == 0
+
+def test_stream_subscribes_only_once_started():
+    async def scenario():
+        before = len(live.hub)
+        # Cliente que corta antes del primer chunk: el generador nunca arranca
+        live.sse_stream()
+        assert len(live.hub) == before
+        stream = live.sse_stream()
+        assert (await stream.__anext__()).startswith("retry:")
+        assert len(live.hub) == before + 1
+        await stream.aclose()
+        assert len(live.hub) == before
+    asyncio.run(scenario())
@@ -0,0 +1,34 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from app import hashing
+from app.member_import import parse_header, parse_row, ImportFormatError
+
+def test_header_aliases_and_required_columns():
+    assert parse_header(["Name", "EMAIL", "plan"]) == {"full_name": 0, "email": 1, "plan": 2}
+    with pytest.raises(ImportFormatError):
+        parse_header(["full_name", "phone"])
+    with pytest.raises(ImportFormatError):
+        parse_header(["full_name", "email", "dni"])
+
+def test_row_validation():
+    columns = parse_header(["full_name", "email", "plan", "password"])
+    plans = {"premium": "plan-id"}
+    values, reason = parse_row([" Ana ", "ana@x.com", "Premium", "pw"], columns, plans)
+    assert reason is None and values["full_name"] == "Ana" and values["plan_id"] == "plan-id" and values["password"] == "pw"
+    assert parse_row(["Ana", "ana@x.com"], columns, plans)[0]["password"] is None
+    assert parse_row(["Ana", "no-es-email", "", ""], columns, plans) == (None, "Email inválido")
+    assert parse_row(["Ana", "ana@x.com", "Oro", ""], columns, plans) == (None, "Plan desconocido: Oro")
+    assert parse_row(["", "ana@x.com"], columns, plans) == (None, "Nombre vacío")
+
+def test_rows_without_password_skip_bcrypt_and_cannot_log_in(monkeypatch):
+    hashed = []
+    def fake_map(fn, passwords, chunksize):
+        hashed.extend(passwords)
+        return (f"bcrypt:{password}" for password in passwords)
+    monkeypatch.setattr(hashing, "get_bulk_executor", lambda: SimpleNamespace(map=fake_map))
+    assert hashing.hash_many(["a", None, "b"]) == ["bcrypt:a", hashing.UNUSABLE_PASSWORD_HASH, "bcrypt:b"]
+    assert hashed == ["a", "b"]
+    # Sin pasar por el pool: passlib no reconoce el marcador y fallaría
+    monkeypatch.setattr(hashing, "_submit", lambda *args: pytest.fail("no debe llegar a bcrypt"))
+    assert asyncio.run(hashing.verify_password("", hashing.UNUSABLE_PASSWORD_HASH)) == (False, None)
@@ -0,0 +1,23 @@
+from app.metrics import Counter, Histogram, register, render, _registry
+
+def test_histogram_buckets_are_cumulative():
+    hist = Histogram("test_latency_seconds", "doc", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        hist.observe(value, route="/x")
+    samples = {(name, labels): value for name, labels, value in hist.samples()}
+    assert samples[("test_latency_seconds_bucket", '{route="/x",le="0.1"}')] == 1
+    assert samples[("test_latency_seconds_bucket", '{route="/x",le="1.0"}')] == 3
+    assert samples[("test_latency_seconds_bucket", '{route="/x",le="+Inf"}')] == 4
+    assert samples[("test_latency_seconds_count", '{route="/x"}')] == 4
+    assert samples[("test_latency_seconds_sum", '{route="/x"}')] == 6.05
+
+def test_render_text_format():
+    counter = register(Counter("test_outcomes_total", "doc", ("outcome",)))
+    try:
+        counter.inc(outcome='a"b')
+        counter.inc(2, outcome='a"b')
+        text = render()
+    finally:
+        _registry.remove(counter)
+    assert "# TYPE test_outcomes_total counter" in text
+    assert 'test_outcomes_total{outcome="a\\"b"} 3' in text
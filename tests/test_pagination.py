@@ -0,0 +1,53 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from uuid import UUID
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+from app.pagination import encode_cursor, decode_cursor, split_page, clamp_limit, MAX_PAGE_SIZE
+from app.crud import search_sessions_stmt, user_reservations_stmt
+
+WHEN = datetime(2026, 11, 3, 18, 30, tzinfo=timezone.utc)
+RID = UUID("00000000-0000-0000-0000-000000000007")
+
+def _sql(stmt) -> str:
+    return str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(WHEN, RID)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (WHEN, RID)
+
+@pytest.mark.parametrize("cursor", ["", "no-es-base64!", encode_cursor(WHEN, RID)[:-4]])
+def test_invalid_cursor_is_400(cursor):
+    with pytest.raises(HTTPException) as err:
+        decode_cursor(cursor)
+    assert err.value.status_code == 400
+
+def test_split_page_cursor_points_at_last_returned_row():
+    rows = [SimpleNamespace(start_time=WHEN, id=UUID(int=i)) for i in range(4)]
+    page, cursor = split_page(rows, 3, lambda r: (r.start_time, r.id))
+    assert page == rows[:3] and decode_cursor(cursor) == (WHEN, UUID(int=2))
+    assert split_page(rows[:3], 3, lambda r: (r.start_time, r.id)) == (rows[:3], None)
+
+def test_clamp_limit():
+    assert clamp_limit(0) == 1 and clamp_limit(10_000) == MAX_PAGE_SIZE and clamp_limit(20) == 20
+
+def test_search_sessions_stmt_keyset_and_filters():
+    sql = _sql(search_sessions_stmt(20, after=(WHEN, RID), has_free_spots=True))
+    assert "(gym.sessions.start_time, gym.sessions.id) > (" in sql
+    assert "gym.sessions.booked_count < gym.sessions.capacity" in sql
+    assert "ORDER BY gym.sessions.start_time, gym.sessions.id" in sql and "LIMIT 21" in sql
+    sql = _sql(search_sessions_stmt(20, has_free_spots=False))
+    assert "gym.sessions.booked_count >= gym.sessions.capacity" in sql and " > (" not in sql
+
+def test_user_reservations_stmt_is_one_query_in_both_directions():
+    sql = _sql(user_reservations_stmt(RID, 10, after=(WHEN, RID), when="upcoming", now=WHEN))
+    # Sesión, clase, sala y entrenador en la misma consulta (sin N+1)
+    for table in ("JOIN gym.sessions", "gym.class_types", "gym.locations", "gym.trainers", "gym.users"):
+        assert table in sql
+    assert "(gym.sessions.start_time, gym.reservations.id) > (" in sql
+    assert "ORDER BY gym.sessions.start_time, gym.reservations.id" in sql and "LIMIT 11" in sql
+    sql = _sql(user_reservations_stmt(RID, 10, after=(WHEN, RID), when="past", now=WHEN))
+    assert "(gym.sessions.start_time, gym.reservations.id) < (" in sql
+    assert "ORDER BY gym.sessions.start_time DESC, gym.reservations.id DESC" in sql
@@ -0,0 +1,70 @@
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+from uuid import UUID
+from sqlalchemy.dialects import postgresql
+from app import quota
+from app.quota import quota_out
+
+NOV, DEC = date(2026, 11, 1), date(2026, 12, 1)
+
+def test_remaining_never_negative():
+    row = SimpleNamespace(month=date(2026, 11, 1), limit=2, used=3)
+    assert quota_out(row) == {"month": date(2026, 11, 1), "limit": 2, "used": 3, "remaining": 0}
+
+def test_unlimited_plan():
+    row = SimpleNamespace(month=date(2026, 11, 1), limit=None, used=5)
+    assert quota_out(row)["remaining"] is None
+
+def test_promotion_filter_compares_usage_of_the_session_month_with_the_plan():
+    clause = quota.over_quota_clause(datetime(2026, 11, 2, 9, tzinfo=timezone.utc))
+    sql = str(clause.compile(dialect=postgresql.dialect()))
+    assert "gym.user_monthly_usage.user_id = gym.waitlist_entries.user_id" in sql
+    assert "gym.user_monthly_usage.month = gym.quota_month(" in sql
+    assert "gym.user_monthly_usage.booked >= gym.plans.max_monthly_bookings" in sql
+
+class UsageDb:
+    """``gym.user_monthly_usage`` y el recuento real por (usuario, mes), en memoria.
+
+    Aplica _RECONCILE_USAGE_SQL a los ids del lote y registra locks y commits.
+    """
+
+    def __init__(self, usage, actual):
+        self.usage, self.actual = dict(usage), dict(actual)
+        self.users = sorted({user_id for user_id, _ in [*self.usage, *self.actual]})
+        self.events = []
+
+    def execute(self, stmt, params=None):
+        if stmt is quota._LOCK_USERS_SQL:
+            self.events.append(("lock", params["cls"], list(params["ids"])))
+            return None
+        if stmt is quota._RECONCILE_USAGE_SQL:
+            ids = set(params["ids"])
+            self.events.append(("reconcile", sorted(ids)))
+            fixed = set()
+            for key in {k for k in [*self.usage, *self.actual] if k[0] in ids}:
+                booked = self.actual.get(key, 0)
+                if self.usage.get(key) != booked:
+                    fixed.add(key[0])
+                    self.usage[key] = booked
+            return SimpleNamespace(scalars=lambda: SimpleNamespace(all=lambda: sorted(fixed)))
+        bound = stmt.compile(dialect=postgresql.dialect()).params
+        page = [u for u in self.users if "id_1" not in bound or u > bound["id_1"]][:bound["param_1"]]
+        return SimpleNamespace(scalars=lambda: SimpleNamespace(all=lambda: page))
+
+    def commit(self):
+        self.events.append(("commit",))
+
+def test_reconcile_fixes_drifted_usage_in_locked_batches():
+    a, b, c = UUID(int=1), UUID(int=2), UUID(int=3)
+    db = UsageDb(
+        # a: el contador se desvió; b: mes sin reservas que quedó a 3; c: correcto
+        usage={(a, NOV): 5, (b, NOV): 1, (b, DEC): 3, (c, NOV): 2},
+        actual={(a, NOV): 2, (b, NOV): 1, (c, NOV): 2},
+    )
+    assert quota.reconcile_monthly_usage(db, batch_size=2) == [a, b]
+    assert db.usage == {(a, NOV): 2, (b, NOV): 1, (b, DEC): 0, (c, NOV): 2}
+    # El lock exclusivo de cada lote va antes del recuento, y un commit por lote
+    assert db.events == [
+        ("lock", quota.USAGE_LOCK_CLASS, [a, b]), ("reconcile", [a, b]), ("commit",),
+        ("lock", quota.USAGE_LOCK_CLASS, [c]), ("reconcile", [c]), ("commit",),
+    ]
@@ -0,0 +1,20 @@
+from app.replicas import healthy, is_sticky, REPLICA_MAX_LAG_SECONDS, REPLICA_LAG_CHECK_SECONDS, STICKY_SECONDS
+
+def test_sticky_cookie_window():
+    now = 1_000_000.0
+    assert is_sticky(str(now + 1), now)
+    assert not is_sticky(str(now - 1), now)
+    # Una cookie con un plazo más largo del que da el servidor no vale
+    assert not is_sticky(str(now + STICKY_SECONDS + 60), now)
+    assert not is_sticky(None, now) and not is_sticky("x", now)
+
+def test_healthy_skips_lagging_down_and_stale_replicas():
+    now = 500.0
+    lags = [
+        (0.0, now),
+        (REPLICA_MAX_LAG_SECONDS + 1, now),
+        (None, now),
+        (0.0, now - 3 * REPLICA_LAG_CHECK_SECONDS),
+        (REPLICA_MAX_LAG_SECONDS, now - REPLICA_LAG_CHECK_SECONDS),
+    ]
+    assert healthy(lags, now) == [0, 4]
@@ -0,0 +1,35 @@
+import csv
+import io
+from collections import namedtuple
+from app.reporting import REPORT_COLUMNS, iter_csv, report_row
+
+_Row = namedtuple("_Row", [c for c in REPORT_COLUMNS if c not in ("fill_rate", "no_show_rate")])
+
+class Row(_Row):
+    @property
+    def _mapping(self):
+        return self._asdict()
+
+def make_row(key="2026-10-19", **kw):
+    values = dict(label=key, currency="USD", sessions=1, sessions_cancelled=0, capacity=10, booked=4, attended=3,
+                  no_show=1, cancelled=2, list_revenue_cents=8000, paid_revenue_cents=5000)
+    values.update(kw)
+    return Row(key=key, **values)
+
+def test_rates():
+    out = report_row(make_row())
+    assert out["fill_rate"] == 0.8
+    assert out["no_show_rate"] == 0.25
+
+def test_rates_without_denominator_are_none():
+    out = report_row(make_row(capacity=0, booked=0, attended=0, no_show=0))
+    assert out["fill_rate"] is None
+    assert out["no_show_rate"] is None
+
+def test_iter_csv_chunks_rows():
+    rows = [make_row(key=f"k{i}") for i in range(5)]
+    chunks = list(iter_csv(iter(rows), chunk_rows=2))
+    assert len(chunks) == 3
+    parsed = list(csv.reader(io.StringIO("".join(chunks))))
+    assert parsed[0] == list(REPORT_COLUMNS)
+    assert [r[0] for r in parsed[1:]] == [f"k{i}" for i in range(5)]
@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+from app.scheduling import expand_rrule, split_window, ResourceCalendar, plan_sessions
+
+UTC = timezone.utc
+
+def at(day, hour, minute=0):
+    return datetime(2025, 1, day, hour, minute, tzinfo=UTC)
+
+def test_expand_rrule_is_clipped_to_window():
+    starts = expand_rrule("RRULE:FREQ=WEEKLY;BYDAY=MO,WE", at(6, 18), at(6, 0), at(13, 18))
+    # Lunes 6, miércoles 8; el lunes 13 a las 18:00 queda fuera (ventana semiabierta)
+    assert starts == [at(6, 18), at(8, 18)]
+
+def test_split_window_drops_partial_slot():
+    slots = split_window(at(6, 9), at(6, 11, 30), timedelta(hours=1))
+    assert slots == [(at(6, 9), at(6, 10)), (at(6, 10), at(6, 11))]
+
+def test_resource_calendar_with_overlapping_existing():
+    cal = ResourceCalendar([(at(6, 9), at(6, 12)), (at(6, 10), at(6, 11))])
+    assert not cal.is_free(at(6, 11, 30), at(6, 12, 30))
+    assert cal.is_free(at(6, 12), at(6, 13))
+    cal.add(at(6, 12), at(6, 13))
+    assert not cal.is_free(at(6, 12, 30), at(6, 13, 30))
+    assert cal.is_free(at(6, 13), at(6, 14))
+
+def test_plan_sessions_reports_trainer_and_location_conflicts():
+    trainer, room = uuid4(), uuid4()
+    cand = lambda h, t, loc: {"start_time": at(6, h), "end_time": at(6, h + 1), "trainer_id": t, "location_id": loc}
+    existing = {("location", room): [(at(6, 9), at(6, 10))]}
+    accepted, conflicts = plan_sessions(
+        [cand(9, trainer, room), cand(10, trainer, room), cand(10, trainer, None), cand(10, None, uuid4())],
+        existing,
+    )
+    assert len(accepted) == 2
+    assert [c["reason"] for c in conflicts] == ["location", "trainer"]
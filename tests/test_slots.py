@@ -0,0 +1,16 @@
+from datetime import datetime, timedelta, timezone
+from app.slots import merge_intervals, subtract_intervals, TrainerCalendar
+
+def h(hour, minute=0):
+    return datetime(2026, 11, 5, hour, minute, tzinfo=timezone.utc)
+
+def test_subtract_busy_from_availability():
+    free = merge_intervals([(h(9), h(12)), (h(11), h(13)), (h(15), h(18))])
+    assert free == [(h(9), h(13)), (h(15), h(18))]
+    busy = [(h(8), h(9, 30)), (h(10), h(11)), (h(12, 30), h(16))]
+    assert subtract_intervals(free, busy) == [(h(9, 30), h(10)), (h(11), h(12, 30)), (h(16), h(18))]
+
+def test_slots_are_aligned_and_fit_duration():
+    cal = TrainerCalendar("t", "Ana", ["yoga"], [(h(9, 10), h(11)), (h(14), h(15))])
+    got = list(cal.slots(h(9), h(14, 30), timedelta(minutes=60), timedelta(minutes=30)))
+    assert got == [(h(9, 30), h(10, 30)), (h(10), h(11))]
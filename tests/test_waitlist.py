@@ -0,0 +1,185 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from uuid import UUID
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import DBAPIError
+from app import booking, waitlist
+
+T0 = datetime(2026, 11, 2, 9, tzinfo=timezone.utc)
+SID = UUID(int=1000)
+
+def _user(n):
+    return UUID(int=n)
+
+def _session(capacity, booked, waiting):
+    return SimpleNamespace(
+        id=SID, capacity=capacity, booked_count=booked, waitlist_count=waiting,
+        status="scheduled", start_time=T0, end_time=T0 + timedelta(hours=1),
+    )
+
+class FakeDb:
+    """Cola en memoria: interpreta solo las sentencias que emite app/waitlist.py.
+
+    ``busy`` y ``over_quota`` son los usuarios que excluyen los EXISTS de la
+    consulta de candidatos (solape y cuota agotada).
+    """
+
+    def __init__(self, *users, busy=(), over_quota=()):
+        self.entries = [
+            SimpleNamespace(id=UUID(int=100 + pos), user_id=user_id, position=pos, notified_at=None)
+            for pos, user_id in enumerate(users, 1)
+        ]
+        self.busy, self.over_quota = set(busy), set(over_quota)
+        self.candidate_queries = []
+
+    def waiting(self):
+        return sorted((e for e in self.entries if e.notified_at is None), key=lambda e: e.position)
+
+    def positions(self):
+        return {e.user_id: e.position for e in self.waiting()}
+
+    def execute(self, stmt, params=None):
+        if stmt is waitlist._COMPACT_SQL:
+            for rn, entry in enumerate(self.waiting(), 1):
+                entry.position = rn
+            return None
+        bound = stmt.compile(dialect=postgresql.dialect()).params
+        if stmt.is_delete:
+            gone = [e for e in self.waiting() if e.user_id == bound["user_id_1"]]
+            self.entries = [e for e in self.entries if e not in gone]
+            return SimpleNamespace(first=lambda: (gone[0].id,) if gone else None)
+        if stmt.is_update:
+            for entry in self.entries:
+                if entry.id in bound["id_1"]:
+                    entry.notified_at, entry.position = bound["notified_at"], bound["position"]
+            return None
+        self.candidate_queries.append(stmt)
+        tried = set(bound.get("id_1", ()))
+        rows = [
+            (e.id, e.user_id) for e in self.waiting()
+            if e.id not in tried and e.user_id not in self.busy | self.over_quota
+        ][:bound["param_1"]]
+        return SimpleNamespace(all=lambda: rows)
+
+@pytest.fixture
+def booked(monkeypatch):
+    """Sustituye el INSERT de la reserva: los usuarios de ``rejected`` los rechaza la BD."""
+    calls = SimpleNamespace(users=[], rejected=set())
+    def book(db, sess_row, user_id):
+        calls.users.append(user_id)
+        return user_id not in calls.rejected
+    monkeypatch.setattr(waitlist, "_book_entry", book)
+    return calls
+
+def test_leave_compacts_positions_without_gaps():
+    db = FakeDb(_user(1), _user(2), _user(3), _user(4))
+    assert waitlist.leave(db, _user(2), SID)
+    assert db.positions() == {_user(1): 1, _user(3): 2, _user(4): 3}
+    # Quien no está en la cola no cambia nada
+    assert not waitlist.leave(db, _user(9), SID)
+    assert db.positions() == {_user(1): 1, _user(3): 2, _user(4): 3}
+
+def test_promote_fills_every_free_seat_in_one_pass(booked):
+    db = FakeDb(_user(1), _user(2), _user(3), _user(4))
+    promoted = waitlist.promote(db, _session(capacity=5, booked=2, waiting=4))
+    assert [p["user_id"] for p in promoted] == [_user(1), _user(2), _user(3)]
+    assert len(db.candidate_queries) == 1 and booked.users == [_user(1), _user(2), _user(3)]
+    # Los promovidos salen de la cola con position 0; el resto vuelve a empezar en 1
+    assert db.positions() == {_user(4): 1}
+    assert all(e.position == 0 and e.notified_at is not None for e in db.entries if e.user_id != _user(4))
+
+def test_promote_skips_overlapping_and_over_quota_members(booked):
+    db = FakeDb(_user(1), _user(2), _user(3), _user(4), busy={_user(1)}, over_quota={_user(2)})
+    promoted = waitlist.promote(db, _session(capacity=2, booked=0, waiting=4))
+    assert [p["user_id"] for p in promoted] == [_user(3), _user(4)]
+    # Conservan su turno para la próxima plaza
+    assert db.positions() == {_user(1): 1, _user(2): 2}
+    sql = str(db.candidate_queries[0].compile(dialect=postgresql.dialect()))
+    assert "NOT (EXISTS (SELECT gym.user_booked_intervals.reservation_id" in sql
+    assert "NOT (EXISTS (SELECT gym.user_monthly_usage.user_id" in sql
+
+def test_promote_offers_seats_rejected_by_the_db_to_the_next_in_line(booked):
+    # Solape o cuota que llegan entre la consulta y el INSERT (23P01 / 23Q01)
+    booked.rejected = {_user(1)}
+    db = FakeDb(_user(1), _user(2), _user(3))
+    promoted = waitlist.promote(db, _session(capacity=2, booked=0, waiting=3))
+    assert [p["user_id"] for p in promoted] == [_user(2), _user(3)]
+    assert booked.users == [_user(1), _user(2), _user(3)] and len(db.candidate_queries) == 2
+    assert db.positions() == {_user(1): 1}
+
+def test_promote_without_free_seats_does_nothing(booked):
+    db = FakeDb(_user(1))
+    assert waitlist.promote(db, _session(capacity=2, booked=2, waiting=1)) == []
+    assert db.candidate_queries == [] and booked.users == []
+
+def test_drain_walks_sessions_in_id_batches_skipping_locked_ones(monkeypatch):
+    sessions = [SimpleNamespace(id=UUID(int=n)) for n in (1, 2, 3)]
+    pages = [sessions[:2], sessions[2:], []]
+    queries = []
+    db = SimpleNamespace(commits=0)
+    def execute(stmt, params=None):
+        queries.append(str(stmt.compile(dialect=postgresql.dialect())))
+        page = pages.pop(0)
+        return SimpleNamespace(scalars=lambda: SimpleNamespace(all=lambda: page))
+    db.execute = execute
+    db.commit = lambda: setattr(db, "commits", db.commits + 1)
+    monkeypatch.setattr(waitlist, "promote", lambda db, sess_row: [{"session_id": sess_row.id}] * sess_row.id.int)
+    monkeypatch.setattr(waitlist.audit, "record_promotions", lambda batch: None)
+    assert waitlist.drain_waitlists(db, batch_size=2) == 6
+    # Un commit por lote; el siguiente lote empieza tras el último id visto
+    assert db.commits == 2
+    assert all("FOR UPDATE SKIP LOCKED" in sql for sql in queries)
+    assert "gym.sessions.id >" not in queries[0] and "gym.sessions.id >" in queries[1]
+
+class SavepointDb:
+    """Un INSERT por savepoint: registra cuáles se deshicieron."""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.savepoints = []
+
+    @contextmanager
+    def begin_nested(self):
+        savepoint = SimpleNamespace(rolled_back=False)
+        self.savepoints.append(savepoint)
+        try:
+            yield savepoint
+        except Exception:
+            savepoint.rolled_back = True
+            raise
+
+    def execute(self, stmt, params=None):
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return SimpleNamespace(first=lambda: outcome)
+
+def _db_error(pgcode):
+    return DBAPIError("INSERT", {}, SimpleNamespace(pgcode=pgcode))
+
+def test_failed_promotion_rolls_back_only_its_savepoint():
+    sess_row = _session(capacity=3, booked=0, waiting=3)
+    db = SavepointDb([(_user(1),), _db_error("23P01"), _db_error(waitlist.quota.QUOTA_SQLSTATE), None])
+    results = [waitlist._book_entry(db, sess_row, _user(n)) for n in (1, 2, 3, 4)]
+    # La 4 ya tenía reserva no cancelada en la sesión: ON CONFLICT no devuelve fila
+    assert results == [True, False, False, False]
+    assert [sp.rolled_back for sp in db.savepoints] == [False, True, True, False]
+
+def test_unexpected_db_error_in_promotion_propagates():
+    db = SavepointDb([_db_error("40P01")])
+    with pytest.raises(DBAPIError):
+        waitlist._book_entry(db, _session(capacity=1, booked=0, waiting=1), _user(1))
+    assert db.savepoints[0].rolled_back
+
+def test_cancelling_a_reservation_that_is_not_booked_is_rejected(monkeypatch):
+    res = SimpleNamespace(id=UUID(int=7), user_id=_user(1), session_id=SID, status="cancelled")
+    db = SimpleNamespace(get=lambda model, rid: res, refresh=lambda obj: None, rolled_back=False)
+    db.rollback = lambda: setattr(db, "rolled_back", True)
+    monkeypatch.setattr(booking, "get_session_for_update", lambda db, sid: _session(capacity=1, booked=0, waiting=1))
+    monkeypatch.setattr(booking.waitlist, "promote", lambda db, sess_row: pytest.fail("no debe promover"))
+    with pytest.raises(HTTPException) as err:
+        booking.cancel_reservation(db, SimpleNamespace(id=_user(1), role="member"), res.id)
+    assert err.value.status_code == 400 and db.rolled_back and res.status == "cancelled"